@@ -1,15 +1,80 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+from flask import Flask, Request, render_template, request, jsonify, redirect, url_for, send_from_directory, has_request_context, make_response
+import copy
+import gzip
 import json
+import mimetypes
+from bisect import bisect_left, insort
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import wraps
 import os
+import threading
+import click
 from werkzeug.utils import secure_filename
+from storage import DataStore
+from sqlite_store import SQLiteStore
+from scoring import AnswerKey
+from tournament_index import TournamentIndex
+from player_registry import PlayerRegistry
+from single_flight import SingleFlight
+from bracket import build_bracket, elimination_standings, feeds
+from points_matrix import PointsMatrix
+from model import (BrainGameResult, Player, TournamentMatch, canonical_doping_usage, canonical_players,
+                   canonical_results, canonical_tournaments, json_default, player_key)
+from static_assets import StaticAssets
+from json_provider import CompactJSONProvider, JSONProvider
+from export import chunked, gzip_chunks, stream_json, stream_ndjson, stream_csv
+from pictures import make_derivatives, picture_for, PictureUpload, UploadError, PICTURE_ERRORS, PICTURE_SIZES, DERIVATIVES_DIR
+
+
+class UploadRequest(Request):
+    """Requests whose uploaded files are written by the form parser straight to the upload folder"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uploads = []  # PictureUploads of this request, removed on close unless moved into place
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = PictureUpload(app.config['UPLOAD_FOLDER'], app.config['MAX_PICTURE_BYTES'])
+        self.uploads.append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        for upload in self.uploads:
+            upload.discard()
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+
+# Opt-in: JSON responses without sorted keys, with orjson when it is installed
+FAST_JSON = os.environ.get('ROCKBRAKEL_FAST_JSON', '') not in ('', '0')
+app.json = CompactJSONProvider(app) if FAST_JSON else JSONProvider(app)
+# JSON responses at least this large are gzipped for browsers that accept it (0 turns it off)
+GZIP_MIN_SIZE = int(os.environ.get('ROCKBRAKEL_GZIP_MIN_BYTES', '1024'))
 
 # Configure upload folder
 UPLOAD_FOLDER = 'static/player_pictures'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_PICTURE_BYTES'] = int(os.environ.get('ROCKBRAKEL_MAX_PICTURE_MB', '8')) * 1024 * 1024
+# Requests larger than a picture plus the form fields are refused while they come in
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_PICTURE_BYTES'] + 64 * 1024
+# Resizing uploaded pictures happens on a few threads, not on the request thread
+PICTURE_WORKERS = int(os.environ.get('ROCKBRAKEL_PICTURE_WORKERS', '2'))
+_picture_pool = ThreadPoolExecutor(max_workers=PICTURE_WORKERS, thread_name_prefix='pictures')
+
+# Static files get their content hash in the URL (?v=), so browsers can keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+static_assets = StaticAssets(app.static_folder)
+try:
+    # Compressed once here instead of on every request
+    static_assets.precompress()
+except OSError:
+    app.logger.warning('Comprimeren van de statische bestanden mislukt, ze worden ongecomprimeerd verstuurd')
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -19,17 +84,62 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_player_picture(file, player_id):
-    """Save uploaded player picture and return filename"""
-    if file and allowed_file(file.filename):
-        # Get file extension
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        # Create filename: player_{id}.{ext}
-        filename = f"player_{player_id}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        return filename
-    return None
+def save_player_picture(upload, player_id):
+    """Move a streamed upload (temp path, extension) into place and return filename, it is resized in the background"""
+    tmp_path, ext = upload
+    # Create filename: player_{id}.{ext}
+    filename = f"player_{player_id}.{ext}"
+    os.replace(tmp_path, os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    _picture_pool.submit(_process_player_picture, player_id, filename)
+    return filename
+
+def _process_player_picture(player_id, filename):
+    """Make the resized copies of an uploaded picture and set the player's picture_status to ready (or failed)"""
+    try:
+        make_derivatives(app.config['UPLOAD_FOLDER'], filename)
+        status = 'ready'
+    except Exception:
+        # Not a readable image after all (or a decompression bomb), the player is shown without picture
+        app.logger.exception('Verkleinen van %s mislukt', filename)
+        status = 'failed'
+    with store.transaction():
+        load_data()
+        player = _player_registry().get(player_id)
+        if player is None or player.get('picture') != filename:
+            return  # Removed, or a new picture was uploaded meanwhile
+        player['picture_status'] = status
+        if status == 'failed':
+            player['picture'] = None
+        save_data('players')
+
+# Pictures whose derivatives are being made for a request that found them missing: {filename}
+_derivatives_queued = set()
+_derivatives_failed = {}  # {filename: mtime_ns of the picture that could not be resized}
+_derivatives_lock = threading.Lock()
+
+def _queue_derivatives(filename):
+    """Make the derivatives of a picture in the background, once however many requests ask for them"""
+    try:
+        mtime = os.stat(os.path.join(app.config['UPLOAD_FOLDER'], filename)).st_mtime_ns
+    except FileNotFoundError:
+        return
+    with _derivatives_lock:
+        if filename in _derivatives_queued or _derivatives_failed.get(filename) == mtime:
+            return
+        _derivatives_queued.add(filename)
+    _picture_pool.submit(_make_queued_derivatives, filename, mtime)
+
+def _make_queued_derivatives(filename, mtime):
+    try:
+        make_derivatives(app.config['UPLOAD_FOLDER'], filename)
+    except PICTURE_ERRORS:
+        # Not tried again until a new picture is uploaded under this name
+        app.logger.warning('Verkleinen van %s mislukt, de originele foto wordt getoond', filename)
+        with _derivatives_lock:
+            _derivatives_failed[filename] = mtime
+    finally:
+        with _derivatives_lock:
+            _derivatives_queued.discard(filename)
 
 # Scoring system: 25-22-19-15-12-8-7-6-5-4-3-2-1-0-0-0
 SCORING_POINTS = [25, 22, 19, 15, 12, 8, 7, 6, 5, 4, 3, 2, 1, 0, 0, 0]
@@ -45,6 +155,9 @@ TOURNAMENT_SCORING = {
     'round_of_32_losers': 0
 }
 
+# Games in the order they are shown
+GAMES = ['touwspringen', 'stoelendans', 'petanque', 'kubb', 'rebus', 'wiskunde']
+
 # Game categories
 GAME_CATEGORIES = {
     'speed_games': ['touwspringen', 'stoelendans'],
@@ -52,22 +165,31 @@ GAME_CATEGORIES = {
     'brain_games': ['rebus', 'wiskunde']
 }
 
+# Jersey awarded for each game category
+CATEGORY_JERSEYS = {
+    'speed_games': 'groene_trui',
+    'ball_games': 'bolletjes_trui',
+    'brain_games': 'witte_trui'
+}
+
 # Data storage (in a real app, you'd use a database)
 players = []
 scores = {}
 opponents = {}
 # New: store raw results per game to compute positions dynamically
 results = {}
-# New: admin-provided answer keys for brain games
-answer_keys = {
+# Built-in answer keys for brain games, until an admin sets them (answer_keys.json takes precedence)
+DEFAULT_ANSWER_KEYS = {
     'rebus': ['Rock Brakel', 'Overbevolkt', 'Omloop het nieuwsblad', 'Kopgroep', 'de', 'Peloton', '59', 'b', '1', 'Henri,Maya,Ona,Esmee'],
     'wiskunde': []
 }
+# New: admin-provided answer keys for brain games
+answer_keys = copy.deepcopy(DEFAULT_ANSWER_KEYS)
 # Track dismissed winner popups
 dismissed_winners = set()
 
-# Tournament structures for Kubb & Petanque (no loser bracket)
-tournaments = {
+# Tournament structures for Kubb & Petanque (no loser bracket), before they are generated
+EMPTY_TOURNAMENTS = {
     'petanque': {
         'rounds': [],
         'current_round': 0,
@@ -83,91 +205,275 @@ tournaments = {
         'bye_players': []  # Track players who had bye to prevent consecutive byes
     }
 }
+tournaments = copy.deepcopy(EMPTY_TOURNAMENTS)
 
 # Track doping usage per player across all games (can only be used once)
 doping_usage = {}  # {player_id: game_name} if player has used doping for that game
 
+# Data files, loaded once and only re-read when they change on disk
+DATA_COLLECTIONS = ['players', 'scores', 'opponents', 'results', 'answer_keys',
+                    'tournaments', 'doping_usage', 'dismissed_winners']
+if os.environ.get('ROCKBRAKEL_DATABASE'):
+    # Optional SQLite backend, see `flask --app app import-sqlite` to migrate the JSON files
+    store = SQLiteStore(os.environ['ROCKBRAKEL_DATABASE'], json_default=json_default)
+else:
+    # Results, tournament matches and answer keys go to the event log; the JSON files
+    # are rewritten in the background once ROCKBRAKEL_SNAPSHOT_EVERY events piled up
+    store = DataStore(os.environ.get('ROCKBRAKEL_DATA_DIR', 'data'),
+                      snapshot_every=int(os.environ.get('ROCKBRAKEL_SNAPSHOT_EVERY', 50)), json_default=json_default)
+_snapshot_thread = None
+
+def locked(view):
+    """Run a view that changes state while holding the store's write lock (shared by all workers)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with store.transaction():
+            # Another worker may have changed the data since this one last loaded it
+            load_data()
+            return view(*args, **kwargs)
+    return wrapper
+
+def conditional(view):
+    """Answer If-None-Match with 304 while the state is unchanged, without running the view"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        load_data()
+        # Taken before the view runs: a change made meanwhile gets a new tag on the next request
+        etag = store.state_tag()
+        # Weak match: gzipped responses carry the tag as a weak ETag
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Let browsers keep the response but revalidate it on every request
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
 def load_data():
-    """Load data from JSON files if they exist"""
+    """Load data from JSON files that changed since they were last read and replay the event log"""
     global players, scores, opponents, results, answer_keys, tournaments, doping_usage, dismissed_winners
     
-    if os.path.exists('data/players.json'):
-        with open('data/players.json', 'r', encoding='utf-8') as f:
-            players = json.load(f)
-            # Ensure all players have a picture field for backward compatibility
-            for player in players:
-                if 'picture' not in player:
-                    player['picture'] = None
-    
-    if os.path.exists('data/scores.json'):
-        with open('data/scores.json', 'r', encoding='utf-8') as f:
-            scores = json.load(f)
-    
-    if os.path.exists('data/opponents.json'):
-        with open('data/opponents.json', 'r', encoding='utf-8') as f:
-            opponents = json.load(f)
-    
-    if os.path.exists('data/results.json'):
-        with open('data/results.json', 'r', encoding='utf-8') as f:
-            results = json.load(f)
-    
-    if os.path.exists('data/answer_keys.json'):
-        with open('data/answer_keys.json', 'r', encoding='utf-8') as f:
-            loaded_answer_keys = json.load(f)
-            # Merge with hardcoded answers, preserving hardcoded ones
-            for game, answers in loaded_answer_keys.items():
-                if game not in answer_keys or not answer_keys[game]:
-                    answer_keys[game] = answers
-    
-    # Load tournament data
-    if os.path.exists('data/tournaments.json'):
-        with open('data/tournaments.json', 'r', encoding='utf-8') as f:
-            tournaments = json.load(f)
-    
-    # Load doping usage data
-    if os.path.exists('data/doping_usage.json'):
-        with open('data/doping_usage.json', 'r', encoding='utf-8') as f:
-            doping_usage_raw = json.load(f)
-            # Convert string keys to integers
-            doping_usage = {int(k): v for k, v in doping_usage_raw.items()}
-    
-    # Load dismissed winners data
-    if os.path.exists('data/dismissed_winners.json'):
-        with open('data/dismissed_winners.json', 'r', encoding='utf-8') as f:
-            dismissed_winners_list = json.load(f)
-            dismissed_winners = set(dismissed_winners_list)
-    else:
-        dismissed_winners = set()
+    # Read and applied under one lock: a writer of this worker must not see seq moved past
+    # events that are not applied yet
+    with store.loading():
+        changed, events = store.changes(DATA_COLLECTIONS)
+        for name, data in changed.items():
+            if data is None:
+                # No file (yet), or it is gone: the collection starts empty, the event log may fill it
+                data = _empty_collection(name)
+            if name == 'dismissed_winners':
+                dismissed_winners = set(data)
+                continue
+        
+            # Player ids become int keys once here, JSON object keys are always strings
+            if name == 'players':
+                players = canonical_players(data)
+            elif name == 'scores':
+                scores = data
+            elif name == 'opponents':
+                opponents = data
+            elif name == 'results':
+                results = canonical_results(data)
+            elif name == 'answer_keys':
+                # Keys set by an admin replace the built-in ones, the built-in ones fill in missing games
+                answer_keys = dict(copy.deepcopy(DEFAULT_ANSWER_KEYS), **data)
+            elif name == 'tournaments':
+                tournaments = canonical_tournaments(data)
+            elif name == 'doping_usage':
+                doping_usage = canonical_doping_usage(data)
+        _collections_changed(*changed)
+    
+        # Changes logged after the last snapshot
+        for event in events:
+            touched = _apply_event(event)
+            changes = _event_changes(event, touched or [])
+            if touched:
+                _mark_changes(changes)
+            _changes_logged(event['seq'], changes)
 
-def save_data():
-    """Save data to JSON files"""
-    os.makedirs('data', exist_ok=True)
-    
-    with open('data/players.json', 'w', encoding='utf-8') as f:
-        json.dump(players, f, ensure_ascii=False, indent=2)
-    
-    with open('data/scores.json', 'w', encoding='utf-8') as f:
-        json.dump(scores, f, ensure_ascii=False, indent=2)
-    
-    with open('data/opponents.json', 'w', encoding='utf-8') as f:
-        json.dump(opponents, f, ensure_ascii=False, indent=2)
-    
-    with open('data/results.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-    with open('data/answer_keys.json', 'w', encoding='utf-8') as f:
-        json.dump(answer_keys, f, ensure_ascii=False, indent=2)
-    
-    # Save tournament data
-    with open('data/tournaments.json', 'w', encoding='utf-8') as f:
-        json.dump(tournaments, f, ensure_ascii=False, indent=2)
-    
-    # Save doping usage data
-    with open('data/doping_usage.json', 'w', encoding='utf-8') as f:
-        json.dump(doping_usage, f, ensure_ascii=False, indent=2)
-    
-    # Save dismissed winners data
-    with open('data/dismissed_winners.json', 'w', encoding='utf-8') as f:
-        json.dump(list(dismissed_winners), f, ensure_ascii=False, indent=2)
+def _empty_collection(name):
+    """Return the data of a collection that has no file"""
+    if name == 'tournaments':
+        return copy.deepcopy(EMPTY_TOURNAMENTS)
+    return [] if name in ['players', 'dismissed_winners'] else {}
+
+def _collection_data(name):
+    """Return the JSON-serializable data of a collection"""
+    if name == 'dismissed_winners':
+        return list(dismissed_winners)
+    return {
+        'players': players,
+        'scores': scores,
+        'opponents': opponents,
+        'results': results,
+        'answer_keys': answer_keys,
+        'tournaments': tournaments,
+        'doping_usage': doping_usage
+    }[name]
+
+def save_data(*collections):
+    """Save the given collections to JSON files (all of them if none are given)"""
+    collections = list(collections or DATA_COLLECTIONS)
+    with store.transaction():
+        store.mark_dirty(*collections)
+        _collections_changed(*collections)
+        # Logged without the data (that is in the snapshot) so every worker's /changes and /events see the change
+        event = store.append_event({'type': 'collections_saved', 'collections': collections})
+        _changes_logged(event['seq'], dict.fromkeys(collections))
+        write_snapshot()
+
+def write_snapshot():
+    """Write every collection changed since the last snapshot and compact the event log"""
+    with store.transaction():
+        # Include events other workers logged, compacting the log would drop them otherwise
+        load_data()
+        store.write_snapshot({name: _collection_data(name) for name in store.dirty()})
+    _notify_state_changed()
+
+def log_event(event, *collections):
+    """Append an already applied change to the event log instead of rewriting the JSON files"""
+    global _snapshot_thread
+    if has_request_context():
+        event = dict(event, client=request.remote_addr)
+    with store.transaction():
+        changes = _event_changes(event, collections)
+        _mark_changes(changes)
+        _changes_logged(store.append_event(event)['seq'], changes)
+        _notify_state_changed()
+        if store.snapshot_every <= 1:
+            # Row-level writes are cheap (SQLite), keep the stored data current
+            write_snapshot()
+        elif store.pending_events() >= store.snapshot_every and not (_snapshot_thread and _snapshot_thread.is_alive()):
+            _snapshot_thread = threading.Thread(target=write_snapshot, daemon=True)
+            _snapshot_thread.start()
+
+def _event_entries(event):
+    """Return {collection: entries} of the entries an applied event changed, None for a whole collection"""
+    if event['type'] == 'game_result':
+        game = event['game']
+        return {'results': [game] if game == 'stoelendans' else [(game, player_key(event['player_id']))],
+                'doping_usage': [player_key(player_id) for player_id in event['doping_players']]}
+    elif event['type'] == 'tournament_match':
+        game = event['game']
+        tournament = tournaments.get(game)
+        round_idx = _tournament_index(game).find(event['match_id'])[0] if tournament else None
+        if round_idx is None or 'bracket_size' not in tournament:
+            # Rounds are generated as the tournament goes (a match can add one), or the tournament was generated again
+            changed = [game]
+        else:
+            position = _tournament_index(game).position(event['match_id'])
+            changed = [(game, round_idx, position)]
+            if round_idx < tournament['num_rounds'] - 1:
+                changed.append((game, *feeds(round_idx, position)[:2]))
+        # Doping claimed now, and doping given back by the result that is overwritten
+        overwrote = event.get('overwrote') or {}
+        doping = {event['winner_id'] if event['doping1'] else None, event['loser_id'] if event['doping2'] else None,
+                  overwrote.get('winner'), overwrote.get('loser')}
+        return {'tournaments': changed, 'doping_usage': [player_id for player_id in doping if player_id is not None]}
+    elif event['type'] == 'answer_key':
+        return {'answer_keys': None,
+                'results': [(event['game'], player_key(player_id)) for player_id, _ in event.get('rescored', [])]}
+    elif event['type'] == 'player_registered':
+        return {'players': [event['player']['id']]}
+    return {}
+
+def _event_changes(event, touched=None):
+    """Return {collection: entries} of the collections an event touched, None for a whole collection
+
+    Without touched: every collection the event can change (events read back from the log).
+    """
+    if event['type'] == 'collections_saved':
+        return dict.fromkeys(event['collections'])
+    entries = _event_entries(event)
+    # A collection the event touched without changing an entry (no doping claimed) is left out
+    return {name: entries.get(name) for name in (entries if touched is None else touched) if entries.get(name) != []}
+
+def _mark_changes(changes):
+    """Mark the changed collections to be written, down to the entries where those are known"""
+    for name, entries in changes.items():
+        if entries is None:
+            store.mark_dirty(name)
+        elif entries:
+            store.mark_entries(name, entries)
+
+# Player lookups by id and startnummer, rebuilt when the player list is loaded
+_registry = None  # PlayerRegistry
+
+def _player_registry():
+    """Return the registry of the current player list"""
+    global _registry
+    registry = _registry
+    if registry is None or not registry.current(players):
+        # Not while another thread is registering a player, it would miss that player
+        with store.transaction():
+            if _registry is None or not _registry.current(players):
+                _registry = PlayerRegistry(players)
+            registry = _registry
+    return registry
+
+# Requests asking for the same computation of the same state at the same time share one run
+_flights = SingleFlight()
+
+def _coalesced(key, func):
+    """Return func(), run once for all requests asking for the same key (computation, state version) meanwhile"""
+    if store.in_transaction():
+        # The run in flight may need the write lock this thread holds, waiting for it would deadlock
+        return func()
+    return _flights.do(key, func)
+
+def _number_taken(number):
+    """Check if a startnummer is already in use"""
+    return _player_registry().number_taken(number)
+
+def _apply_event(event):
+    """Apply a logged change to the in-memory state, returns the collections it touched (None if it failed)"""
+    if event['type'] == 'game_result':
+        game = event['game']
+        _ensure_results_structures()
+        version = _ranking_versions[game]
+        if game == 'stoelendans':
+            results['stoelendans'] = [player_key(player_id) for player_id in event['value']]
+        else:
+            key = player_key(event['player_id'])
+            results[game][key] = BrainGameResult(event['value']) if game in ['rebus', 'wiskunde'] else event['value']
+        for player_id in event['doping_players']:
+            doping_usage[player_key(player_id)] = game
+        _rankings_changed(game)
+        if game != 'stoelendans':
+            _update_sorted_result(game, key, version)
+        return ['results', 'doping_usage']
+    elif event['type'] == 'tournament_match':
+        if not record_tournament_match(event['game'], event['match_id'], event['winner_id'], event['loser_id'],
+                                       event['doping1'], event['doping2']):
+            return None
+        _rankings_changed(event['game'])
+        return ['tournaments', 'doping_usage']
+    elif event['type'] == 'answer_key':
+        _ensure_answer_keys()
+        game = event['game']
+        answer_keys[game] = event['answers']
+        _get_answer_scorer(game)  # Compile the new key once
+        # Popup counts of stored sheets, recomputed with the new key
+        _ensure_results_structures()
+        for player_id, correct_answers in event.get('rescored', []):
+            data = results[game].get(player_key(player_id))
+            if isinstance(data, Mapping):
+                data['correct_answers'] = correct_answers
+        _rankings_changed(game)
+        return ['answer_keys', 'results'] if event.get('rescored') else ['answer_keys']
+    elif event['type'] == 'player_registered':
+        registry = _player_registry()
+        player = Player(event['player'])
+        if registry.get(player['id']) is not None:
+            return None
+        registry.add(player)
+        _collections_changed('players')
+        return ['players']
+    return None
 
 def _ensure_results_structures():
     """Initialize default structures for results per game."""
@@ -175,11 +481,11 @@ def _ensure_results_structures():
     if not isinstance(results, dict):
         results = {}
     # Initialize structures for each game
-    results.setdefault('touwspringen', {})            # {player_id: time_seconds}
+    results.setdefault('touwspringen', {})            # {player_id: jumps}
     results.setdefault('stoelendans', [])             # [player_id, ...] winner -> loser
     results.setdefault('petanque', [])                # [{winner: id, loser: id}, ...]
     results.setdefault('kubb', [])                    # [{winner: id, loser: id}, ...]
-    # Brain games: {player_id: {answers: [10 strings], time_seconds_total: float}}
+    # Brain games: {player_id: BrainGameResult(answers=[10 strings], time_seconds_total=float)}
     results.setdefault('rebus', {})
     results.setdefault('wiskunde', {})
 
@@ -191,282 +497,240 @@ def _ensure_answer_keys():
     answer_keys.setdefault('rebus', [])
     answer_keys.setdefault('wiskunde', [])
 
-def normalize_answer(answer):
-    """
-    Normalize an answer by removing all extra whitespace and converting to lowercase.
-    This ensures answers are correct regardless of the number of spaces.
-    """
-    if answer is None:
-        return ""
-    # Convert to string, remove all extra whitespace, and convert to lowercase
-    return ' '.join(str(answer).split()).lower()
+# Rankings are maintained per game: each game (and the player list) has a version that is
+# bumped when its data changes, so only the positions and categories of changed games are recomputed
+_ranking_versions = {name: 0 for name in GAMES + ['players']}
+_positions_cache = {}  # {game: (version, positions)}
+_sorted_results = {}  # {game: (version, [(sort key, player key), ...], {player key: sort key})}
+_category_cache = {}  # {category: (versions, ranking)}
 
-def normalize_comma_separated_answers(answer):
-    """
-    Normalize comma-separated answers by handling spaces around commas and individual answers.
-    """
-    if answer is None:
-        return []
-    # Split by comma, normalize each part, and filter out empty parts
-    parts = [normalize_answer(part) for part in str(answer).split(',')]
-    return [part for part in parts if part]  # Remove empty parts
+# Ranking versions to bump when a collection changes
+RANKING_DEPENDENCIES = {
+    'players': ['players', 'petanque', 'kubb'],  # The knock-out fallback sorts on player number
+    'results': GAMES,
+    'tournaments': ['petanque', 'kubb'],
+    'answer_keys': ['rebus', 'wiskunde'],
+    'doping_usage': GAMES
+}
+
+def _rankings_changed(*names):
+    """Mark the positions of games (or 'players') as changed"""
+    for name in names:
+        _ranking_versions[name] += 1
+
+def _collections_changed(*collections):
+    """Mark the games depending on changed collections"""
+    for name in collections:
+        _rankings_changed(*RANKING_DEPENDENCIES.get(name, []))
+
+# Compiled answer keys, rebuilt when an answer key changes
+_answer_scorers = {}  # {game: AnswerKey}
+_correct_counts = {}  # {game: {player key: (answers, correct count)}} scored with the current key
+
+def _get_answer_scorer(game):
+    """Return the compiled answer key of a brain game"""
+    key = answer_keys.get(game, [])
+    scorer = _answer_scorers.get(game)
+    if scorer is None or scorer.answers != key:
+        scorer = AnswerKey(game, key)
+        _answer_scorers[game] = scorer
+        _correct_counts[game] = {}
+    return scorer
+
+def _count_correct(game, pid, answers):
+    """Return the number of correct answers of a player's sheet, only scored again if it changed"""
+    scorer = _get_answer_scorer(game)
+    counts = _correct_counts[game]
+    cached = counts.get(pid)
+    if cached and cached[0] == answers:
+        return cached[1]
+    correct_count = scorer.score(answers)
+    counts[pid] = (list(answers), correct_count)
+    return correct_count
+
+def _score_brain_result(game, pid, data):
+    """Return (correct_count, time_seconds_total) of a brain game result"""
+    correct_count = 0
+    time_total = 0.0
+    if isinstance(data, Mapping):
+        # New structure
+        answers = data.get('answers')
+        key = answer_keys.get(game, [])
+        if isinstance(answers, list) and isinstance(key, list) and len(key) == 10 and len(answers) == 10:
+            correct_count = _count_correct(game, pid, answers)
+        # Fallback legacy fields
+        if 'correct' in data:
+            try:
+                correct_count = int(data.get('correct', correct_count))
+            except Exception:
+                pass
+        if 'time_seconds_total' in data:
+            try:
+                time_total = float(data.get('time_seconds_total', 0.0))
+            except Exception:
+                pass
+        elif 'time_seconds' in data:
+            try:
+                time_total = float(data.get('time_seconds', 0.0))
+            except Exception:
+                pass
+    return correct_count, time_total
+
+def _result_sort_key(game, pid, data, order):
+    """Sort key of a touwspringen or brain game result, order (submission order) keeps ties stable"""
+    if game == 'touwspringen':
+        # Higher jump count is better (in 30 seconds)
+        return (-data, order)
+    # More correct is better, tie-breaker lower time
+    correct_count, time_total = _score_brain_result(game, pid, data)
+    return (-correct_count, time_total, order)
+
+def _get_sorted_results(game):
+    """Return the sorted (sort key, player key) entries of a touwspringen or brain game"""
+    version = _ranking_versions[game]
+    cached = _sorted_results.get(game)
+    if cached and cached[0] == version:
+        return cached[1]
+    sort_keys = {pid: _result_sort_key(game, pid, data, order)
+                 for order, (pid, data) in enumerate(results.get(game, {}).items())}
+    entries = sorted((sort_key, pid) for pid, sort_key in sort_keys.items())
+    _sorted_results[game] = (version, entries, sort_keys)
+    return entries
+
+def _update_sorted_result(game, pid, previous_version):
+    """Move one stored result to its place in the sorted entries instead of sorting the whole game"""
+    cached = _sorted_results.get(game)
+    if not cached or cached[0] != previous_version:
+        return  # Not built yet or missed a change, sorted from scratch when needed
+    _, entries, sort_keys = cached
+    # Copy so rankings being computed from the old entries are not affected
+    entries = list(entries)
+    sort_keys = dict(sort_keys)
+    if pid in sort_keys:
+        order = sort_keys[pid][-1]
+        del entries[bisect_left(entries, (sort_keys[pid], pid))]
+    else:
+        order = len(sort_keys)
+    sort_keys[pid] = _result_sort_key(game, pid, results[game][pid], order)
+    insort(entries, (sort_keys[pid], pid))
+    _sorted_results[game] = (_ranking_versions[game], entries, sort_keys)
+
+def _compute_game_positions(game):
+    """Compute the positions (1..N) of one game from raw results, None if it has no results"""
+    if game in ['touwspringen', 'rebus', 'wiskunde']:
+        entries = _get_sorted_results(game)
+        if entries:
+            return {pid: idx + 1 for idx, (_, pid) in enumerate(entries)}
+    elif game == 'stoelendans':
+        # Stoelendans: ordering is winner to loser
+        sd = results.get('stoelendans', [])
+        if sd:
+            return {pid: idx + 1 for idx, pid in enumerate(sd)}
+    elif game in tournaments and tournaments[game]['final_standings']:
+        # Petanque & Kubb: use tournament standings
+        standings = tournaments[game]['final_standings']
+        return {int(s['player_id']): s['position'] for s in standings}
+    else:
+        # Fallback to old system for backward compatibility
+        matches = results.get(game, [])
+        if matches:
+            wins = {}
+            for m in matches:
+                w = int(m.get('winner'))
+                l = int(m.get('loser'))
+                wins[w] = wins.get(w, 0) + 1
+                wins.setdefault(l, wins.get(l, 0))
+            # Sort by wins desc then by player number asc for stability
+            registry = _player_registry()
+            sorted_ids = sorted(wins.items(), key=lambda kv: (-kv[1], registry.number(int(kv[0]))))
+            return {int(pid): idx + 1 for idx, (pid, _) in enumerate(sorted_ids)}
+    return None
 
 def _compute_positions_from_results():
-    """Compute per-game positions (1..N) from raw results."""
+    """Compute per-game positions (1..N) from raw results, reusing the positions of unchanged games."""
     _ensure_results_structures()
     _ensure_answer_keys()
     positions = {}
+    for game in GAMES:
+        # Read the version first: a change made while computing gets a newer version
+        version = _ranking_versions[game]
+        cached = _positions_cache.get(game)
+        if not cached or cached[0] != version:
+            cached = (version, _compute_game_positions(game))
+            _positions_cache[game] = cached
+        if cached[1] is not None:
+            positions[game] = cached[1]
+    return positions
 
-    # Touwspringen: higher jump count is better (in 30 seconds)
-    ts = results.get('touwspringen', {})
-    if ts:
-        sorted_ids = sorted(ts.items(), key=lambda kv: kv[1], reverse=True)
-        positions['touwspringen'] = {int(pid): idx + 1 for idx, (pid, _) in enumerate(sorted_ids)}
-
-    # Stoelendans: ordering is winner to loser
-    sd = results.get('stoelendans', [])
-    if sd:
-        positions['stoelendans'] = {int(pid): idx + 1 for idx, pid in enumerate(sd)}
-
-    # Petanque & Kubb: use tournament standings if available
-    for game in ['petanque', 'kubb']:
-        if game in tournaments and tournaments[game]['final_standings']:
-            # Use tournament standings
-            standings = tournaments[game]['final_standings']
-            positions[game] = {int(s['player_id']): s['position'] for s in standings}
-        else:
-            # Fallback to old system for backward compatibility
-            matches = results.get(game, [])
-            if matches:
-                wins = {}
-                for m in matches:
-                    w = int(m.get('winner'))
-                    l = int(m.get('loser'))
-                    wins[w] = wins.get(w, 0) + 1
-                    wins.setdefault(l, wins.get(l, 0))
-                # Sort by wins desc then by player number asc for stability
-                player_num_map = {p['id']: p['number'] for p in players}
-                sorted_ids = sorted(wins.items(), key=lambda kv: (-kv[1], player_num_map.get(int(kv[0]), 0)))
-                positions[game] = {int(pid): idx + 1 for idx, (pid, _) in enumerate(sorted_ids)}
-
-    # Rebus & Wiskunde: more correct is better, tie-breaker lower time
-    for game in ['rebus', 'wiskunde']:
-        raw = results.get(game, {})
-        if raw:
-            key = answer_keys.get(game, [])
-            computed = []  # list of tuples (player_id, correct_count, time_seconds_total)
-            for pid_str, data in raw.items():
-                try:
-                    pid = int(pid_str)
-                except Exception:
-                    pid = int(pid_str) if isinstance(pid_str, int) else pid_str
-                correct_count = 0
-                time_total = 0.0
-                if isinstance(data, dict):
-                    # New structure
-                    answers = data.get('answers')
-                    if isinstance(answers, list) and isinstance(key, list) and len(key) == 10 and len(answers) == 10:
-                        for i, (a, b) in enumerate(zip(answers, key)):
-                            if i == 0 and game == 'wiskunde':  # Question 1 for wiskunde (x,y)
-                                # Handle x,y values for question 1
-                                if str(a).strip() and str(b).strip():
-                                    user_answers = normalize_comma_separated_answers(a)
-                                    correct_answers = normalize_comma_separated_answers(b)
-                                    if len(user_answers) == 2 and len(correct_answers) == 2:
-                                        # Check if both x and y are correct
-                                        if (user_answers[0] == correct_answers[0] and
-                                            user_answers[1] == correct_answers[1]):
-                                            correct_count += 1
-                            elif i == 1 and game == 'wiskunde':  # Question 2 for wiskunde (x,W(x))
-                                # Handle x,W(x) values for question 2
-                                if str(a).strip() and str(b).strip():
-                                    user_answers = normalize_comma_separated_answers(a)
-                                    correct_answers = normalize_comma_separated_answers(b)
-                                    if len(user_answers) == 2 and len(correct_answers) == 2:
-                                        # Check if both x and W(x) are correct
-                                        if (user_answers[0] == correct_answers[0] and
-                                            user_answers[1] == correct_answers[1]):
-                                            correct_count += 1
-                            elif i == 9 and game == 'rebus':  # Question 10 for rebus
-                                # Handle multiple answers for question 10
-                                if str(a).strip() and str(b).strip():
-                                    user_answers = normalize_comma_separated_answers(a)
-                                    correct_answers = normalize_comma_separated_answers(b)
-                                    if len(user_answers) == 4 and len(correct_answers) == 4:
-                                        # Check if all 4 answers are correct (order doesn't matter)
-                                        user_set = set(user_answers)
-                                        correct_set = set(correct_answers)
-                                        if user_set == correct_set:
-                                            correct_count += 1
-                            else:
-                                # Normal answer comparison
-                                if normalize_answer(a) == normalize_answer(b):
-                                    correct_count += 1
-                    # Fallback legacy fields
-                    if 'correct' in data:
-                        try:
-                            correct_count = int(data.get('correct', correct_count))
-                        except Exception:
-                            pass
-                    if 'time_seconds_total' in data:
-                        try:
-                            time_total = float(data.get('time_seconds_total', 0.0))
-                        except Exception:
-                            pass
-                    elif 'time_seconds' in data:
-                        try:
-                            time_total = float(data.get('time_seconds', 0.0))
-                        except Exception:
-                            pass
-                computed.append((pid, correct_count, time_total))
-            # Sort by correct desc, then time asc
-            computed.sort(key=lambda t: (-t[1], t[2]))
-            positions[game] = {int(pid): idx + 1 for idx, (pid, _, __) in enumerate(computed)}
+def _points_matrix(computed_positions=None):
+    """Return the points of every player in every game as a PointsMatrix"""
+    if computed_positions is None:
+        computed_positions = _compute_positions_from_results()
+    # Kubb & Petanque points come from the tournament final standings, the other games from SCORING_POINTS
+    standing_points = {game: {s['player_id']: s['points'] for s in tournaments.get(game, {}).get('final_standings') or []}
+                       for game in ['petanque', 'kubb']}
+    return PointsMatrix(players, GAMES, computed_positions, SCORING_POINTS,
+                        standing_points, doping_usage)
 
-    return positions
+def _ranking_rows(matrix, games, tiebreak_game=None):
+    """Return [(player_id, {'name', 'number', 'points'}), ...] sorted by the points in the given games"""
+    totals = matrix.totals(games)
+    rows = matrix.players
+    return [(rows[row]['id'], {'name': rows[row]['name'], 'number': rows[row]['number'], 'points': totals[row]})
+            for row in matrix.order(totals, tiebreak_game)]
 
-def calculate_ranking(game_type=None):
+def calculate_ranking(game_type=None, matrix=None):
     """Calculate rankings for a specific game type or overall"""
-    if game_type is None:
-        # For overall ranking, sum the points from all category rankings
-        category_rankings = {}
-        for category in GAME_CATEGORIES.keys():
-            category_rankings[category] = calculate_category_ranking(category)
-        
-        # Sum points across all categories
-        player_points = {}
-        for player in players:
-            player_id = player['id']
-            total_points = 0
-            
-            for category, rankings in category_rankings.items():
-                for rank_player_id, rank_info in rankings:
-                    if rank_player_id == player_id:
-                        total_points += rank_info['points']
-                        break
-            
-            player_points[player_id] = {
-                'name': player['name'],
-                'number': player['number'],
-                'points': total_points
-            }
-        
-        # Sort by points (descending)
-        sorted_players = sorted(player_points.items(), key=lambda x: x[1]['points'], reverse=True)
-        return sorted_players
-    else:
-        # For specific game type, calculate directly
-        player_points = {}
-        computed_positions = _compute_positions_from_results()
-        
-        for player in players:
-            player_id = player['id']
-            total_points = 0
-            
-            if player_id in computed_positions.get(game_type, {}):
-                position = computed_positions[game_type][player_id]
-                if game_type in ['petanque', 'kubb']:
-                    # Tournament scoring for Kubb & Petanque
-                    # Get points from tournament final standings
-                    if game_type in tournaments and tournaments[game_type]['final_standings']:
-                        for standing in tournaments[game_type]['final_standings']:
-                            if standing['player_id'] == player_id:
-                                base_points = standing['points']
-                                # Apply doping multiplier if used for this game
-                                if player_id in doping_usage and doping_usage[player_id] == game_type:
-                                    base_points *= 2
-                                total_points = base_points
-                                break
-                else:
-                    # Standard scoring for other games
-                    if position <= len(SCORING_POINTS):
-                        base_points = SCORING_POINTS[position - 1]
-                        # Apply doping multiplier if used for this game
-                        if player_id in doping_usage and doping_usage[player_id] == game_type:
-                            base_points *= 2
-                        total_points = base_points
-            
-            player_points[player_id] = {
-                'name': player['name'],
-                'number': player['number'],
-                'points': total_points
-            }
-        
-        # Sort by points (descending)
-        sorted_players = sorted(player_points.items(), key=lambda x: x[1]['points'], reverse=True)
-        return sorted_players
+    if matrix is None:
+        matrix = _points_matrix()
+    # Overall: the points of all categories
+    games = [game for games in GAME_CATEGORIES.values() for game in games] if game_type is None else [game_type]
+    return _ranking_rows(matrix, games)
 
-def calculate_category_ranking(category):
+def calculate_category_ranking(category, computed_positions=None, matrix=None):
     """Calculate rankings for a specific category of games"""
-    player_points = {}
-    computed_positions = _compute_positions_from_results()
-    
-    for player in players:
-        player_id = player['id']
-        total_points = 0
-        
-        for game in GAME_CATEGORIES[category]:
-            game_positions = computed_positions.get(game, {})
-            if player_id in game_positions:
-                position = game_positions[player_id]
-                if game in ['petanque', 'kubb']:
-                    # Tournament scoring for Kubb & Petanque
-                    # Get points from tournament final standings
-                    if game in tournaments and tournaments[game]['final_standings']:
-                        for standing in tournaments[game]['final_standings']:
-                            if standing['player_id'] == player_id:
-                                base_points = standing['points']
-                                # Apply doping multiplier if used for this game
-                                if player_id in doping_usage and doping_usage[player_id] == game:
-                                    base_points *= 2
-                                total_points += base_points
-                                break
-                else:
-                    # Standard scoring for other games
-                    if position <= len(SCORING_POINTS):
-                        base_points = SCORING_POINTS[position - 1]
-                        # Apply doping multiplier if used for this game
-                        if player_id in doping_usage and doping_usage[player_id] == game:
-                            base_points *= 2
-                        total_points += base_points
-        
-        player_points[player_id] = {
-            'name': player['name'],
-            'number': player['number'],
-            'points': total_points
-        }
-    
-    # Sort by points (descending)
-    sorted_players = sorted(player_points.items(), key=lambda x: x[1]['points'], reverse=True)
-    
-    # Handle tie-breakers for ball games (bolletjestrui)
-    if category == 'ball_games':
-        sorted_players = apply_ball_games_tiebreaker(sorted_players, computed_positions)
-    
-    return sorted_players
-
-def apply_ball_games_tiebreaker(sorted_players, computed_positions):
-    """Apply tie-breaker for ball games using Petanque rankings"""
-    # Group players by points
-    points_groups = {}
-    for player_id, player_info in sorted_players:
-        points = player_info['points']
-        if points not in points_groups:
-            points_groups[points] = []
-        points_groups[points].append((player_id, player_info))
-    
-    # Sort each group by Petanque ranking (if tied)
-    final_sorted = []
-    for points in sorted(points_groups.keys(), reverse=True):
-        group = points_groups[points]
-        if len(group) > 1:
-            # Apply Petanque tie-breaker
-            group_sorted = sorted(group, key=lambda x: computed_positions.get('petanque', {}).get(x[0], float('inf')))
-            final_sorted.extend(group_sorted)
-        else:
-            final_sorted.extend(group)
-    
-    return final_sorted
+    if matrix is None:
+        matrix = _points_matrix(computed_positions)
+    # Tie-breaker for ball games (bolletjestrui): Petanque ranking
+    tiebreak_game = 'petanque' if category == 'ball_games' else None
+    return _ranking_rows(matrix, GAME_CATEGORIES[category], tiebreak_game)
+
+# Rankings cached for the ranking versions they were computed from, see get_all_rankings()
+_rankings_cache = (None, None)
+
+def get_all_rankings():
+    """Get all four jersey rankings, only recomputing the categories of games that changed"""
+    # Read the versions first: a change made while computing gets a newer version
+    versions = dict(_ranking_versions)
+    cached_versions, rankings = _rankings_cache
+    if cached_versions == versions:
+        return rankings
+    return _coalesced(('rankings', tuple(versions.values())), lambda: _compute_all_rankings(versions))
+
+def _compute_all_rankings(versions):
+    """Compute the jersey rankings for the given ranking versions and cache them"""
+    global _rankings_cache
+    cached_versions, rankings = _rankings_cache
+    if cached_versions == versions:
+        return rankings  # Computed by the run that just finished
+    
+    matrix = _points_matrix()
+    category_rankings = {}
+    for category, games in GAME_CATEGORIES.items():
+        category_versions = tuple(versions[name] for name in games + ['players'])
+        cached = _category_cache.get(category)
+        if not cached or cached[0] != category_versions:
+            cached = (category_versions, calculate_category_ranking(category, matrix=matrix))
+            _category_cache[category] = cached
+        category_rankings[category] = cached[1]
+    rankings = {
+        'gele_trui': calculate_ranking(matrix=matrix),  # Overall ranking
+        'groene_trui': category_rankings['speed_games'],
+        'bolletjes_trui': category_rankings['ball_games'],
+        'witte_trui': category_rankings['brain_games']
+    }
+    _rankings_cache = (versions, rankings)
+    return rankings
 
 def generate_opponents():
     """Generate opponent pairs only for petanque and kubb, ensuring different opponents per game."""
@@ -526,62 +790,13 @@ def generate_tournament(game):
     import random
     random.shuffle(available_players)
     
-    # Calculate number of rounds needed
-    num_players = len(available_players)
-    num_rounds = 1
-    while (2 ** num_rounds) < num_players:
-        num_rounds += 1
-    
-    # Initialize tournament structure
-    tournament = {
-        'rounds': [],
-        'current_round': 0,
-        'final_standings': [],
-        'num_rounds': num_rounds,
-        'bye_players': []  # Track players who had bye to prevent consecutive byes
-    }
-    
-    # Generate first round matches
-    first_round = []
-    for i in range(0, len(available_players), 2):
-        if i + 1 < len(available_players):
-            # Normal match between two players
-            match = {
-                'match_id': f"{game}_r1_m{i//2}",
-                'player1': available_players[i],
-                'player2': available_players[i + 1],
-                'winner': None,
-                'loser': None,
-                'doping1': False,
-                'doping2': False,
-                'completed': False
-            }
-            first_round.append(match)
-        else:
-            # Odd number of players - last player gets a bye and advances automatically
-            bye_match = {
-                'match_id': f"{game}_r1_m{i//2}",
-                'player1': available_players[i],
-                'player2': None,  # No opponent
-                'winner': available_players[i]['id'],  # Automatically wins
-                'loser': None,
-                'doping1': False,
-                'doping2': False,
-                'completed': True  # Already completed
-            }
-            first_round.append(bye_match)
-            # Track this player as having had a bye
-            tournament['bye_players'].append(available_players[i]['id'])
-    
-    tournament['rounds'].append(first_round)
-    
-    # Store tournament
-    tournaments[game] = tournament
+    # Every round of the bracket up front, byes in round 1 for the top seeds
+    tournaments[game] = build_bracket(game, available_players)
     
     return True
 
 def advance_tournament(game, match_id, winner_id, loser_id, doping1=False, doping2=False):
-    """Advance tournament after a match is completed"""
+    """Advance tournament after a match is completed, checked with tournament_match_error() first"""
     global tournaments, doping_usage
     
     if game not in tournaments:
@@ -589,59 +804,122 @@ def advance_tournament(game, match_id, winner_id, loser_id, doping1=False, dopin
     
     tournament = tournaments[game]
     current_round = tournament['current_round']
+    index = _tournament_index(game)
     
-    # Find and update the match
-    match_found = False
-    for match in tournament['rounds'][current_round]:
-        if match['match_id'] == match_id:
-            # Skip if this is a bye match that's already completed
-            if match['completed'] and match['player2'] is None:
-                match_found = True
-                break
-                
-            match['winner'] = winner_id
-            match['loser'] = loser_id
-            match['doping1'] = doping1
-            match['doping2'] = doping2
-            match['completed'] = True
-            match_found = True
-            break
-    
-    if not match_found:
+    # Find and update the match, only matches of the current round can be played
+    match_round, match = index.find(match_id)
+    if match is None or match_round != current_round:
         return False
+    # Skip if this is a bye match that's already completed
+    if not (match['completed'] and match['player2'] is None):
+        if not match['completed']:
+            index.complete(match_round, match)
+        match['winner'] = winner_id
+        match['loser'] = loser_id
+        match['doping1'] = doping1
+        match['doping2'] = doping2
+        match['completed'] = True
+        if 'bracket_size' in tournament and current_round < tournament['num_rounds'] - 1:
+            # The winner takes their place in the next round, replacing the winner of an overwritten result
+            next_round, next_idx, slot = feeds(current_round, index.position(match_id))
+            index.place(tournament['rounds'][next_round][next_idx], slot, winner_id)
     
     # Track doping usage (can only be used once across all games)
-    # For tournaments, doping can only be used in round 1
     if doping1:
-        if winner_id in doping_usage:
-            return False  # Player already used doping
-        if current_round > 0:
-            return False  # Doping can only be used in round 1
         doping_usage[winner_id] = game
     if doping2:
-        if loser_id in doping_usage:
-            return False  # Player already used doping
-        if current_round > 0:
-            return False  # Doping can only be used in round 1
         doping_usage[loser_id] = game
     
     # Check if current round is complete
-    current_round_matches = tournament['rounds'][current_round]
-    if all(match['completed'] for match in current_round_matches):
+    if index.round_complete(current_round):
         # Advance to next round
         if current_round < tournament['num_rounds'] - 1:
-            next_round = generate_next_round(tournament, current_round)
-            if next_round:
-                tournament['rounds'].append(next_round)
+            if 'bracket_size' in tournament:
+                # Already filled in by the winners
                 tournament['current_round'] += 1
+            else:
+                # Tournament generated before brackets were built up front
+                next_round = generate_next_round(tournament, current_round)
+                if next_round:
+                    tournament['rounds'].append(next_round)
+                    index.add_round(next_round)
+                    tournament['current_round'] += 1
         else:
             # Tournament complete, generate final standings
             generate_final_standings(tournament)
     
     return True
 
+# Match indexes per tournament, rebuilt when a tournament is loaded or generated
+_tournament_indexes = {}  # {game: TournamentIndex}
+
+def _tournament_index(game):
+    """Return the match index of a tournament"""
+    index = _tournament_indexes.get(game)
+    if index is None or not index.current(tournaments[game]):
+        # Not while another thread is changing the tournament, it would miss that change
+        with store.transaction():
+            index = _tournament_indexes.get(game)
+            if index is None or not index.current(tournaments[game]):
+                index = TournamentIndex(tournaments[game])
+                _tournament_indexes[game] = index
+    return index
+
+def _find_match(game, match_id):
+    """Return the tournament match with the given id, or None"""
+    if game not in tournaments:
+        return None
+    return _tournament_index(game).find(match_id)[1]
+
+def _tournament_has_results(game):
+    """Check if a tournament has a played match (byes excluded)"""
+    return game in tournaments and _tournament_index(game).has_results()
+
+def tournament_match_error(game, match_id, winner_id, loser_id, doping1=False, doping2=False):
+    """Return (message, doping error) if a match result can't be stored, None if it can; nothing is changed"""
+    if game not in tournaments:
+        return 'Fout bij opslaan wedstrijd', False
+    tournament = tournaments[game]
+    current_round = tournament['current_round']
+    # Only matches of the current round can be played
+    match_round, match = _tournament_index(game).find(match_id)
+    if match is None or match_round != current_round:
+        return 'Fout bij opslaan wedstrijd', False
+    # Doping claimed in the result that is overwritten is given back
+    released = set()
+    if match['completed']:
+        if match['doping1']:
+            released.add(match['winner'])
+        if match['doping2']:
+            released.add(match['loser'])
+    # Doping can only be used once across all games, and for tournaments only in round 1
+    for claimed, player_id in [(doping1, winner_id), (doping2, loser_id)]:
+        if not claimed:
+            continue
+        if player_id in doping_usage and player_id not in released:
+            return f'Speler heeft al doping gebruikt voor {doping_usage[player_id]}', True
+        if current_round > 0:
+            return 'Doping kan alleen in ronde 1 gebruikt worden', True
+    return None
+
+def record_tournament_match(game, match_id, winner_id, loser_id, doping1=False, doping2=False):
+    """Store a (possibly overwritten) match result and advance the tournament, False if it is refused"""
+    # Everything is checked before the match or doping usage is touched
+    if tournament_match_error(game, match_id, winner_id, loser_id, doping1, doping2):
+        return False
+    # Check if match is already completed and allow overwrite
+    match = _find_match(game, match_id)
+    if match and match['completed']:
+        # Reset doping usage for the previous players if they used it
+        if match['doping1'] and match['winner'] in doping_usage:
+            _rankings_changed(doping_usage.pop(match['winner']))
+        if match['doping2'] and match['loser'] in doping_usage:
+            _rankings_changed(doping_usage.pop(match['loser']))
+    
+    return advance_tournament(game, match_id, winner_id, loser_id, doping1, doping2)
+
 def generate_next_round(tournament, current_round):
-    """Generate the next round of the tournament with bye prevention"""
+    """Generate the next round of a tournament without bracket_size (generated round by round) with bye prevention"""
     current_matches = tournament['rounds'][current_round]
     next_round = []
     
@@ -666,7 +944,7 @@ def generate_next_round(tournament, current_round):
             winners.remove(bye_player)
             
             # Create bye match
-            bye_match = {
+            bye_match = TournamentMatch({
                 'match_id': f"r{current_round + 2}_bye",
                 'player1': {'id': bye_player},
                 'player2': None,  # No opponent
@@ -675,14 +953,14 @@ def generate_next_round(tournament, current_round):
                 'doping1': False,
                 'doping2': False,
                 'completed': True  # Already completed
-            }
+            })
             next_round.append(bye_match)
     
     # Generate normal matches for remaining players
     for i in range(0, len(winners), 2):
         if i + 1 < len(winners):
             # Normal match between two winners
-            next_match = {
+            next_match = TournamentMatch({
                 'match_id': f"r{current_round + 2}_m{i//2}",
                 'player1': {'id': winners[i]},
                 'player2': {'id': winners[i + 1]},
@@ -691,143 +969,445 @@ def generate_next_round(tournament, current_round):
                 'doping1': False,
                 'doping2': False,
                 'completed': False
-            }
+            })
             next_round.append(next_match)
     
     return next_round
 
 def generate_final_standings(tournament):
     """Generate final standings based on tournament results with new scoring system"""
-    standings = []
-    
-    # Get the final match
-    if tournament['rounds'][-1]:
-        final_match = tournament['rounds'][-1][0]
-        
-        # Final winner gets 25 points
-        if final_match['winner']:
-            standings.append({
-                'player_id': final_match['winner'],
-                'position': 1,
-                'points': TOURNAMENT_SCORING['final_winner']
-            })
-        
-        # Final loser gets 22 points
-        if final_match['loser']:
-            standings.append({
-                'player_id': final_match['loser'],
-                'position': 2,
-                'points': TOURNAMENT_SCORING['final_loser']
-            })
-    
-    # Calculate points for players eliminated in earlier rounds
-    # We need to track when each player was eliminated
-    eliminated_players = {}
-    
-    # Go through all rounds to find when each player was eliminated
-    for round_idx, round_matches in enumerate(tournament['rounds']):
-        for match in round_matches:
-            if match['completed'] and match['loser']:
-                eliminated_players[match['loser']] = round_idx
-    
-    # Assign points based on elimination round
-    for player_id, elimination_round in eliminated_players.items():
-        # Skip final winner and loser (already handled above)
-        if player_id in [final_match['winner'], final_match['loser']]:
-            continue
-            
-        # Determine points based on elimination round
-        if elimination_round == len(tournament['rounds']) - 2:  # Semi-final
-            points = TOURNAMENT_SCORING['semi_final_losers']
-        elif elimination_round == len(tournament['rounds']) - 3:  # Quarter-final
-            points = TOURNAMENT_SCORING['quarter_final_losers']
-        elif elimination_round == len(tournament['rounds']) - 4:  # Round of 16
-            points = TOURNAMENT_SCORING['round_of_16_losers']
-        else:  # Earlier rounds (Round of 32, etc.)
-            points = TOURNAMENT_SCORING['round_of_32_losers']
-        
-        standings.append({
-            'player_id': player_id,
-            'position': len(standings) + 1,
-            'points': points
-        })
-    
-    # Sort by points (descending) and then by position
-    standings.sort(key=lambda x: (-x['points'], x['position']))
-    
-    # Update positions after sorting
-    for i, standing in enumerate(standings):
-        standing['position'] = i + 1
-    
-    tournament['final_standings'] = standings
+    # Points for losing in the final, semi-final, quarter-final and round of 16; earlier rounds get round_of_32_losers
+    points_by_depth = [TOURNAMENT_SCORING['final_loser'], TOURNAMENT_SCORING['semi_final_losers'],
+                       TOURNAMENT_SCORING['quarter_final_losers'], TOURNAMENT_SCORING['round_of_16_losers']]
+    tournament['final_standings'] = elimination_standings(
+        tournament, TOURNAMENT_SCORING['final_winner'], points_by_depth, TOURNAMENT_SCORING['round_of_32_losers'])
+
+def _scored_count(game):
+    """Return the number of results of a game; a knock-out tournament only counts its players once it is finished"""
+    tournament = tournaments.get(game)
+    if tournament and tournament['rounds']:
+        return len(tournament['final_standings'])
+    return len(results.get(game, []))
 
 def all_scores_in(category=None):
+    """Check if every player has a result in every game (of a category)"""
+    games = GAMES if category is None else GAME_CATEGORIES[category]
     no_players = len(players)
-    scored = 0
-    if category is None:
-        game_count = 6
-        if no_players == 0 or game_count == 0:
-            return False
-        expected = no_players * game_count
-        scored=len([v for lst in results.values() for v in lst])
+    if no_players == 0:
+        return False
+    return all(_scored_count(game) == no_players for game in games)
 
-    else:
-        game_count = len(GAME_CATEGORIES[category])
-        if no_players == 0 or game_count == 0:
-            return False
-        expected = no_players * game_count
-        for game in GAME_CATEGORIES[category]:
-            scored+=len(results[game])
+# Winners are kept for the ranking versions they were computed from: polling /check_winners
+# only compares versions until a result, match or player changes
+_winners_cache = (None, None)  # (ranking versions, {jersey: winner})
 
-    return scored == expected
+def _jersey_winner(jersey, category):
+    """Return the leader of a jersey ranking as a winner, or None without players"""
+    rankings = get_all_rankings()[jersey]
+    if not rankings:
+        return None
+    winner_id, winner_info = rankings[0]
+    
+    # Find the player object to get picture
+    player_obj = _player_registry().get(winner_id)
+    
+    return {
+        'id': winner_id,
+        'name': winner_info['name'],
+        'number': winner_info['number'],
+        'points': winner_info['points'],
+        'picture': player_obj.get('picture') if player_obj else None,
+        'category': category
+    }
+
+def _jersey_winners():
+    """Return {jersey: winner} for the jerseys whose scores are all in"""
+    global _winners_cache
+    # Read the versions first: a change made while computing gets a newer version
+    versions = dict(_ranking_versions)
+    cached_versions, winners = _winners_cache
+    if cached_versions == versions:
+        return winners
+    
+    winners = {}
+    if all_scores_in():
+        winners['gele_trui'] = _jersey_winner('gele_trui', 'overall')
+    for category, jersey in CATEGORY_JERSEYS.items():
+        if all_scores_in(category):
+            winners[jersey] = _jersey_winner(jersey, category)
+    _winners_cache = (versions, winners)
+    return winners
 
 def get_category_winner(category):
     """Get the winner of a specific category if all scores are in"""
-    if not all_scores_in(category):
-        return None
-    
-    rankings = calculate_category_ranking(category)
-    if rankings and len(rankings) > 0:
-        winner_data = rankings[0]
-        winner_id = winner_data[0]
-        winner_info = winner_data[1]
-        
-        # Find the player object to get picture
-        player_obj = next((p for p in players if p['id'] == winner_id), None)
-        
-        return {
-            'id': winner_id,
-            'name': winner_info['name'],
-            'number': winner_info['number'],
-            'points': winner_info['points'],
-            'picture': player_obj.get('picture') if player_obj else None,
-            'category': category
-        }
-    return None
+    return _jersey_winners().get(CATEGORY_JERSEYS[category])
 
 def get_overall_winner():
     """Get the overall winner if all scores are in"""
-    if not all_scores_in():
+    return _jersey_winners().get('gele_trui')
+
+# Entries changed by every logged event, so /changes and /events send only those. Versions
+# are event sequence numbers, the same in every worker; events a worker did not apply itself
+# (it loaded a newer snapshot instead) are read back from the log
+CHANGES_HISTORY = 4096  # Events a version can be behind, older versions get everything
+_change_log = {}  # {seq: {collection: entries, None for the whole collection}}, changed under the store lock
+
+def _changes_logged(seq, changes):
+    """Remember the entries an event changed"""
+    _change_log[seq] = changes
+    if len(_change_log) > 2 * CHANGES_HISTORY:
+        for number in sorted(_change_log)[:-CHANGES_HISTORY]:
+            del _change_log[number]
+
+def _changes_since(seq, current):
+    """Return {collection: entries} changed by the events after seq up to current, None if they are not known"""
+    if seq is None or not 0 <= seq <= current or current - seq > CHANGES_HISTORY:
         return None
-    
-    rankings = calculate_ranking()
-    if rankings and len(rankings) > 0:
-        winner_data = rankings[0]
-        winner_id = winner_data[0]
-        winner_info = winner_data[1]
-        
-        # Find the player object to get picture
-        player_obj = next((p for p in players if p['id'] == winner_id), None)
-        
-        return {
-            'id': winner_id,
-            'name': winner_info['name'],
-            'number': winner_info['number'],
-            'points': winner_info['points'],
-            'picture': player_obj.get('picture') if player_obj else None,
-            'category': 'overall'
+    missing = [number for number in range(seq + 1, current + 1) if number not in _change_log]
+    if missing:
+        for event in store.events_since(missing[0] - 1):
+            if event['seq'] <= current and event['seq'] not in _change_log:
+                _changes_logged(event['seq'], _event_changes(event))
+        if any(number not in _change_log for number in missing):
+            return None  # Compacted away without an archive
+    changed = {}
+    for number in range(seq + 1, current + 1):
+        for name, entries in _change_log[number].items():
+            if entries is None or changed.get(name, ()) is None:
+                changed[name] = None
+            else:
+                changed[name] = changed.get(name, set()) | set(entries)
+    return changed
+
+def _json_copy(value):
+    """Copy of live state, taken under the lock and sent after it is released"""
+    return json.loads(json.dumps(value, default=json_default))
+
+def _entry_games(entries, games):
+    """Return (games with changes, games changed as a whole) of result or tournament entries"""
+    if entries is None:
+        return games, games
+    return ({entry if isinstance(entry, str) else entry[0] for entry in entries},
+            {entry for entry in entries if isinstance(entry, str)})
+
+def _changes_patch(changed):
+    """Results and tournament entries changed, in the form /changes sends them"""
+    patch = {'results': {}, 'tournaments': {}}
+    entries = changed.get('results', ())
+    games, whole = _entry_games(entries, set(results) | set(GAMES))
+    for game in sorted(games if 'results' in changed else ()):
+        current = results.get(game)
+        if game in whole or not isinstance(current, dict):
+            patch['results'][game] = {'value': _json_copy(current)}
+            continue
+        player_ids = {entry[1] for entry in entries if isinstance(entry, tuple) and entry[0] == game}
+        patch['results'][game] = {
+            'set': {str(player_id): _json_copy(current[player_id]) for player_id in player_ids if player_id in current},
+            'removed': [str(player_id) for player_id in player_ids if player_id not in current]
         }
-    return None
+    entries = changed.get('tournaments', ())
+    games, whole = _entry_games(entries, set(tournaments) | {'petanque', 'kubb'})
+    for game in sorted(games if 'tournaments' in changed else ()):
+        tournament = tournaments.get(game)
+        if game in whole or tournament is None:
+            patch['tournaments'][game] = {'replace': _json_copy(tournament)}
+            continue
+        rounds = tournament['rounds']
+        positions = sorted({tuple(entry[1:]) for entry in entries if isinstance(entry, tuple) and entry[0] == game})
+        patch['tournaments'][game] = {
+            'info': _json_copy({key: value for key, value in tournament.items() if key != 'rounds'}),
+            # [round, position in the round, match] of changed and added matches
+            'matches': [[round_idx, idx, _json_copy(rounds[round_idx][idx])] for round_idx, idx in positions
+                        if round_idx < len(rounds) and idx < len(rounds[round_idx])]
+        }
+    return patch
+
+# Rankings sent per version by /changes, so a client that comes back gets only the rows that moved
+RANKINGS_HISTORY = 64
+_rankings_sent = {}  # {seq: rankings}
+_rankings_sent_lock = threading.Lock()
+
+def _current_rankings():
+    """Rankings of exactly the loaded state, called under the store lock (the same in every worker for a version)
+
+    Only computed here if get_all_rankings(), called before taking the lock, was overtaken by a change.
+    """
+    return _compute_all_rankings(dict(_ranking_versions))
+
+def _rankings_patch(before, rankings):
+    """Ranking rows that differ from the rankings a client has (all rows if those are not known)"""
+    patch = {}
+    for jersey, ranking in rankings.items():
+        old = before.get(jersey, []) if before is not None else []
+        if old is ranking:
+            continue
+        rows = [[idx + 1, [player_id, info]] for idx, (player_id, info) in enumerate(ranking)
+                if before is None or idx >= len(old) or old[idx] != (player_id, info)]
+        if rows or len(old) != len(ranking):
+            patch[jersey] = {'rows': rows, 'length': len(ranking)}
+    return patch
+
+# Live updates for /events: a publisher thread per worker sends the entries changed by the
+# events after the previous message, with the ranking rows that moved since then
+SSE_HISTORY = 256
+SSE_POLL_SECONDS = 1.0  # How often changes made by other workers are looked for
+SSE_HEARTBEAT_SECONDS = 15
+_sse_changed = threading.Condition()  # Notified when this worker changed the state
+_sse_published = threading.Condition()  # Notified when a message was published
+_sse_messages = deque(maxlen=SSE_HISTORY)  # (number, version, changes or None to resync)
+_sse_count = 0
+_sse_thread = None
+
+def _notify_state_changed():
+    """Wake up the /events publisher of this worker"""
+    with _sse_changed:
+        _sse_changed.notify_all()
+
+def _start_sse_publisher():
+    """Start the publisher thread of this worker if it is not running"""
+    global _sse_thread
+    with _sse_published:
+        if _sse_thread is None or not _sse_thread.is_alive():
+            _sse_thread = threading.Thread(target=_run_sse_publisher, daemon=True)
+            _sse_thread.start()
+
+def _run_sse_publisher():
+    global _sse_count
+    last = None  # _live_state() of the last message
+    while True:
+        if last is not None:
+            with _sse_changed:
+                _sse_changed.wait(SSE_POLL_SECONDS)
+        try:
+            load_data()
+            if last is not None and store.seq == last['seq']:
+                continue
+            current = _live_state(last['seq'] if last else None)
+            changes = _live_changes(last, current) if last else []
+        except Exception:
+            app.logger.exception('Live update mislukt')
+            with _sse_changed:
+                _sse_changed.wait(SSE_POLL_SECONDS)
+            continue
+        last = current
+        if changes != []:
+            with _sse_published:
+                _sse_count += 1
+                _sse_messages.append((_sse_count, str(current['seq']), changes))
+                _sse_published.notify_all()
+
+def _tournament_progress(tournament):
+    """(current round, finished, pairings of the first round) of a tournament, None without one"""
+    if not tournament:
+        return None
+    first_round = (tournament['rounds'] or [[]])[0]
+    return (tournament['current_round'], bool(tournament['final_standings']),
+            tuple(((match['player1'] or {}).get('id'), (match['player2'] or {}).get('id')) for match in first_round))
+
+def _live_state(since):
+    """What /events compares: the entries changed since a version, rankings, tournament progress and winners"""
+    get_all_rankings()
+    with store.loading():
+        _ensure_results_structures()
+        seq = store.seq
+        changed = _changes_since(since, seq)
+        matches = []
+        for entry in (changed or {}).get('tournaments') or ():
+            if isinstance(entry, tuple) and entry[0] in tournaments:
+                game, round_idx, idx = entry
+                rounds = tournaments[game]['rounds']
+                match = rounds[round_idx][idx] if round_idx < len(rounds) and idx < len(rounds[round_idx]) else None
+                if match and match['completed'] and match['player2'] is not None:
+                    matches.append({'type': 'match', 'game': game, 'match_id': match['match_id'],
+                                    'winner': match['winner'], 'loser': match['loser']})
+        state = {
+            'seq': seq,
+            'changed': changed,
+            'players': len(players),
+            'matches': matches,
+            'progress': {game: _tournament_progress(tournaments.get(game)) for game in ['petanque', 'kubb']},
+            'rankings': _current_rankings()
+        }
+    state['winners'] = _current_winners()
+    return state
+
+def _live_changes(old, new):
+    """Return compact changes between two live states for /events, None if the entries changed are not known"""
+    changed = new['changed']
+    if changed is None:
+        return None
+    changes = []
+    if 'players' in changed:
+        changes.append({'type': 'players', 'count': new['players']})
+    if 'results' in changed:
+        for game in GAMES if changed['results'] is None else sorted({entry if isinstance(entry, str) else entry[0]
+                                                                     for entry in changed['results']}):
+            player_ids = sorted(entry[1] for entry in changed['results'] or () if isinstance(entry, tuple) and entry[0] == game)
+            if changed['results'] is None or game in changed['results'] or not player_ids:
+                changes.append({'type': 'result', 'game': game})  # Ordering set or results cleared
+            else:
+                changes.extend({'type': 'result', 'game': game, 'player_id': player_id} for player_id in player_ids)
+    changes.extend(new['matches'])
+    for game, progress in new['progress'].items():
+        if progress != old['progress'].get(game):
+            changes.append({'type': 'round', 'game': game,
+                            'round': progress[0] + 1 if progress else None,
+                            'finished': progress[1] if progress else False})
+    for jersey, ranking in new['rankings'].items():
+        before = {player_id: (idx + 1, info) for idx, (player_id, info) in enumerate(old['rankings'].get(jersey, []))}
+        moved = [[player_id, idx + 1, info['points']] for idx, (player_id, info) in enumerate(ranking)
+                 if before.get(player_id) != (idx + 1, info)]
+        if moved:
+            changes.append({'type': 'ranking', 'jersey': jersey, 'players': moved})
+    for jersey, winner in new['winners'].items():
+        if old['winners'].get(jersey) != winner:
+            changes.append(dict(winner, type='winner', jersey=jersey))
+    if 'doping_usage' in changed:
+        changes.append({'type': 'doping'})
+    return changes
+
+def _current_winners():
+    """Return the winners that are shown, per jersey (dismissed winners excluded)"""
+    winners = {}
+    
+    # Check overall winner (Gele Trui)
+    overall_winner = get_overall_winner()
+    if overall_winner and 'gele_trui' not in dismissed_winners:
+        winners['gele_trui'] = overall_winner
+    
+    # Check category winners
+    for category in GAME_CATEGORIES.keys():
+        category_winner = get_category_winner(category)
+        if category_winner and CATEGORY_JERSEYS[category] not in dismissed_winners:
+            winners[CATEGORY_JERSEYS[category]] = category_winner
+    return winners
+
+# Answer sheets rescored per hold of the lock by the jobs /admin/set_answer_key starts
+RESCORE_BATCH_SIZE = 100
+# Rescoring jobs are kept in the data store, so every worker can report on them: {game: job}
+RESCORE_JOBS = 'rescore_jobs'
+
+def start_rescore_job(game, answers, client=None):
+    """Rescore every stored answer sheet of a brain game in the background, then apply the new key"""
+    with store.transaction():
+        jobs = store.read_status(RESCORE_JOBS) or {}
+        job_id = max((job['id'] for job in jobs.values()), default=0) + 1
+    job = {
+        'id': job_id,
+        'game': game,
+        'status': 'running',
+        'total': len(results.get(game, {})),
+        'scored': 0,
+        'changed_sheets': [],
+        'ranking_diff': [],
+        'started_at': datetime.now().isoformat(),
+        'finished_at': None
+    }
+    # A newer job for the same game replaces this one, the old thread stops at its next batch
+    _save_rescore_job(job)
+    threading.Thread(target=_run_rescore_job, args=(job, answers, client), daemon=True).start()
+    return job
+
+def _run_rescore_job(job, answers, client):
+    try:
+        _rescore(job, answers, client)
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        job['finished_at'] = datetime.now().isoformat()
+        _save_rescore_job(job)
+        app.logger.exception('Herberekening van %s mislukt', job['game'])
+
+def _save_rescore_job(job):
+    """Store the progress of a rescoring job, False (nothing stored) if a newer job for its game replaced it"""
+    with store.transaction():
+        jobs = store.read_status(RESCORE_JOBS) or {}
+        current = jobs.get(job['game'])
+        if current and current['id'] > job['id']:
+            return False
+        jobs[job['game']] = job
+        store.write_status(RESCORE_JOBS, jobs)
+        return True
+
+def _rescore_job_replaced(job):
+    """Check if a newer rescoring job was started for the game of a job, by any worker"""
+    current = (store.read_status(RESCORE_JOBS) or {}).get(job['game'])
+    return current is not None and current['id'] != job['id']
+
+def _rescore(job, answers, client):
+    game = job['game']
+    scorer = AnswerKey(game, answers)
+    counts = {}  # {player key: (answers, correct count)} scored with the new key
+    with store.transaction():
+        load_data()
+        pids = list(results.get(game, {}).keys())
+    # Score in batches, request threads can take the lock in between
+    for start in range(0, len(pids), RESCORE_BATCH_SIZE):
+        with store.transaction():
+            if _rescore_job_replaced(job):
+                job['status'] = 'cancelled'
+                return
+            load_data()
+            for pid in pids[start:start + RESCORE_BATCH_SIZE]:
+                data = results.get(game, {}).get(pid)
+                if isinstance(data, Mapping) and isinstance(data.get('answers'), list):
+                    counts[pid] = (list(data['answers']), scorer.score(data['answers']))
+        job['scored'] = min(start + RESCORE_BATCH_SIZE, len(pids))
+        _save_rescore_job(job)
+
+    with store.transaction():
+        if _rescore_job_replaced(job):
+            job['status'] = 'cancelled'
+            return
+        load_data()
+        _ensure_answer_keys()
+        before = get_all_rankings()
+        # Sheets submitted or changed while scoring are scored now
+        rescored = []
+        for pid, data in results.get(game, {}).items():
+            if not isinstance(data, Mapping) or not isinstance(data.get('answers'), list):
+                continue
+            cached = counts.get(pid)
+            if not cached or cached[0] != data['answers']:
+                cached = counts[pid] = (list(data['answers']), scorer.score(data['answers']))
+            # Same rule as the popup: only a complete answer sheet is scored
+            correct_answers = cached[1] if len(data['answers']) == len(answers) else 0
+            if data.get('correct_answers') != correct_answers:
+                rescored.append([pid, correct_answers])
+                job['changed_sheets'].append({'player_id': pid, 'old': data.get('correct_answers'),
+                                              'new': correct_answers})
+        # Swap in the new counts so the rankings are rebuilt without scoring any sheet again
+        _answer_scorers[game] = scorer
+        _correct_counts[game] = counts
+        event = {'type': 'answer_key', 'game': game, 'answers': answers, 'overwrote': answer_keys[game],
+                 'rescored': rescored}
+        if client:
+            event['client'] = client
+        log_event(event, *_apply_event(event))
+        job['ranking_diff'] = _ranking_diff(before, get_all_rankings())
+        job['total'] = job['scored'] = len(counts)
+        job['status'] = 'done'
+        job['finished_at'] = datetime.now().isoformat()
+        _save_rescore_job(job)
+
+def _ranking_diff(before, after):
+    """Return the players whose position or points changed, per jersey"""
+    diff = []
+    for jersey, ranking in after.items():
+        old = {player_id: (idx + 1, info['points']) for idx, (player_id, info) in enumerate(before.get(jersey, []))}
+        for idx, (player_id, info) in enumerate(ranking):
+            old_position, old_points = old.get(player_id, (None, None))
+            if (old_position, old_points) != (idx + 1, info['points']):
+                diff.append({
+                    'jersey': jersey,
+                    'player_id': player_id,
+                    'name': info['name'],
+                    'old_position': old_position,
+                    'new_position': idx + 1,
+                    'old_points': old_points,
+                    'new_points': info['points']
+                })
+    return diff
 
 @app.route('/')
 def index():
@@ -837,48 +1417,55 @@ def index():
                          players=players, 
                          scores=scores, 
                          opponents=opponents,
-                         games=['touwspringen', 'stoelendans', 'petanque', 'kubb', 'rebus', 'wiskunde'])
+                         games=GAMES)
 
 @app.route('/register_player', methods=['POST'])
 def register_player():
     """Register a new player"""
+    upload = None
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        # Receive the picture before taking the lock, a slow upload must not hold up other requests;
+        # the form parser writes it to the upload folder (UploadRequest), a refused one is removed on close
+        picture = request.files.get('picture')
+        if picture and picture.filename:
+            try:
+                upload = picture.stream.result()
+            except UploadError as e:
+                return jsonify({'success': False, 'message': str(e)})
+    with store.transaction():
+        load_data()
+        return _register_player(upload)
+
+def _register_player(upload):
     # Check if it's a multipart form (file upload) or JSON
     if request.content_type and 'multipart/form-data' in request.content_type:
         # Handle file upload
         name = request.form.get('name', '').strip()
         number = request.form.get('number')
-        picture = request.files.get('picture')
         
         if not name or not number:
             return jsonify({'success': False, 'message': 'Naam en startnummer zijn verplicht'})
         
         # Check if number already exists
-        if any(p['number'] == int(number) for p in players):
+        if _number_taken(int(number)):
             return jsonify({'success': False, 'message': 'Dit startnummer is al in gebruik'})
         
-        # Create new player with unique ID
-        # Find the highest existing ID and add 1
-        max_id = max([p['id'] for p in players]) if players else 0
-        player_id = max_id + 1
+        player_id = _player_registry().next_id()
         
-        new_player = {
+        new_player = Player({
             'id': player_id,
             'name': name,
             'number': int(number),
             'registered_at': datetime.now().isoformat(),
             'picture': None
-        }
+        })
         
         # Save picture if provided
-        if picture:
-            filename = save_player_picture(picture, player_id)
-            if filename:
-                new_player['picture'] = filename
-        
-        players.append(new_player)
-        save_data()
+        if upload:
+            new_player['picture'] = save_player_picture(upload, player_id)
+            new_player['picture_status'] = 'processing'
         
-        return jsonify({'success': True, 'message': f'Speler {name} succesvol geregistreerd', 'player': new_player})
+        return _add_player(new_player)
     else:
         # Handle JSON request (backward compatibility)
         data = request.get_json()
@@ -889,33 +1476,114 @@ def register_player():
             return jsonify({'success': False, 'message': 'Naam en startnummer zijn verplicht'})
         
         # Check if number already exists
-        if any(p['number'] == number for p in players):
+        if _number_taken(number):
             return jsonify({'success': False, 'message': 'Dit startnummer is al in gebruik'})
         
-        # Create new player with unique ID
-        # Find the highest existing ID and add 1
-        max_id = max([p['id'] for p in players]) if players else 0
-        player_id = max_id + 1
+        player_id = _player_registry().next_id()
         
-        new_player = {
+        new_player = Player({
             'id': player_id,
             'name': name,
             'number': number,
             'registered_at': datetime.now().isoformat(),
             'picture': None
-        }
-        
-        players.append(new_player)
-        save_data()
+        })
         
-        return jsonify({'success': True, 'message': f'Speler {name} succesvol geregistreerd', 'player': new_player})
+        return _add_player(new_player)
+
+def _add_player(new_player):
+    """Register a new player as a logged event, the player list is only rewritten at the next snapshot"""
+    event = {'type': 'player_registered', 'player': new_player.to_dict()}
+    touched = _apply_event(event)
+    if touched is None:
+        return jsonify({'success': False, 'message': 'Deze speler is al geregistreerd'})
+    log_event(event, *touched)
+    return jsonify({'success': True, 'message': f'Speler {new_player["name"]} succesvol geregistreerd', 'player': new_player})
+
+@app.after_request
+def compress_response(response):
+    """Gzip JSON responses of at least GZIP_MIN_SIZE bytes when the browser accepts it"""
+    if (not GZIP_MIN_SIZE or response.mimetype != 'application/json' or response.status_code != 200
+            or response.is_streamed or response.direct_passthrough or response.content_encoding
+            or 'gzip' not in request.accept_encodings):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.content_encoding = 'gzip'
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The same state, but not byte for byte the same response as the uncompressed one
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    """Add the content hash to url_for('static', ...), the URL changes when the file does"""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        fingerprint = static_assets.fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+def _cache_forever(response):
+    response.cache_control.no_cache = None  # Set by send_file without a max age
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+def serve_static(filename):
+    """Serve a static file, precompressed when the browser accepts it and cached for good when the hash matches"""
+    variant = static_assets.compressed(filename, request.accept_encodings)
+    if variant:
+        response = send_from_directory(app.static_folder, variant[0],
+                                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.content_encoding = variant[1]
+    else:
+        response = app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    if request.args.get('v') and request.args.get('v') == static_assets.fingerprint(filename):
+        return _cache_forever(response)
+    response.cache_control.no_cache = True  # Revalidated with its ETag
+    return response
+
+app.view_functions['static'] = serve_static
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """Uploads over MAX_CONTENT_LENGTH"""
+    max_mb = app.config['MAX_PICTURE_BYTES'] // (1024 * 1024)
+    return jsonify({'success': False, 'message': f'De foto is te groot (maximaal {max_mb} MB)'}), 413
 
 @app.route('/player_picture/<filename>')
 def player_picture(filename):
-    """Serve player pictures"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve player pictures, resized with ?size=avatar|card|popup"""
+    size = request.args.get('size')
+    if size is None:
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    else:
+        filename = secure_filename(filename)
+        accept_webp = 'image/webp' in request.headers.get('Accept', '')
+        served = picture_for(app.config['UPLOAD_FOLDER'], filename, size, accept_webp)
+        if served is None:
+            # Uploaded before derivatives existed, or its processing was cut off by a restart:
+            # the original picture is served until the resized copies are made
+            _queue_derivatives(filename)
+            response = send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+            response.cache_control.no_cache = True
+            return response
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], served)
+        response.vary.add('Accept')
+    # ?v= is the player's registered_at: a picture is never replaced under the same URL
+    if request.args.get('v'):
+        return _cache_forever(response)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/submit_game_results', methods=['POST'])
+@locked
 def submit_game_results():
     """Submit results for a specific game with game-specific payloads."""
     load_data()
@@ -932,15 +1600,17 @@ def submit_game_results():
             jumps = int(data.get('jumps'))
             doping = data.get('doping', False)
             # Check if player already has a score for this game
-            if str(player_id) in results['touwspringen'] or player_id in results['touwspringen']:
+            if player_id in results['touwspringen']:
                 if not overwrite:
                     return jsonify({'success': False, 'needs_overwrite': True, 'message': 'Er bestaat al een score voor deze speler voor dit spel'}), 409
-            results['touwspringen'][player_id] = jumps
-            # Track doping usage
-            if doping:
-                if player_id in doping_usage:
-                    return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[player_id]}'}), 200
-                doping_usage[player_id] = game
+            # Check doping before storing anything
+            if doping and player_id in doping_usage:
+                return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[player_id]}'}), 200
+            event = {
+                'type': 'game_result', 'game': game, 'player_id': player_id, 'value': jumps,
+                'doping_players': [player_id] if doping else [],
+                'overwrote': results['touwspringen'].get(player_id)
+            }
         elif game == 'stoelendans':
             ordering = data.get('ordering', [])
             doping = data.get('doping', False)
@@ -949,14 +1619,17 @@ def submit_game_results():
             # Check if already set
             if results['stoelendans'] and not overwrite:
                 return jsonify({'success': False, 'needs_overwrite': True, 'message': 'Er bestaat al een volgorde voor stoelendans'}), 409
-            results['stoelendans'] = ordering
-            # Track doping usage for selected players
+            # Check doping for selected players before storing anything
             if doping:
                 for player_id in doping_players:
                     player_id_int = int(player_id)
-                    if str(player_id) in list(doping_usage.keys()):
+                    if player_id_int in doping_usage:
                         return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor speler met nummer {player_id_int}'}), 200
-                    doping_usage[player_id_int] = game
+            event = {
+                'type': 'game_result', 'game': game, 'value': ordering,
+                'doping_players': [int(player_id) for player_id in doping_players] if doping else [],
+                'overwrote': results['stoelendans'] or None
+            }
         elif game in ['petanque', 'kubb']:
             # These games now use the tournament system, not direct submission
             return jsonify({'success': False, 'message': 'Kubb en Petanque gebruiken het toernooi systeem. Gebruik de toernooi interface.'}), 400
@@ -980,53 +1653,34 @@ def submit_game_results():
                 return jsonify({'success': False, 'message': 'Totale tijd is verplicht'}), 400
             
             # Check if player already has a result for this game
-            if str(player_id) in results[game] or player_id in results[game]:
+            if player_id in results[game]:
                 if not overwrite:
                     return jsonify({'success': False, 'needs_overwrite': True, 'message': 'Er bestaat al een resultaat voor deze speler voor dit spel'}), 409
             
             # Calculate correct answers for popup display
             correct_answers = 0
             if game in answer_keys and len(answers) == len(answer_keys[game]):
-                for i, (user_answer, correct_answer) in enumerate(zip(answers, answer_keys[game])):
-                    if game == 'rebus' and i == 9:  # Special handling for rebus question 10
-                        # Handle multiple answers for question 10
-                        user_parts = normalize_comma_separated_answers(user_answer)
-                        correct_parts = normalize_comma_separated_answers(correct_answer)
-                        if len(user_parts) == 4 and len(correct_parts) == 4:
-                            # Check if all 4 answers are correct (order doesn't matter)
-                            user_set = set(user_parts)
-                            correct_set = set(correct_parts)
-                            if user_set == correct_set:
-                                correct_answers += 1
-                    elif game == 'wiskunde' and i in [0, 1]:  # Special handling for wiskunde questions 1 and 2
-                        # Handle comma-separated answers for questions 1 and 2
-                        user_parts = normalize_comma_separated_answers(user_answer)
-                        correct_parts = normalize_comma_separated_answers(correct_answer)
-                        if len(user_parts) == 2 and len(correct_parts) == 2:
-                            # Check if both parts are correct
-                            if user_parts[0] == correct_parts[0] and user_parts[1] == correct_parts[1]:
-                                correct_answers += 1
-                    else:
-                        # Normal answer comparison
-                        if normalize_answer(user_answer) == normalize_answer(correct_answer):
-                            correct_answers += 1
+                correct_answers = _get_answer_scorer(game).score(answers)
             
-            results[game][player_id] = {
-                'answers': answers,
-                'time_seconds_total': float(time_seconds_total),
-                'correct_answers': correct_answers  # Store for popup display
+            # Check doping before storing anything
+            if doping and player_id in doping_usage:
+                return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[player_id]}'}), 200
+            event = {
+                'type': 'game_result', 'game': game, 'player_id': player_id,
+                'value': {
+                    'answers': answers,
+                    'time_seconds_total': float(time_seconds_total),
+                    'correct_answers': correct_answers  # Store for popup display
+                },
+                'doping_players': [player_id] if doping else [],
+                'overwrote': results[game].get(player_id)
             }
-            # Track doping usage
-            if doping:
-                if player_id in doping_usage:
-                    return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[player_id]}'}), 200
-                doping_usage[player_id] = game
         else:
             return jsonify({'success': False, 'message': 'Onbekend spel'}), 400
     except (TypeError, ValueError):
         return jsonify({'success': False, 'message': 'Ongeldige waarden'}), 400
 
-    save_data()
+    log_event(event, *_apply_event(event))
     
     # Return additional info for brain games popup
     if game in ['rebus', 'wiskunde']:
@@ -1041,6 +1695,7 @@ def submit_game_results():
     return jsonify({'success': True, 'message': 'Resultaten succesvol opgeslagen'})
 
 @app.route('/admin/set_answer_key', methods=['POST'])
+@locked
 def set_answer_key():
     """Admin: set answer key for a brain game (10 answers)."""
     load_data()
@@ -1052,11 +1707,13 @@ def set_answer_key():
         return jsonify({'success': False, 'message': 'Ongeldig spel'}), 400
     if not isinstance(answers, list) or len(answers) != 10:
         return jsonify({'success': False, 'message': 'Antwoorden moeten 10 items bevatten'}), 400
-    answer_keys[game] = [str(a) for a in answers]
-    save_data()
-    return jsonify({'success': True})
+    # Stored answer sheets are rescored in the background, the key is applied once they are done
+    job = start_rescore_job(game, [str(a) for a in answers], request.remote_addr)
+    return jsonify({'success': True, 'rescore_job': job['id'],
+                    'message': 'Antwoordsleutel opgeslagen, resultaten worden herberekend'}), 202
 
 @app.route('/admin/get_answer_key')
+@conditional
 def get_answer_key():
     load_data()
     game = request.args.get('game')
@@ -1064,7 +1721,19 @@ def get_answer_key():
         return jsonify({'success': False, 'message': 'Ongeldig spel'}), 400
     return jsonify({'success': True, 'answers': answer_keys.get(game, [])})
 
+@app.route('/admin/rescore_status')
+def rescore_status():
+    """Admin: progress and ranking changes of the last rescoring job of a brain game"""
+    game = request.args.get('game')
+    if game not in ['rebus', 'wiskunde']:
+        return jsonify({'success': False, 'message': 'Ongeldig spel'}), 400
+    job = (store.read_status(RESCORE_JOBS) or {}).get(game)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Geen herberekening gestart voor dit spel'}), 404
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/admin/clear_results', methods=['POST'])
+@locked
 def clear_results():
     """Admin: clear all stored results, scores, doping usage, and tournaments after confirmation."""
     load_data()
@@ -1075,89 +1744,75 @@ def clear_results():
     tournaments = {}
     # Recreate empty structures
     _ensure_results_structures()
-    save_data()
+    save_data('results', 'scores', 'doping_usage', 'tournaments')
     return jsonify({'success': True, 'message': 'Alle resultaten zijn gewist'})
 
 @app.route('/get_rankings')
+@conditional
 def get_rankings():
     """Get all rankings"""
     load_data()
-    rankings = {
-        'gele_trui': calculate_ranking(),  # Overall ranking
-        'groene_trui': calculate_category_ranking('speed_games'),
-        'bolletjes_trui': calculate_category_ranking('ball_games'),
-        'witte_trui': calculate_category_ranking('brain_games')
-    }
-    
-    return jsonify(rankings)
+    return jsonify(get_all_rankings())
 
 @app.route('/get_doping_usage')
+@conditional
 def get_doping_usage():
     """Get doping usage information for frontend"""
     load_data()
     return jsonify(doping_usage)
 
 @app.route('/get_opponents')
+@conditional
 def get_opponents():
     """Get opponent pairs"""
     load_data()
-    # Only generate if missing or empty for petanque/kubb
-    missing = False
-    for g in ['petanque', 'kubb']:
-        if g not in opponents or not opponents.get(g):
-            missing = True
-            break
-    if missing:
-        generate_opponents()
-        save_data()
+    # Only generate if missing or empty for petanque/kubb, once for the requests arriving together
+    if _opponents_missing():
+        _coalesced(('opponents', store.state_tag()), _generate_missing_opponents)
     return jsonify(opponents)
 
+def _opponents_missing():
+    """Check if the opponents of petanque or kubb are missing or empty"""
+    return any(not opponents.get(g) for g in ['petanque', 'kubb'])
+
+def _generate_missing_opponents():
+    """Generate and save the opponents, unless another worker did so meanwhile"""
+    with store.transaction():
+        load_data()
+        if _opponents_missing():
+            generate_opponents()
+            save_data('opponents')
+
 @app.route('/get_players')
+@conditional
 def get_players():
     """Get all registered players"""
     load_data()
     return jsonify(players)
 
 @app.route('/get_scores')
+@conditional
 def get_scores():
     """Get all scores data"""
     load_data()
     return jsonify(scores)
 
 @app.route('/get_results')
+@conditional
 def get_results():
     """Get all results data"""
     load_data()
     return jsonify(results)
 
 @app.route('/regenerate_opponents', methods=['POST'])
+@locked
 def regenerate_opponents():
     """Regenerate opponent pairs for games that don't have results yet"""
     load_data()
     
-    # Check which games can be regenerated
-    kubb_has_results = False
-    petanque_has_results = False
-    
-    # Check Kubb results
-    if 'kubb' in tournaments:
-        for round_matches in tournaments['kubb']['rounds']:
-            for match in round_matches:
-                if match['completed'] and match['player2'] is not None:  # Exclude bye matches
-                    kubb_has_results = True
-                    break
-            if kubb_has_results:
-                break
-    
-    # Check Petanque results
-    if 'petanque' in tournaments:
-        for round_matches in tournaments['petanque']['rounds']:
-            for match in round_matches:
-                if match['completed'] and match['player2'] is not None:  # Exclude bye matches
-                    petanque_has_results = True
-                    break
-            if petanque_has_results:
-                break
+    # Check which games can be regenerated (byes don't count as results)
+    kubb_has_results = _tournament_has_results('kubb')
+    petanque_has_results = _tournament_has_results('petanque')
     
     # Only regenerate games that don't have results
     games_to_regenerate = []
@@ -1173,12 +1828,13 @@ def regenerate_opponents():
     for game in games_to_regenerate:
         generate_tournament(game)
     
-    save_data()
+    save_data('tournaments')
     
     games_str = ' en '.join(games_to_regenerate)
     return jsonify({'success': True, 'message': f'Tegenstanders voor {games_str} succesvol opnieuw gegenereerd'})
 
 @app.route('/generate_tournament/<game>', methods=['POST'])
+@locked
 def generate_tournament_route(game):
     """Generate a new tournament for Kubb or Petanque"""
     load_data()
@@ -1187,12 +1843,13 @@ def generate_tournament_route(game):
     
     success = generate_tournament(game)
     if success:
-        save_data()
+        save_data('tournaments')
         return jsonify({'success': True, 'message': f'Toernooi voor {game} succesvol gegenereerd'})
     else:
         return jsonify({'success': False, 'message': 'Fout bij genereren toernooi'}), 500
 
 @app.route('/get_tournament/<game>')
+@conditional
 def get_tournament(game):
     """Get tournament structure for a specific game"""
     load_data()
@@ -1205,6 +1862,7 @@ def get_tournament(game):
     return jsonify(tournaments[game])
 
 @app.route('/submit_tournament_match', methods=['POST'])
+@locked
 def submit_tournament_match():
     """Submit results for a tournament match"""
     load_data()
@@ -1223,36 +1881,25 @@ def submit_tournament_match():
     if game not in ['petanque', 'kubb']:
         return jsonify({'success': False, 'message': 'Ongeldig spel'}), 400
     
-    # Check if match is already completed and allow overwrite
-    if game in tournaments:
-        tournament = tournaments[game]
-        for round_matches in tournament['rounds']:
-            for match in round_matches:
-                if match['match_id'] == match_id and match['completed']:
-                    # Reset doping usage for the previous players if they used it
-                    if match['doping1'] and match['winner'] in doping_usage:
-                        del doping_usage[match['winner']]
-                    if match['doping2'] and match['loser'] in doping_usage:
-                        del doping_usage[match['loser']]
-                    break
-    
-    success = advance_tournament(game, match_id, int(winner_id), int(loser_id), doping1, doping2)
-    
-    if success:
-        save_data()
-        return jsonify({'success': True, 'message': 'Wedstrijd resultaat succesvol opgeslagen'})
-    else:
-        # Check if it failed due to doping validation
-        if doping1 and int(winner_id) in doping_usage and doping_usage[int(winner_id)] != game:
-            return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[int(winner_id)]}'}), 200
-        if doping2 and int(loser_id) in doping_usage and doping_usage[int(loser_id)] != game:
-            return jsonify({'success': False, 'doping_error': True, 'message': f'Speler heeft al doping gebruikt voor {doping_usage[int(loser_id)]}'}), 200
-        # Check if it failed due to doping in wrong round
-        if (doping1 or doping2) and game in tournaments and tournaments[game]['current_round'] > 0:
-            return jsonify({'success': False, 'doping_error': True, 'message': 'Doping kan alleen in ronde 1 gebruikt worden'}), 200
-        return jsonify({'success': False, 'message': 'Fout bij opslaan wedstrijd'}), 500
+    winner_id, loser_id = int(winner_id), int(loser_id)
+    error = tournament_match_error(game, match_id, winner_id, loser_id, doping1, doping2)
+    if error:
+        message, doping_error = error
+        if doping_error:
+            return jsonify({'success': False, 'doping_error': True, 'message': message}), 200
+        return jsonify({'success': False, 'message': message}), 500
+    
+    previous = _find_match(game, match_id)
+    event = {
+        'type': 'tournament_match', 'game': game, 'match_id': match_id,
+        'winner_id': winner_id, 'loser_id': loser_id, 'doping1': doping1, 'doping2': doping2,
+        'overwrote': {'winner': previous['winner'], 'loser': previous['loser']} if previous['completed'] else None
+    }
+    log_event(event, *_apply_event(event))
+    return jsonify({'success': True, 'message': 'Wedstrijd resultaat succesvol opgeslagen'})
 
 @app.route('/get_tournament_matches/<game>')
+@conditional
 def get_tournament_matches(game):
     """Get all tournament matches for a specific game to display in tegenstanders view"""
     load_data()
@@ -1290,31 +1937,14 @@ def get_tournament_matches(game):
     })
 
 @app.route('/check_winners')
+@conditional
 def check_winners():
     """Check for winners in all categories"""
     load_data()
-    
-    winners = {}
-    
-    # Check overall winner (Gele Trui)
-    overall_winner = get_overall_winner()
-    if overall_winner and 'gele_trui' not in dismissed_winners:
-        winners['gele_trui'] = overall_winner
-    
-    # Check category winners
-    for category in GAME_CATEGORIES.keys():
-        category_winner = get_category_winner(category)
-        if category_winner:
-            if category == 'speed_games' and 'groene_trui' not in dismissed_winners:
-                winners['groene_trui'] = category_winner
-            elif category == 'ball_games' and 'bolletjes_trui' not in dismissed_winners:
-                winners['bolletjes_trui'] = category_winner
-            elif category == 'brain_games' and 'witte_trui' not in dismissed_winners:
-                winners['witte_trui'] = category_winner
-    
-    return jsonify(winners)
+    return jsonify(_current_winners())
 
 @app.route('/dismiss_winner', methods=['POST'])
+@locked
 def dismiss_winner():
     """Mark a winner popup as dismissed so it won't show again"""
     load_data()
@@ -1326,19 +1956,94 @@ def dismiss_winner():
     
     # Add to dismissed winners and save
     dismissed_winners.add(category)
-    save_data()
+    save_data('dismissed_winners')
     
     return jsonify({'success': True})
 
 @app.route('/clear_dismissed_winners', methods=['POST'])
+@locked
 def clear_dismissed_winners():
     """Clear all dismissed winners (for testing purposes)"""
     load_data()
     global dismissed_winners
     dismissed_winners.clear()
-    save_data()
+    save_data('dismissed_winners')
     return jsonify({'success': True, 'message': 'Dismissed winners cleared'})
 
+@app.route('/events')
+def events():
+    """Server-sent events stream with the changes of the state (rankings, tournaments, winners)"""
+    _start_sse_publisher()
+    last_id = request.headers.get('Last-Event-ID')
+    with _sse_published:
+        messages = list(_sse_messages)
+    # Messages a reconnecting client missed, if this worker still has them
+    ids = [version for _, version, _ in messages]
+    if last_id in ids:
+        position = messages[ids.index(last_id)][0]
+        resync = False
+    else:
+        position = messages[-1][0] if messages else 0
+        resync = last_id is not None and last_id != str(store.seq)
+
+    def stream():
+        nonlocal position
+        yield 'retry: 3000\n\n'
+        if resync:
+            yield f'id: {store.seq}\nevent: resync\ndata: {{}}\n\n'
+        while True:
+            with _sse_published:
+                if not _sse_messages or _sse_messages[-1][0] <= position:
+                    _sse_published.wait(SSE_HEARTBEAT_SECONDS)
+                pending = [message for message in _sse_messages if message[0] > position]
+            if not pending:
+                yield ': ping\n\n'  # Keeps proxies from closing an idle stream
+                continue
+            if pending[0][0] > position + 1 or any(changes is None for _, _, changes in pending):
+                # Fell behind the history, or the changes are not known: let the client reload everything
+                yield f'id: {pending[-1][1]}\nevent: resync\ndata: {{}}\n\n'
+            else:
+                for _, version, changes in pending:
+                    data = json.dumps({'changes': changes}, separators=(',', ':'))
+                    yield f'id: {version}\nevent: update\ndata: {data}\n\n'
+            position = pending[-1][0]
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+@app.route('/changes')
+def changes():
+    """Results, tournament and ranking entries changed since ?since=<version>, or everything"""
+    load_data()
+    since = request.args.get('since', '')
+    since = int(since) if since.isdigit() else None
+    get_all_rankings()
+    # Only the changed entries are copied, under this worker's lock (other workers are not held up)
+    with store.loading():
+        _ensure_results_structures()
+        version = store.seq
+        changed = _changes_since(since, version)
+        if changed is None:
+            # No version given, or one that is too old
+            data = {'full': True, 'results': _json_copy(results), 'tournaments': _json_copy(tournaments)}
+        else:
+            data = dict(_changes_patch(changed), full=False)
+        rankings = _current_rankings()
+    with _rankings_sent_lock:
+        before = _rankings_sent.get(since) if changed is not None else None
+        _rankings_sent[version] = rankings
+        if len(_rankings_sent) > RANKINGS_HISTORY:
+            del _rankings_sent[min(_rankings_sent)]
+    if changed is None:
+        data['rankings'] = {jersey: [[player_id, info] for player_id, info in ranking] for jersey, ranking in rankings.items()}
+    else:
+        # Every row when this worker didn't send the client's version itself
+        data['rankings'] = _rankings_patch(before, rankings)
+    data['version'] = str(version)
+    return jsonify(data)
+
 @app.route('/check_existing_score', methods=['POST'])
 def check_existing_score():
     """Check if a score already exists for a player/game combination"""
@@ -1353,25 +2058,22 @@ def check_existing_score():
     player_id = int(player_id)
     exists = False
     
-    if game == 'touwspringen':
-        exists = str(player_id) in results['touwspringen'] or player_id in results['touwspringen']
-    elif game == 'stoelendans':
+    if game == 'stoelendans':
         # For stoelendans, check if any ordering exists (it's a single result for all players)
         exists = len(results['stoelendans']) > 0
+    elif isinstance(store, SQLiteStore):
+        # Index lookups on (game, player_id) and the match player columns
+        if game in ['touwspringen', 'rebus', 'wiskunde']:
+            exists = store.has_result(game, player_id)
+        elif game in ['petanque', 'kubb']:
+            exists = store.has_completed_match(game, player_id)
+    elif game == 'touwspringen':
+        exists = player_id in results['touwspringen']
     elif game in ['rebus', 'wiskunde']:
-        exists = str(player_id) in results[game] or player_id in results[game]
+        exists = player_id in results[game]
     elif game in ['petanque', 'kubb']:
         # For tournament games, check if player has participated in any matches
-        exists = False
-        if game in tournaments:
-            for round_matches in tournaments[game]['rounds']:
-                for match in round_matches:
-                    if match['player1'] == player_id or match['player2'] == player_id:
-                        if match['completed']:
-                            exists = True
-                            break
-                if exists:
-                    break
+        exists = game in tournaments and _tournament_index(game).has_completed_match(player_id)
     
     return jsonify({
         'success': True,
@@ -1381,34 +2083,14 @@ def check_existing_score():
     })
 
 @app.route('/check_tournament_results')
+@conditional
 def check_tournament_results():
     """Check if there are any results for Kubb or Petanque tournaments"""
     load_data()
     
-    kubb_has_results = False
-    petanque_has_results = False
-    
-    # Check Kubb results
-    if 'kubb' in tournaments:
-        for round_matches in tournaments['kubb']['rounds']:
-            for match in round_matches:
-                # Only count as result if it's completed AND not a bye match
-                if match['completed'] and match['player2'] is not None:
-                    kubb_has_results = True
-                    break
-            if kubb_has_results:
-                break
-    
-    # Check Petanque results
-    if 'petanque' in tournaments:
-        for round_matches in tournaments['petanque']['rounds']:
-            for match in round_matches:
-                # Only count as result if it's completed AND not a bye match
-                if match['completed'] and match['player2'] is not None:
-                    petanque_has_results = True
-                    break
-            if petanque_has_results:
-                break
+    # Only completed matches that are not byes count as results
+    kubb_has_results = _tournament_has_results('kubb')
+    petanque_has_results = _tournament_has_results('petanque')
     
     return jsonify({
         'success': True,
@@ -1418,45 +2100,155 @@ def check_tournament_results():
         'can_regenerate_petanque': not petanque_has_results
     })
 
-@app.route('/download_results')
-def download_results():
-    """Download all results, doping usage, and tournament matches as JSON"""
+# Sections of the JSON export, in this order
+EXPORT_SECTIONS = ['players', 'results', 'doping_usage', 'tournaments', 'answer_keys', 'rankings']
+EXPORT_FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def _export_sections(sections):
+    """Take the data of the exported sections under the lock; only references are copied, serializing happens while streaming"""
+    with store.transaction():
+        load_data()
+        data = {}
+        if 'players' in sections:
+            data['players'] = list(players)
+        if 'results' in sections:
+            data['results'] = {game: entries.copy() for game, entries in results.items()}
+        if 'doping_usage' in sections:
+            data['doping_usage'] = dict(doping_usage)
+        if 'tournaments' in sections:
+            data['tournaments'] = copy.deepcopy(tournaments)  # Matches are completed in place
+        if 'answer_keys' in sections:
+            data['answer_keys'] = copy.deepcopy(answer_keys)
+        if 'rankings' in sections:
+            data['rankings'] = get_all_rankings()  # Replaced, not changed, when results change
+    return data
+
+def _export_row_data():
+    """Take what the export rows are made of under the lock: (players, positions, points matrix, sort keys, doping)"""
+    with store.transaction():
+        load_data()
+        positions = _compute_positions_from_results()
+        matrix = _points_matrix(positions)
+        player_list = matrix.players
+        # The keys the game was ranked on: (-jumps, order) or (-correct, time, order)
+        sort_keys = {}
+        for game in ['touwspringen', 'rebus', 'wiskunde']:
+            if game in positions:
+                _get_sorted_results(game)
+                sort_keys[game] = _sorted_results[game][2]
+        doping = dict(doping_usage)
+    return player_list, positions, matrix, sort_keys, doping
+
+def _export_rows():
+    """Return a generator of one row per player per game with a position, for the CSV and NDJSON exports"""
     load_data()
+    # Downloads of the same state share the positions and points, each streams its own rows
+    player_list, positions, matrix, sort_keys, doping = _coalesced(('export_rows', store.state_tag()), _export_row_data)
     
-    # Create comprehensive data export
-    export_data = {
-        'export_info': {
-            'timestamp': datetime.now().isoformat(),
-            'version': '1.0',
-            'description': 'Complete export of all Rock Brakel game data'
-        },
-        'players': players,
-        'results': results,
-        'doping_usage': doping_usage,
-        'tournaments': tournaments,
-        'answer_keys': answer_keys,
-        'rankings': {
-            'gele_trui': calculate_ranking(),
-            'groene_trui': calculate_category_ranking('speed_games'),
-            'bolletjes_trui': calculate_category_ranking('ball_games'),
-            'witte_trui': calculate_category_ranking('brain_games')
+    def rows():
+        for player in player_list:
+            player_id = player['id']
+            for game in GAMES:
+                position = positions.get(game, {}).get(player_id)
+                if position is None:
+                    continue
+                key = sort_keys.get(game, {})
+                key = key.get(player_id)
+                yield {
+                    'player_id': player_id,
+                    'number': player['number'],
+                    'name': player['name'],
+                    'game': game,
+                    'position': position,
+                    'points': matrix.get(player_id, game),
+                    'doping': doping.get(player_id) == game,
+                    'score': -key[0] if key else None,
+                    'time_seconds': key[1] if key and game != 'touwspringen' else None
+                }
+    return rows()
+
+@app.route('/download_results')
+def download_results():
+    """Download all results, doping usage, and tournament matches as JSON, streamed section by section.
+
+    ?sections=players,results,... selects the JSON sections; ?format=csv or ndjson gives one row per player per game.
+    """
+    export_format = request.args.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Ongeldig formaat (json, ndjson of csv)'}), 400
+    sections = [name for name in request.args.get('sections', '').split(',') if name] or EXPORT_SECTIONS
+    unknown = [name for name in sections if name not in EXPORT_SECTIONS]
+    if unknown:
+        return jsonify({'success': False, 'message': f'Onbekende onderdelen: {", ".join(unknown)}'}), 400
+    
+    if export_format == 'json':
+        export_data = {
+            'export_info': {
+                'timestamp': datetime.now().isoformat(),
+                'version': '1.0',
+                'description': 'Complete export of all Rock Brakel game data'
+            }
         }
-    }
+        load_data()
+        export_data.update(_coalesced(('export', tuple(sections), store.state_tag()), lambda: _export_sections(sections)))
+        body = stream_json(export_data, app.json.dumps)
+    elif export_format == 'ndjson':
+        body = stream_ndjson(_export_rows(), app.json.dumps)
+    else:
+        body = stream_csv(_export_rows())
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'rock_brakel_results_{timestamp}.json'
+    filename = f'rock_brakel_results_{timestamp}.{export_format}'
     
-    # Create response with JSON data
-    from flask import Response
-    response = Response(
-        json.dumps(export_data, ensure_ascii=False, indent=2),
-        mimetype='application/json',
+    response = app.response_class(
+        chunked(body),
+        mimetype=EXPORT_FORMATS[export_format],
         headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
-    
+    if GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+        # compress_response() leaves streamed responses alone, compress while streaming
+        response.response = gzip_chunks(response.response)
+        response.content_encoding = 'gzip'
+        response.vary.add('Accept-Encoding')
     return response
 
+@app.cli.command('import-sqlite')
+@click.argument('database')
+def import_sqlite(database):
+    """Import the current data (JSON files and pending events) into a SQLite database."""
+    load_data()
+    target = SQLiteStore(database, json_default=json_default)
+    with target.transaction():
+        target.write_snapshot({name: _collection_data(name) for name in DATA_COLLECTIONS})
+    click.echo(f'{len(players)} spelers en alle resultaten geimporteerd in {database}')
+    click.echo(f'Start de app met ROCKBRAKEL_DATABASE={database} om deze database te gebruiken')
+
+@app.cli.command('resize-pictures')
+def resize_pictures():
+    """Write the resized copies of every player picture that was uploaded before they existed."""
+    folder = app.config['UPLOAD_FOLDER']
+    count = 0
+    for filename in sorted(os.listdir(folder)):
+        if not os.path.isfile(os.path.join(folder, filename)) or not allowed_file(filename):
+            continue
+        try:
+            if not make_derivatives(folder, filename):
+                raise click.ClickException('Pillow is niet geinstalleerd (pip install Pillow)')
+        except PICTURE_ERRORS as e:
+            click.echo(f'{filename} overgeslagen: {e}')
+            continue
+        count += 1
+    click.echo(f'{count} foto\'s verkleind naar {", ".join(PICTURE_SIZES)} in {os.path.join(folder, DERIVATIVES_DIR)}')
+    # Pictures whose processing was cut off by a restart
+    with store.transaction():
+        load_data()
+        stuck = [p for p in players if p.get('picture') and p.get('picture_status') == 'processing']
+        for player in stuck:
+            player['picture_status'] = 'ready'
+        if stuck:
+            save_data('players')
+
 if __name__ == '__main__':
     load_data()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
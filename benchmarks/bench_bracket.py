@@ -0,0 +1,88 @@
+"""Play out random knock-out brackets with the bracket engine and check the results.
+
+Every bracket is built up front, winners move to the next round by index and the final
+standings come from the elimination depth. Checks per bracket: one champion, every
+entrant in the standings once, nobody loses twice and byes only in round 1.
+
+Usage: python benchmarks/bench_bracket.py [--brackets 2000] [--min-entrants 2] [--max-entrants 1024]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bracket import build_bracket, elimination_standings, feeds
+from tournament_index import TournamentIndex
+
+POINTS_BY_DEPTH = [22, 15, 8, 4]
+
+
+def play(tournament, index, rng):
+    """Play every match with a random winner, the way advance_tournament does"""
+    for round_idx in range(tournament['num_rounds']):
+        for match in tournament['rounds'][round_idx]:
+            if not match['completed']:
+                winner, loser = rng.sample([match['player1']['id'], match['player2']['id']], 2)
+                index.complete(round_idx, match)
+                match['winner'], match['loser'], match['completed'] = winner, loser, True
+                if round_idx < tournament['num_rounds'] - 1:
+                    next_round, next_idx, slot = feeds(round_idx, index.position(match['match_id']))
+                    index.place(tournament['rounds'][next_round][next_idx], slot, winner)
+        assert index.round_complete(round_idx)
+        tournament['current_round'] = min(round_idx + 1, tournament['num_rounds'] - 1)
+
+
+def check(tournament, standings, entrants):
+    ids = [player['id'] for player in entrants]
+    assert sorted(s['player_id'] for s in standings) == sorted(ids), 'every entrant is ranked once'
+    assert [s['position'] for s in standings].count(1) == 1, 'one champion'
+    losers = [m['loser'] for round_matches in tournament['rounds'] for m in round_matches if m['loser']]
+    assert len(losers) == len(set(losers)) == len(ids) - 1, 'everyone but the champion loses once'
+    for round_matches in tournament['rounds'][1:]:
+        assert all(m['player2'] is not None for m in round_matches), 'byes only in round 1'
+    positions = [s['position'] for s in standings]
+    assert positions == sorted(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--brackets', type=int, default=2000)
+    parser.add_argument('--min-entrants', type=int, default=2)
+    parser.add_argument('--max-entrants', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    timings = {'build': [], 'play': [], 'standings': []}
+    per_size = {}
+    for _ in range(args.brackets):
+        count = rng.randint(args.min_entrants, args.max_entrants)
+        entrants = [{'id': i, 'name': f'Renner {i}', 'number': i} for i in rng.sample(range(1, 10 * count), count)]
+        start = time.perf_counter()
+        tournament = build_bracket('kubb', entrants)
+        index = TournamentIndex(tournament)
+        built = time.perf_counter()
+        play(tournament, index, rng)
+        played = time.perf_counter()
+        standings = elimination_standings(tournament, 25, POINTS_BY_DEPTH, 0)
+        done = time.perf_counter()
+        check(tournament, standings, entrants)
+        timings['build'].append((built - start) * 1000)
+        timings['play'].append((played - built) * 1000)
+        timings['standings'].append((done - played) * 1000)
+        per_size.setdefault(tournament['bracket_size'], []).append((done - start) * 1000)
+
+    print(f'{args.brackets} brackets of {args.min_entrants}-{args.max_entrants} entrants, all checks passed')
+    for step, values in timings.items():
+        print(f'{step:<10} median {statistics.median(values):8.3f} ms   max {max(values):8.3f} ms')
+    print(f'{"bracket":>8} {"brackets":>9} {"median ms":>10}')
+    for size in sorted(per_size):
+        print(f'{size:>8} {len(per_size[size]):>9} {statistics.median(per_size[size]):>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compare bytes on the wire and JSON encode time of the API payloads with the default and the fast JSON path.
+
+Before: Flask's default encoder (sorted keys), no compression. After: CompactJSONProvider
+(orjson when installed) and gzip above ROCKBRAKEL_GZIP_MIN_BYTES.
+
+Usage: python benchmarks/bench_json.py [--players 200] [--requests 50]
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_state import write_event_data
+
+ROUTES = ['/get_rankings', '/get_results', '/get_players', '/get_tournament/petanque', '/get_tournament/kubb',
+          '/changes', '/download_results']
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def measure(rockbrakel, client, route, requests, fast):
+    """Return (bytes on the wire, encode ms, request ms) of a route in one mode"""
+    rockbrakel.FAST_JSON = fast
+    rockbrakel.GZIP_MIN_SIZE = int(os.environ.get('ROCKBRAKEL_GZIP_MIN_BYTES', '1024')) if fast else 0
+    rockbrakel.app.json = rockbrakel.CompactJSONProvider(rockbrakel.app) if fast else rockbrakel.JSONProvider(rockbrakel.app)
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.get(route, headers=headers)
+    assert response.status_code == 200, (route, response.status_code)
+    body = response.get_data()
+    size = len(body)
+    payload = json.loads(gzip.decompress(body) if response.content_encoding == 'gzip' else body)
+
+    def encode():
+        with rockbrakel.app.app_context():
+            if route == '/download_results' and not fast:
+                data = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+            else:
+                data = rockbrakel.app.json.response(payload).get_data()
+            if fast and len(data) >= rockbrakel.GZIP_MIN_SIZE:
+                gzip.compress(data, compresslevel=5)
+
+    request_ms = median_ms(lambda: client.get(route, headers=headers), requests)
+    return size, median_ms(encode, requests), request_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='rockbrakel_bench_')
+    write_event_data(data_dir, args.players)
+    os.environ['ROCKBRAKEL_DATA_DIR'] = data_dir
+    import app as rockbrakel
+    import json_provider
+
+    rockbrakel.load_data()
+    for game in ['petanque', 'kubb']:
+        rockbrakel.generate_tournament(game)
+    rockbrakel.save_data('tournaments')
+    client = rockbrakel.app.test_client()
+    encoder = 'orjson' if json_provider.orjson else 'json (orjson not installed)'
+    print(f'{args.players} players, {args.requests} requests per route, fast path encoder: {encoder}')
+    print(f'{"route":<26} {"bytes before":>12} {"bytes after":>12} {"encode ms before":>17} {"encode ms after":>16}'
+          f' {"request ms before":>18} {"request ms after":>17}')
+    for route in ROUTES:
+        before = measure(rockbrakel, client, route, args.requests, fast=False)
+        after = measure(rockbrakel, client, route, args.requests, fast=True)
+        print(f'{route:<26} {before[0]:>12} {after[0]:>12} {before[1]:>17.3f} {after[1]:>16.3f}'
+              f' {before[2]:>18.3f} {after[2]:>17.3f}')
+
+
+if __name__ == '__main__':
+    main()
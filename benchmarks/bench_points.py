@@ -0,0 +1,144 @@
+"""Compare computing the four jersey rankings with per-player loops and with the points matrix.
+
+Before: for every player, every game of a category and a linear search of the tournament
+standings, then the overall ranking with a linear search of every category ranking.
+After: PointsMatrix with NumPy (when installed) and with the pure-Python fallback.
+
+Usage: python benchmarks/bench_points.py [--players 1000,10000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import points_matrix
+from points_matrix import PointsMatrix
+
+SCORING_POINTS = [25, 22, 19, 15, 12, 8, 7, 6, 5, 4, 3, 2, 1, 0, 0, 0]
+GAMES = ['touwspringen', 'stoelendans', 'petanque', 'kubb', 'rebus', 'wiskunde']
+GAME_CATEGORIES = {
+    'speed_games': ['touwspringen', 'stoelendans'],
+    'ball_games': ['petanque', 'kubb'],
+    'brain_games': ['rebus', 'wiskunde']
+}
+TOURNAMENT_GAMES = ['petanque', 'kubb']
+
+
+def synthetic_event(num_players, rng):
+    """Return (players, positions per game, tournament standings, doping usage)"""
+    players = [{'id': i, 'name': f'Renner {i}', 'number': i} for i in range(1, num_players + 1)]
+    ids = [player['id'] for player in players]
+    positions = {}
+    for game in GAMES:
+        ranked = rng.sample(ids, int(num_players * rng.uniform(0.8, 1.0)))
+        positions[game] = {player_id: position for position, player_id in enumerate(ranked, 1)}
+    standings = {}
+    for game in TOURNAMENT_GAMES:
+        standings[game] = [{'player_id': player_id, 'position': position,
+                            'points': [25, 22, 15, 15, 8, 8, 8, 8][position - 1] if position <= 8 else rng.choice([4, 0])}
+                           for player_id, position in positions[game].items()]
+    doping = {player_id: rng.choice(GAMES) for player_id in rng.sample(ids, num_players // 5)}
+    return players, positions, standings, doping
+
+
+def loop_rankings(players, positions, standings, doping):
+    """The rankings as they were computed before the points matrix"""
+    def category_ranking(category):
+        player_points = {}
+        for player in players:
+            player_id = player['id']
+            total_points = 0
+            for game in GAME_CATEGORIES[category]:
+                if player_id in positions.get(game, {}):
+                    position = positions[game][player_id]
+                    if game in TOURNAMENT_GAMES:
+                        for standing in standings[game]:
+                            if standing['player_id'] == player_id:
+                                points = standing['points']
+                                if doping.get(player_id) == game:
+                                    points *= 2
+                                total_points += points
+                                break
+                    elif position <= len(SCORING_POINTS):
+                        points = SCORING_POINTS[position - 1]
+                        if doping.get(player_id) == game:
+                            points *= 2
+                        total_points += points
+            player_points[player_id] = {'name': player['name'], 'number': player['number'], 'points': total_points}
+        ranking = sorted(player_points.items(), key=lambda x: x[1]['points'], reverse=True)
+        if category == 'ball_games':
+            petanque = positions.get('petanque', {})
+            ranking = sorted(ranking, key=lambda x: (-x[1]['points'], petanque.get(x[0], float('inf'))))
+        return ranking
+
+    rankings = {category: category_ranking(category) for category in GAME_CATEGORIES}
+    overall = {}
+    for player in players:
+        total_points = 0
+        for ranking in rankings.values():
+            for player_id, info in ranking:
+                if player_id == player['id']:
+                    total_points += info['points']
+                    break
+        overall[player['id']] = {'name': player['name'], 'number': player['number'], 'points': total_points}
+    rankings['overall'] = sorted(overall.items(), key=lambda x: x[1]['points'], reverse=True)
+    return rankings
+
+
+def matrix_rankings(players, positions, standings, doping):
+    """The rankings from the points matrix, as get_all_rankings() computes them"""
+    fixed_points = {game: {s['player_id']: s['points'] for s in standings[game]} for game in TOURNAMENT_GAMES}
+    matrix = PointsMatrix(players, GAMES, positions, SCORING_POINTS, fixed_points, doping)
+
+    def ranking(games, tiebreak_game=None):
+        totals = matrix.totals(games)
+        rows = matrix.players
+        return [(rows[row]['id'], {'name': rows[row]['name'], 'number': rows[row]['number'], 'points': totals[row]})
+                for row in matrix.order(totals, tiebreak_game)]
+
+    rankings = {category: ranking(games, 'petanque' if category == 'ball_games' else None)
+                for category, games in GAME_CATEGORIES.items()}
+    rankings['overall'] = ranking(GAMES)
+    return rankings
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', default='1000,10000', help='comma separated player counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    numpy = points_matrix.numpy
+    print(f'NumPy: {numpy.__version__ if numpy is not None else "not installed"}, median of {args.repeat} runs (ms)')
+    print(f'{"players":>8} {"loops":>11} {"matrix numpy":>13} {"matrix lists":>13}')
+    for num_players in [int(count) for count in args.players.split(',')]:
+        event = synthetic_event(num_players, random.Random(num_players))
+        before, expected = median_ms(lambda: loop_rankings(*event), args.repeat)
+        if numpy is not None:
+            with_numpy, result = median_ms(lambda: matrix_rankings(*event), args.repeat)
+            assert result == expected
+        points_matrix.numpy = None
+        try:
+            with_lists, result = median_ms(lambda: matrix_rankings(*event), args.repeat)
+            assert result == expected
+        finally:
+            points_matrix.numpy = numpy
+        numpy_column = f'{with_numpy:>13.1f}' if numpy is not None else f'{"-":>13}'
+        print(f'{num_players:>8} {before:>11.1f} {numpy_column} {with_lists:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
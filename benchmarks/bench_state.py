@@ -0,0 +1,82 @@
+"""Compare request latency of the polling routes with and without the resident data store.
+
+Usage: python benchmarks/bench_state.py [--players 200] [--requests 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTES = ['/get_rankings', '/get_players', '/check_winners', '/get_doping_usage', '/get_results']
+
+
+def write_event_data(data_dir, num_players):
+    """Write a synthetic event with results for every player"""
+    players = [{'id': i, 'name': f'Renner {i}', 'number': i, 'registered_at': '2025-08-26T12:00:00', 'picture': None}
+               for i in range(1, num_players + 1)]
+    ids = [p['id'] for p in players]
+    results = {
+        'touwspringen': {str(i): random.randint(20, 90) for i in ids},
+        'stoelendans': random.sample(ids, len(ids)),
+        'petanque': [],
+        'kubb': [],
+        'rebus': {str(i): {'answers': [str(random.randint(0, 3)) for _ in range(10)],
+                           'time_seconds_total': random.uniform(60, 300)} for i in ids},
+        'wiskunde': {str(i): {'answers': [str(random.randint(0, 3)) for _ in range(10)],
+                              'time_seconds_total': random.uniform(60, 300)} for i in ids},
+    }
+    files = {
+        'players': players,
+        'results': results,
+        'answer_keys': {'rebus': [str(n % 4) for n in range(10)], 'wiskunde': [str(n % 3) for n in range(10)]},
+        'doping_usage': {str(i): 'touwspringen' for i in ids[::7]},
+        'scores': {},
+        'opponents': {},
+        'tournaments': {},
+    }
+    for name, data in files.items():
+        with open(os.path.join(data_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def measure(client, route, requests, before_request=None):
+    timings = []
+    for _ in range(requests):
+        if before_request:
+            before_request()
+        start = time.perf_counter()
+        response = client.get(route)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (route, response.status_code)
+    return statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='rockbrakel_bench_')
+    write_event_data(data_dir, args.players)
+    os.environ['ROCKBRAKEL_DATA_DIR'] = data_dir
+    import app as rockbrakel
+
+    client = rockbrakel.app.test_client()
+    print(f'{args.players} players, {args.requests} requests per route (times in ms)')
+    print(f'{"route":<20} {"reload p50":>11} {"reload p95":>11} {"cached p50":>11} {"cached p95":>11}')
+    for route in ROUTES:
+        # Forgetting the file signatures reproduces the old reload-everything behaviour
+        reload_p50, reload_p95 = measure(client, route, args.requests, rockbrakel.store.invalidate)
+        cached_p50, cached_p95 = measure(client, route, args.requests)
+        print(f'{route:<20} {reload_p50:>11.2f} {reload_p95:>11.2f} {cached_p50:>11.2f} {cached_p95:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
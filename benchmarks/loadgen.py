@@ -0,0 +1,308 @@
+"""Replay a full event against the app and report latency and throughput per endpoint.
+
+Players register through /register_player, touwspringen, rebus, wiskunde and stoelendans
+results are submitted and both knock-out tournaments are played out through
+/submit_tournament_match, while simulated scoreboards poll /get_rankings and /check_winners
+(with If-None-Match, like a browser). Runs on Flask's test client, every player count in a
+fresh process, or against a local gunicorn with --gunicorn.
+
+Usage: python benchmarks/loadgen.py [--players 20,100,500,2000] [--scoreboards 10] [--poll-interval 0.5] [--gunicorn]
+"""
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BRAIN_GAMES = ['rebus', 'wiskunde']
+TOURNAMENT_GAMES = ['petanque', 'kubb']
+OK_STATUSES = {200, 202, 304}
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by all threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}  # {endpoint: [ms, ...]}
+        self.errors = {}  # {endpoint: count}
+        self.spans = {}  # {endpoint: [first start, last end]}
+
+    def add(self, endpoint, start, end, ok):
+        with self._lock:
+            self.timings.setdefault(endpoint, []).append((end - start) * 1000)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            span = self.spans.setdefault(endpoint, [start, end])
+            span[0], span[1] = min(span[0], start), max(span[1], end)
+
+    def report(self):
+        """Return {endpoint: {requests, errors, p50, p95, p99, per_second}}"""
+        report = {}
+        for endpoint, timings in self.timings.items():
+            timings = sorted(timings)
+            duration = self.spans[endpoint][1] - self.spans[endpoint][0]
+            report[endpoint] = {
+                'requests': len(timings),
+                'errors': self.errors.get(endpoint, 0),
+                'p50': percentile(timings, 50),
+                'p95': percentile(timings, 95),
+                'p99': percentile(timings, 99),
+                'per_second': len(timings) / duration if duration > 0 else 0.0,
+            }
+        return report
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of a sorted list"""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+class TestClientTransport:
+    """Requests through Flask's test client, one client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=body, headers=headers or {})
+        return response.status_code, response.headers, response.get_data()
+
+
+class HTTPTransport:
+    """Requests over keep-alive HTTP connections, one connection per thread"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                return response.status, response.headers, response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed the keep-alive connection, retry once on a new one
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+class Session:
+    """A transport that records every request under its endpoint name"""
+
+    def __init__(self, transport, recorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    def call(self, endpoint, method, path, body=None, headers=None):
+        """Return (status, headers, decoded JSON or None)"""
+        headers = dict(headers or {}, **{'Accept-Encoding': 'gzip'})
+        start = time.perf_counter()
+        try:
+            status, response_headers, data = self.transport.request(method, path, body, headers)
+        except OSError:
+            self.recorder.add(endpoint, start, time.perf_counter(), False)
+            return None, {}, None
+        end = time.perf_counter()
+        if response_headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        payload = json.loads(data) if data and response_headers.get('Content-Type', '').startswith('application/json') else None
+        ok = status in OK_STATUSES and not (method == 'POST' and isinstance(payload, dict) and payload.get('success') is False)
+        self.recorder.add(endpoint, start, end, ok)
+        return status, response_headers, payload
+
+    def post_json(self, endpoint, path, data):
+        return self.call(endpoint, 'POST', path, json.dumps(data).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def post_form(self, endpoint, path, fields):
+        # The registration form is sent as multipart/form-data, like the browser does
+        boundary = uuid.uuid4().hex
+        parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                 for name, value in fields.items()]
+        body = (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8')
+        return self.call(endpoint, 'POST', path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+def scoreboard(session, stop, interval, rng):
+    """Poll the rankings and winners until stop is set, revalidating with the last ETag"""
+    etags = {}
+    time.sleep(rng.uniform(0, interval))
+    while not stop.is_set():
+        for path in ('/get_rankings', '/check_winners'):
+            headers = {'If-None-Match': etags[path]} if path in etags else {}
+            status, response_headers, _ = session.call(path, 'GET', path, headers=headers)
+            if status == 200 and response_headers.get('ETag'):
+                etags[path] = response_headers['ETag']
+        stop.wait(interval * rng.uniform(0.5, 1.5))
+
+
+def play_event(session, num_players, rng):
+    """Register the players, submit every result and play out both tournaments"""
+    for game in BRAIN_GAMES:
+        session.post_json('/admin/set_answer_key', '/admin/set_answer_key',
+                          {'game': game, 'answers': [str(rng.randint(0, 3)) for _ in range(10)]})
+
+    player_ids = []
+    for number in rng.sample(range(1, num_players * 3 + 1), num_players):
+        _, _, payload = session.post_form('/register_player', '/register_player',
+                                          {'name': f'Renner {number}', 'number': number})
+        if payload and payload.get('success'):
+            player_ids.append(payload['player']['id'])
+
+    doped = set()
+
+    def doping(player_id):
+        # Some players use their one doping, like at the real event
+        if player_id not in doped and rng.random() < 0.05:
+            doped.add(player_id)
+            return True
+        return False
+
+    for player_id in player_ids:
+        session.post_json('/submit_game_results', '/submit_game_results',
+                          {'game': 'touwspringen', 'player_id': player_id, 'jumps': rng.randint(10, 120),
+                           'doping': doping(player_id)})
+    for game in BRAIN_GAMES:
+        for player_id in player_ids:
+            session.post_json('/submit_game_results', '/submit_game_results',
+                              {'game': game, 'player_id': player_id, 'doping': doping(player_id),
+                               'answers': [str(rng.randint(0, 3)) for _ in range(10)],
+                               'time_seconds_total': round(rng.uniform(30, 600), 1)})
+    ordering = rng.sample(player_ids, len(player_ids))
+    doping_players = [player_id for player_id in ordering if doping(player_id)]
+    session.post_json('/submit_game_results', '/submit_game_results',
+                      {'game': 'stoelendans', 'ordering': ordering, 'doping': bool(doping_players),
+                       'doping_players': doping_players})
+
+    for game in TOURNAMENT_GAMES:
+        session.call('/generate_tournament/<game>', 'POST', f'/generate_tournament/{game}')
+        while True:
+            _, _, tournament = session.call('/get_tournament/<game>', 'GET', f'/get_tournament/{game}')
+            if not tournament or tournament.get('final_standings') or not tournament.get('rounds'):
+                break
+            current_round = tournament['current_round']
+            matches = [match for match in tournament['rounds'][current_round] if not match['completed']]
+            if not matches:
+                break
+            for match in matches:
+                winner, loser = rng.sample([match['player1']['id'], match['player2']['id']], 2)
+                session.post_json('/submit_tournament_match', '/submit_tournament_match',
+                                  {'game': game, 'match_id': match['match_id'], 'winner_id': winner, 'loser_id': loser})
+    return len(player_ids)
+
+
+def run(transport, num_players, scoreboards, interval, seed):
+    """Play an event with the scoreboards polling alongside, returns (registered players, seconds, report)"""
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=scoreboard, daemon=True,
+                                args=(Session(transport, recorder), stop, interval, random.Random(seed + i + 1)))
+               for i in range(scoreboards)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        registered = play_event(Session(transport, recorder), num_players, random.Random(seed))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return registered, time.perf_counter() - start, recorder.report()
+
+
+def run_test_client(args, num_players):
+    """Run one player count in this process on a fresh data folder"""
+    os.environ['ROCKBRAKEL_DATA_DIR'] = tempfile.mkdtemp(prefix='rockbrakel_load_')
+    import app as rockbrakel
+    return run(TestClientTransport(rockbrakel.app), num_players, args.scoreboards, args.poll_interval, args.seed)
+
+
+def run_gunicorn(args, num_players):
+    """Start a local gunicorn on a fresh data folder and run one player count against it"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, ROCKBRAKEL_DATA_DIR=tempfile.mkdtemp(prefix='rockbrakel_load_'),
+               ROCKBRAKEL_BIND=f'127.0.0.1:{port}')
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+        return run(HTTPTransport('127.0.0.1', port), num_players, args.scoreboards, args.poll_interval, args.seed)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_report(num_players, registered, seconds, report):
+    print(f'\n{num_players} players ({registered} registered), event replayed in {seconds:.1f} s')
+    print(f'{"endpoint":<28} {"requests":>9} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>9}')
+    for endpoint, row in report.items():
+        print(f'{endpoint:<28} {row["requests"]:>9} {row["errors"]:>7} {row["p50"]:>9.2f} {row["p95"]:>9.2f}'
+              f' {row["p99"]:>9.2f} {row["per_second"]:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', default='20,100,500,2000', help='comma separated player counts')
+    parser.add_argument('--scoreboards', type=int, default=10, help='simulated scoreboard clients')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='seconds between polls of a scoreboard')
+    parser.add_argument('--gunicorn', action='store_true', help='run against a local gunicorn instead of the test client')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default WEB_CONCURRENCY or 4)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # One player count on the test client, the app module keeps its state for the whole process
+        print(json.dumps(run_test_client(args, args.child)))
+        return
+
+    mode = 'gunicorn' if args.gunicorn else 'Flask test client'
+    print(f'{mode}, {args.scoreboards} scoreboards polling every {args.poll_interval} s')
+    for num_players in [int(count) for count in args.players.split(',')]:
+        if args.gunicorn:
+            result = run_gunicorn(args, num_players)
+        else:
+            command = [sys.executable, os.path.abspath(__file__), '--child', str(num_players),
+                       '--scoreboards', str(args.scoreboards), '--poll-interval', str(args.poll_interval),
+                       '--seed', str(args.seed)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print_report(num_players, *result)
+
+
+if __name__ == '__main__':
+    main()
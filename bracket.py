@@ -0,0 +1,107 @@
+from model import TournamentMatch
+
+
+def bracket_size(count):
+    """Return the number of slots in the first round: the smallest power of two that fits every entrant"""
+    size = 2
+    while size < count:
+        size *= 2
+    return size
+
+
+def seed_order(size):
+    """Return the seed numbers (1-based) of the first round slots, in bracket order.
+
+    Slots 2k and 2k+1 play each other: seed s meets seed size + 1 - s, and the top two
+    seeds can only meet in the final. The lower seed is always the first of a pair.
+    """
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def feeds(round_idx, match_idx):
+    """Return (round index, match index, slot) of the match the winner of a match goes to"""
+    return round_idx + 1, match_idx // 2, 'player1' if match_idx % 2 == 0 else 'player2'
+
+
+def _match(match_id):
+    return TournamentMatch({
+        'match_id': match_id,
+        'player1': None,
+        'player2': None,
+        'winner': None,
+        'loser': None,
+        'doping1': False,
+        'doping2': False,
+        'completed': False
+    })
+
+
+def build_bracket(game, entrants):
+    """Build a knock-out tournament with every round up front, entrants ordered by seed (best first).
+
+    Entrants without an opponent (the slots past the last seed) get a bye in round 1, so
+    byes go to the top seeds and are spread over the bracket; bye winners are placed in
+    round 2 right away. Later rounds are filled in as matches are won.
+    """
+    tournament = {
+        'rounds': [],
+        'current_round': 0,
+        'final_standings': [],
+        'num_rounds': 1,
+        'bye_players': []
+    }
+    if not entrants:
+        tournament['rounds'].append([])
+        return tournament
+    size = bracket_size(len(entrants))
+    num_rounds = size.bit_length() - 1
+    tournament['num_rounds'] = num_rounds
+    tournament['bracket_size'] = size
+    tournament['rounds'] = [[_match(f'{game}_r{round_idx + 1}_m{match_idx}') for match_idx in range(size >> (round_idx + 1))]
+                            for round_idx in range(num_rounds)]
+    order = seed_order(size)
+    for match_idx, match in enumerate(tournament['rounds'][0]):
+        seed1, seed2 = order[2 * match_idx], order[2 * match_idx + 1]
+        match['player1'] = entrants[seed1 - 1]
+        if seed2 <= len(entrants):
+            match['player2'] = entrants[seed2 - 1]
+            continue
+        # Bye: advances automatically
+        match['winner'] = match['player1']['id']
+        match['completed'] = True
+        tournament['bye_players'].append(match['winner'])
+        if num_rounds > 1:
+            next_round, next_idx, slot = feeds(0, match_idx)
+            tournament['rounds'][next_round][next_idx][slot] = {'id': match['winner']}
+    return tournament
+
+
+def elimination_standings(tournament, winner_points, points_by_depth, other_points):
+    """Return the final standings of a finished knock-out tournament, from the round each player lost in.
+
+    Depth 1 is the final, 2 the semi-finals and so on; points_by_depth[depth - 1] are the points
+    for losing at that depth, other_points for losing earlier. Players knocked out in the same
+    round share a position.
+    """
+    rounds = tournament['rounds']
+    final = rounds[-1][0] if rounds and rounds[-1] else None
+    champion = final['winner'] if final else None
+    depths = {}
+    for round_idx, round_matches in enumerate(rounds):
+        for match in round_matches:
+            if match['completed'] and match['loser'] and match['loser'] != champion:
+                depths[match['loser']] = len(rounds) - round_idx
+    standings = []
+    if champion:
+        standings.append({'player_id': champion, 'position': 1, 'points': winner_points})
+    position = previous_depth = None
+    for player_id, depth in sorted(depths.items(), key=lambda item: item[1]):
+        if depth != previous_depth:
+            position, previous_depth = len(standings) + 1, depth
+        points = points_by_depth[depth - 1] if depth <= len(points_by_depth) else other_points
+        standings.append({'player_id': player_id, 'position': position, 'points': points})
+    return standings
@@ -0,0 +1,80 @@
+import csv
+import io
+import zlib
+from collections.abc import Mapping
+
+# Columns of the CSV and NDJSON exports, one row per player per game
+EXPORT_COLUMNS = ['player_id', 'number', 'name', 'game', 'position', 'points', 'doping', 'score', 'time_seconds']
+CHUNK_SIZE = 64 * 1024
+
+
+def chunked(parts, size=CHUNK_SIZE):
+    """Join small strings into chunks of about size characters, so the server writes fewer but bounded pieces"""
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzip_chunks(chunks, level=5):
+    """Gzip a stream of text chunks as they are produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_json(sections, dumps, depth=2):
+    """Yield the JSON of {name: value} piece by piece.
+
+    Containers up to depth levels below a section are written one item at a time, deeper
+    values with dumps in one go, so the whole export is never one string in memory.
+    """
+    yield from _stream_value(sections, dumps, depth + 1, '')
+    yield '\n'
+
+
+def _stream_value(value, dumps, depth, indent):
+    if depth == 0 or not isinstance(value, (Mapping, list, tuple)) or not value:
+        yield dumps(value)
+        return
+    inner = indent + '  '
+    if isinstance(value, Mapping):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            # Keys as the json module writes them: ints (doping usage) become strings
+            yield f'{"," if i else ""}\n{inner}{dumps(str(key))}: '
+            yield from _stream_value(item, dumps, depth - 1, inner)
+        yield f'\n{indent}}}'
+    else:
+        yield '['
+        for i, item in enumerate(value):
+            yield f'{"," if i else ""}\n{inner}'
+            yield from _stream_value(item, dumps, depth - 1, inner)
+        yield f'\n{indent}]'
+
+
+def stream_ndjson(rows, dumps):
+    """Yield one JSON object per line"""
+    for row in rows:
+        yield dumps(row) + '\n'
+
+
+def stream_csv(rows):
+    """Yield CSV lines with a header, starting with a BOM so spreadsheets read the names as UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_COLUMNS)
+    writer.writeheader()
+    yield '\ufeff' + buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
@@ -0,0 +1,15 @@
+# gunicorn -c gunicorn.conf.py app:app
+# Every open /events stream holds a connection, so use gevent (pip install gevent) when it is
+# installed and threads otherwise; sync workers could only serve one stream each
+import importlib.util
+import os
+
+bind = os.environ.get('ROCKBRAKEL_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+if importlib.util.find_spec('gevent') is not None:
+    worker_class = 'gevent'
+    worker_connections = 1000
+else:
+    worker_class = 'gthread'
+    threads = 100
@@ -0,0 +1,55 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from model import Record
+
+try:
+    import orjson
+except ImportError:  # The standard library encoder is used
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    return DefaultJSONProvider.default(value)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, writing the records of the domain model as the dicts they replace"""
+
+    default = staticmethod(_default)
+
+
+class CompactJSONProvider(JSONProvider):
+    """JSON without key sorting or whitespace, encoded with orjson when it is installed.
+
+    Flask's default provider sorts the keys of every object, which costs time on the
+    large ranking and tournament payloads and is not needed by the frontend.
+    """
+
+    sort_keys = False
+    compact = True
+
+    def encode(self, obj):
+        """Return obj as UTF-8 encoded JSON"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=(
+                    # Same output as the standard encoder: int keys become strings, dates go through default
+                    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS))
+            except TypeError:  # Integers over 64 bits, for example
+                pass
+        return json.dumps(obj, default=self.default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', self.default)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
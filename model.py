@@ -0,0 +1,155 @@
+from collections.abc import Mapping, MutableMapping
+
+
+class Record(MutableMapping):
+    """Fixed fields stored in __slots__ instead of a dict per object, read and written like a dict.
+
+    A field that was never set counts as a missing key, so a record turns into the same
+    JSON as the dict it was made from. Keys that are not fields are kept in extra.
+    """
+
+    __slots__ = ('extra',)
+    fields = ()
+    _field_set = frozenset()
+
+    def __init__(self, data=(), **values):
+        self.extra = None
+        if values:
+            data = dict(data, **values)
+        field_set = self._field_set
+        for key, value in (data.items() if isinstance(data, Mapping) else data):
+            if key in field_set:
+                setattr(self, key, value)
+            else:
+                self[key] = value
+
+    @classmethod
+    def of(cls, data):
+        """Return data as a record of this class (data itself if it already is one)"""
+        return data if isinstance(data, cls) else cls(data)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.fields:
+            if hasattr(self, key):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self.items())!r})'
+
+    def copy(self):
+        return type(self)(self)
+
+    def to_dict(self):
+        """Return the record as a plain dict, for JSON"""
+        return dict(self.items())
+
+
+class Player(Record):
+    """A registered player (rider)"""
+    __slots__ = fields = ('id', 'name', 'number', 'registered_at', 'picture', 'picture_status')
+    _field_set = frozenset(fields)
+
+
+class TournamentMatch(Record):
+    """A knock-out match; player1/player2 are the player or {'id': ...}, player2 is None for a bye"""
+    __slots__ = fields = ('match_id', 'player1', 'player2', 'winner', 'loser', 'doping1', 'doping2', 'completed')
+    _field_set = frozenset(fields)
+
+
+class BrainGameResult(Record):
+    """A rebus or wiskunde answer sheet; correct and time_seconds are the legacy fields"""
+    __slots__ = fields = ('answers', 'time_seconds_total', 'correct_answers', 'correct', 'time_seconds')
+    _field_set = frozenset(fields)
+
+
+def json_default(value):
+    """default= for the JSON encoders: records are written as the dicts they replace"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def player_key(player_id):
+    """Return the canonical (int) key of a player id that may have been a JSON object key"""
+    return int(player_id)
+
+
+def canonical_players(data):
+    """Return the players of the JSON file as Player records with int ids"""
+    players = []
+    for player in data:
+        player = Player.of(player)
+        player['id'] = player_key(player['id'])
+        if 'picture' not in player:
+            player['picture'] = None  # Backward compatibility
+        players.append(player)
+    return players
+
+
+def canonical_results(data):
+    """Return the results of the JSON file with int player keys and BrainGameResult sheets"""
+    results = {}
+    for game, entries in data.items():
+        if isinstance(entries, dict):
+            # {player_id: jumps} or {player_id: answer sheet}
+            results[game] = {player_key(player_id): BrainGameResult.of(value) if isinstance(value, Mapping) else value
+                             for player_id, value in entries.items()}
+        elif game == 'stoelendans':
+            results[game] = [player_key(player_id) for player_id in entries]
+        else:
+            results[game] = entries  # Legacy [{winner: id, loser: id}, ...]
+    return results
+
+
+def canonical_tournaments(data):
+    """Return the tournaments of the JSON file with TournamentMatch matches"""
+    for tournament in data.values():
+        tournament['rounds'] = [[TournamentMatch.of(match) for match in round_matches]
+                                for round_matches in tournament.get('rounds', [])]
+    return data
+
+
+def canonical_doping_usage(data):
+    """Return the doping usage of the JSON file with int player keys"""
+    return {player_key(player_id): game for player_id, game in data.items()}
@@ -0,0 +1,164 @@
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Without Pillow the original pictures are served
+    Image = None
+
+
+# Square derivatives (width = height in pixels), twice the size they are shown at for sharp screens
+PICTURE_SIZES = {
+    'avatar': 100,  # Rankings (50px)
+    'card': 240,  # Winner and registration popups (100-120px)
+    'popup': 480  # Popups on high density screens
+}
+# First bytes of the image formats that can be uploaded, the extension is taken from these and not the file name
+IMAGE_SIGNATURES = [(b'\x89PNG\r\n\x1a\n', 'png'), (b'\xff\xd8\xff', 'jpg'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif')]
+# Formats written for every size: WebP for browsers that accept it, JPEG for the others
+PICTURE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+DERIVATIVES_DIR = 'sizes'
+# Raised by make_derivatives() for files that are not a readable image, or too large to decode
+PICTURE_ERRORS = (OSError, ValueError) + ((Image.DecompressionBombError,) if Image is not None else ())
+
+
+class UploadError(ValueError):
+    """An upload that is not accepted, the message is shown to the user"""
+
+
+def sniff_image(head):
+    """Return the extension of an image by its first bytes, None if it is not a supported image"""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+# Enough bytes of a file to recognise every format in IMAGE_SIGNATURES and WebP
+SIGNATURE_BYTES = 12
+
+
+class PictureUpload:
+    """An uploaded picture, written to a temp file in the folder by the form parser while it comes in.
+
+    The first bytes are checked to be an image and the size is counted on every write, so a file that
+    fails is refused at the chunk where it does: the rest of it is not written to disk. result() returns
+    the temp file for the request, discard() removes it when it was not moved into place.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.ext = None
+        self.error = None  # Message for the user once the file is refused
+        self._head = b''
+        fd, self.path = tempfile.mkstemp(prefix='.upload.', suffix='.tmp', dir=folder)
+        os.chmod(self.path, 0o644)  # mkstemp creates owner-only files
+        self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        if self.error is None:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._refuse(f'De foto is te groot (maximaal {self.max_bytes // (1024 * 1024)} MB)')
+            else:
+                if self.ext is None and len(self._head) < SIGNATURE_BYTES:
+                    self._head += data[:SIGNATURE_BYTES - len(self._head)]
+                    if len(self._head) == SIGNATURE_BYTES:
+                        self._sniff()
+                if self.error is None:
+                    self._file.write(data)
+        return len(data)
+
+    def _sniff(self):
+        self.ext = sniff_image(self._head)
+        if self.ext is None:
+            self._refuse('Dit bestand is geen foto (PNG, JPG, GIF of WEBP)')
+
+    def _refuse(self, message):
+        # The parser still reads the rest of the request, it is dropped instead of written
+        self.error = message
+        self._file.truncate(0)
+
+    def result(self):
+        """Return (temp path, extension) of a complete picture, raises UploadError when it was refused"""
+        if self.error is None and self.ext is None:
+            self._sniff()  # Files shorter than SIGNATURE_BYTES
+        if self.error is not None:
+            raise UploadError(self.error)
+        self._file.close()
+        return self.path, self.ext
+
+    def discard(self):
+        """Close the temp file and remove it, unless it was moved into place"""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __getattr__(self, name):
+        # seek(), read() and the rest of the file interface for the parser and FileStorage
+        return getattr(self._file, name)
+
+
+def derivative_name(filename, size, ext):
+    """Return the file name of a derivative of a picture, relative to the upload folder"""
+    return f'{DERIVATIVES_DIR}/{filename}.{size}.{ext}'
+
+
+def _current(folder, filename, name):
+    """Check if a derivative exists and is not older than its picture (pictures are overwritten on upload)"""
+    try:
+        return os.stat(os.path.join(folder, name)).st_mtime_ns >= os.stat(os.path.join(folder, filename)).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def make_derivatives(folder, filename):
+    """Write every size and format of a picture, without its EXIF data; returns False without Pillow"""
+    if Image is None:
+        return False
+    os.makedirs(os.path.join(folder, DERIVATIVES_DIR), exist_ok=True)
+    with Image.open(os.path.join(folder, filename)) as original:
+        # Phone pictures are stored sideways with an orientation tag, which is dropped with the EXIF data
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    flat = image
+    if image.mode == 'RGBA':
+        # JPEG has no transparency
+        flat = Image.new('RGB', image.size, 'white')
+        flat.paste(image, mask=image.getchannel('A'))
+    for size, pixels in PICTURE_SIZES.items():
+        for ext, image_format in PICTURE_FORMATS.items():
+            source = image if image_format == 'WEBP' else flat
+            # Shown as a circle with object-fit: cover, so crop to the center square
+            resized = ImageOps.fit(source, (pixels, pixels), Image.LANCZOS)
+            _save(resized, os.path.join(folder, derivative_name(filename, size, ext)), image_format)
+    return True
+
+
+def _save(image, path, image_format):
+    # Write to a temp file and rename, a request can be reading the old derivative
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, image_format, quality=80, optimize=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def picture_for(folder, filename, size, accept_webp):
+    """Return the file to serve for a picture in a size, None if its derivative is missing or outdated.
+
+    Derivatives are only made by make_derivatives() (after the upload, or queued by the caller), never
+    while a request waits. Unknown sizes get the original picture.
+    """
+    if size not in PICTURE_SIZES:
+        return filename
+    name = derivative_name(filename, size, 'webp' if accept_webp else 'jpg')
+    return name if _current(folder, filename, name) else None
@@ -0,0 +1,48 @@
+class PlayerRegistry:
+    """Lookups of players by id and by startnummer without scanning the player list.
+
+    The registry is not stored, it is built from the player list when that is loaded and
+    kept up to date by registering players through add(). New ids come from a counter
+    that only goes up, so an id is never handed out twice.
+    """
+
+    def __init__(self, players):
+        self.players = players
+        self.by_id = {}  # {player_id: player}
+        self.by_number = {}  # {startnummer: player}
+        self.last_id = 0  # Highest id handed out or seen
+        self.count = 0  # Players of the list that are indexed
+        for player in players:
+            self._index(player)
+
+    def current(self, players):
+        """Check that the registry was built from this list and has all its players"""
+        return self.players is players and self.count == len(players)
+
+    def _index(self, player):
+        self.by_id[player['id']] = player
+        self.by_number.setdefault(player['number'], player)
+        self.last_id = max(self.last_id, player['id'])
+        self.count += 1
+
+    def next_id(self):
+        """Return the id for the next player to register"""
+        return self.last_id + 1
+
+    def add(self, player):
+        """Append a new player to the list and index it"""
+        self.players.append(player)
+        self._index(player)
+
+    def get(self, player_id):
+        """Return the player with this id, or None"""
+        return self.by_id.get(player_id)
+
+    def number(self, player_id, default=0):
+        """Return the startnummer of a player, default for unknown ids"""
+        player = self.by_id.get(player_id)
+        return player['number'] if player is not None else default
+
+    def number_taken(self, number):
+        """Check if a startnummer is already in use"""
+        return number in self.by_number
@@ -0,0 +1,91 @@
+try:
+    import numpy
+except ImportError:  # The same matrix as lists of lists
+    numpy = None
+
+
+class PointsMatrix:
+    """Points of every player in every game: one row per player, one column per game.
+
+    Built once from the positions per game, a points table (points for position 1, 2, ...)
+    and the doping claims; rankings are row sums over a group of columns, so no
+    per-player lookups into rankings or standings are needed. Uses NumPy when it is
+    installed and plain lists otherwise, with the same results.
+    """
+
+    def __init__(self, players, games, positions, table, fixed_points=None, doping=None):
+        """players: [{'id': ...}, ...], positions: {game: {player_id: position}}, table: points for position 1, 2, ...
+
+        Games in fixed_points ({game: {player_id: points}}) take their points from there instead,
+        for players that have a position. doping ({player_id: game}) doubles the points of that game.
+        """
+        self.players = list(players)  # The rows, kept so the matrix stays consistent when the list is replaced
+        self.player_ids = [player['id'] for player in self.players]
+        self.rows = {player_id: row for row, player_id in enumerate(self.player_ids)}
+        self.columns = {game: column for column, game in enumerate(games)}
+        fixed_points = fixed_points or {}
+        doping = doping or {}
+        count = len(self.player_ids)
+        # Points per position with 0 for "no position" in front and for every position past the table
+        lookup = [0] + list(table) + [0]
+        self._positions = []
+        if numpy is not None:
+            self.points = numpy.zeros((count, len(games)), dtype=numpy.int64)
+            lookup = numpy.array(lookup, dtype=numpy.int64)
+        else:
+            self.points = [[0] * len(games) for _ in range(count)]
+        for game, column in self.columns.items():
+            game_positions = positions.get(game, {})
+            # Position per row, 0 for players without one
+            row_positions = [game_positions.get(player_id, 0) for player_id in self.player_ids]
+            self._positions.append(row_positions)
+            if game in fixed_points:
+                game_points = fixed_points[game]
+                values = [game_points.get(player_id, 0) if position else 0
+                          for player_id, position in zip(self.player_ids, row_positions)]
+            elif numpy is not None:
+                values = lookup[numpy.minimum(numpy.array(row_positions, dtype=numpy.int64), len(lookup) - 1)]
+            else:
+                values = [lookup[min(position, len(lookup) - 1)] for position in row_positions]
+            if numpy is not None:
+                self.points[:, column] = values
+            else:
+                for row, value in enumerate(values):
+                    self.points[row][column] = value
+        # Doping doubles the points of the one game it was used for
+        for player_id, game in doping.items():
+            row, column = self.rows.get(player_id), self.columns.get(game)
+            if row is not None and column is not None:
+                if numpy is not None:
+                    self.points[row, column] *= 2
+                else:
+                    self.points[row][column] *= 2
+
+    def get(self, player_id, game):
+        """Return the points of a player in a game"""
+        row, column = self.rows[player_id], self.columns[game]
+        return int(self.points[row, column]) if numpy is not None else self.points[row][column]
+
+    def totals(self, games):
+        """Return the sum of the points in the given games, per row"""
+        columns = [self.columns[game] for game in games if game in self.columns]
+        if numpy is not None:
+            return self.points[:, columns].sum(axis=1).tolist()
+        return [sum(row[column] for column in columns) for row in self.points]
+
+    def order(self, totals, tiebreak_game=None):
+        """Return the rows from most to fewest points, ties by position in tiebreak_game (no position last), then row"""
+        if tiebreak_game is not None and tiebreak_game in self.columns:
+            positions = self._positions[self.columns[tiebreak_game]]
+            tiebreak = [position or float('inf') for position in positions]
+        else:
+            tiebreak = None
+        if numpy is not None:
+            keys = [-numpy.array(totals, dtype=numpy.int64)]
+            if tiebreak is not None:
+                keys.insert(0, numpy.array(tiebreak, dtype=numpy.float64))
+            # lexsort is stable and sorts on the last key first
+            return numpy.lexsort(keys).tolist() if totals else []
+        if tiebreak is not None:
+            return sorted(range(len(totals)), key=lambda row: (-totals[row], tiebreak[row]))
+        return sorted(range(len(totals)), key=lambda row: -totals[row])
@@ -0,0 +1,75 @@
+def normalize_answer(answer):
+    """
+    Normalize an answer by removing all extra whitespace and converting to lowercase.
+    This ensures answers are correct regardless of the number of spaces.
+    """
+    if answer is None:
+        return ""
+    # Convert to string, remove all extra whitespace, and convert to lowercase
+    return ' '.join(str(answer).split()).lower()
+
+def normalize_comma_separated_answers(answer):
+    """
+    Normalize comma-separated answers by handling spaces around commas and individual answers.
+    """
+    if answer is None:
+        return []
+    # Split by comma, normalize each part, and filter out empty parts
+    parts = [normalize_answer(part) for part in str(answer).split(',')]
+    return [part for part in parts if part]  # Remove empty parts
+
+
+class ExactMatcher:
+    """Answer equal to the key, ignoring case and extra whitespace"""
+
+    def __init__(self, key):
+        self.key = normalize_answer(key)
+
+    def matches(self, answer):
+        return normalize_answer(answer) == self.key
+
+
+class PartsMatcher:
+    """Comma-separated answer with a fixed number of parts, in order or in any order"""
+
+    def __init__(self, key, count, ordered=True):
+        self.count = count
+        self.ordered = ordered
+        parts = normalize_comma_separated_answers(key)
+        if len(parts) != count:
+            self.key = None  # A key with the wrong number of parts never matches
+        else:
+            self.key = parts if ordered else set(parts)
+
+    def matches(self, answer):
+        if self.key is None:
+            return False
+        parts = normalize_comma_separated_answers(answer)
+        if len(parts) != self.count:
+            return False
+        return parts == self.key if self.ordered else set(parts) == self.key
+
+
+# Questions (game, index) that are not compared as a single answer
+SPECIAL_QUESTIONS = {
+    ('wiskunde', 0): lambda key: PartsMatcher(key, 2),  # x,y
+    ('wiskunde', 1): lambda key: PartsMatcher(key, 2),  # x,W(x)
+    ('rebus', 9): lambda key: PartsMatcher(key, 4, ordered=False)  # 4 names, order doesn't matter
+}
+
+
+class AnswerKey:
+    """Answer key of a brain game, normalized once into a matcher per question"""
+
+    def __init__(self, game, answers):
+        self.game = game
+        self.answers = answers
+        self.matchers = []
+        if isinstance(answers, list):
+            for i, key in enumerate(answers):
+                make_matcher = SPECIAL_QUESTIONS.get((game, i), ExactMatcher)
+                self.matchers.append(make_matcher(key))
+
+    def score(self, answers):
+        """Return the number of correct answers, compared question by question"""
+        return sum(1 for matcher, answer in zip(self.matchers, answers) if matcher.matches(answer))
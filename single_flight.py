@@ -0,0 +1,51 @@
+import threading
+
+
+class SingleFlight:
+    """Runs a computation once for all threads that ask for it at the same time.
+
+    Callers name the computation and the state it is computed from in a key; a caller
+    that finds the same key in flight waits for that run and gets its result (or its
+    exception) instead of running it again. Nothing is kept once the run is done,
+    caching results is up to the caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # {key: _Call}
+        self.shared = 0  # Callers that got the result of another caller's run
+
+    def do(self, key, func):
+        """Return func(), shared with the callers that ask for the same key while it runs"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _Call:
+    """A run in flight and its outcome"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,400 @@
+import json
+import os
+import sqlite3
+from collections.abc import Mapping
+
+from storage import DataStore
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS collections (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY, ord INTEGER NOT NULL, number INTEGER, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS players_number ON players (number);
+CREATE TABLE IF NOT EXISTS result_games (game TEXT PRIMARY KEY, ord INTEGER NOT NULL, kind TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS results (
+    game TEXT NOT NULL, entry TEXT NOT NULL, ord INTEGER NOT NULL, player_id INTEGER, data TEXT NOT NULL,
+    PRIMARY KEY (game, entry));
+CREATE INDEX IF NOT EXISTS results_player ON results (game, player_id);
+CREATE TABLE IF NOT EXISTS tournaments (
+    game TEXT PRIMARY KEY, ord INTEGER NOT NULL, round_count INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS matches (
+    game TEXT NOT NULL, round INTEGER NOT NULL, ord INTEGER NOT NULL, match_id TEXT,
+    player1 INTEGER, player2 INTEGER, completed INTEGER NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (game, round, ord));
+CREATE INDEX IF NOT EXISTS matches_id ON matches (game, match_id);
+CREATE INDEX IF NOT EXISTS matches_player1 ON matches (game, player1);
+CREATE INDEX IF NOT EXISTS matches_player2 ON matches (game, player2);
+CREATE TABLE IF NOT EXISTS doping_usage (player_id INTEGER PRIMARY KEY, ord INTEGER NOT NULL, game TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events_archive (seq INTEGER PRIMARY KEY, data TEXT NOT NULL);
+'''
+
+# Collections stored as rows in their own tables, the others are stored as one JSON document
+TABLES = {
+    'players': ['players'],
+    'results': ['result_games', 'results'],
+    'tournaments': ['tournaments', 'matches'],
+    'doping_usage': ['doping_usage'],
+}
+
+# Primary key columns per table, used to update and delete single rows
+KEYS = {
+    'documents': ['name'],
+    'players': ['id'],
+    'result_games': ['game'],
+    'results': ['game', 'entry'],
+    'tournaments': ['game'],
+    'matches': ['game', 'round', 'ord'],
+    'doping_usage': ['player_id'],
+}
+
+COLUMNS = {
+    'documents': ['name', 'data'],
+    'players': ['id', 'ord', 'number', 'data'],
+    'result_games': ['game', 'ord', 'kind'],
+    'results': ['game', 'entry', 'ord', 'player_id', 'data'],
+    'tournaments': ['game', 'ord', 'round_count', 'data'],
+    'matches': ['game', 'round', 'ord', 'match_id', 'player1', 'player2', 'completed', 'data'],
+    'doping_usage': ['player_id', 'ord', 'game'],
+}
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_key(name, table):
+    """Documents share one table, so their cached rows are kept per collection"""
+    return f'documents:{name}' if table == 'documents' else table
+
+
+def _player_ref(player):
+    """Tournament matches store players as {'id': ...} dicts (or None for a bye)"""
+    return _int_or_none(player.get('id')) if isinstance(player, Mapping) else _int_or_none(player)
+
+
+class SQLiteStore(DataStore):
+    """DataStore that keeps the collections in SQLite tables instead of JSON files.
+
+    Players, results, tournament matches and doping usage are stored one row per entry
+    with indexes on player number, (game, player_id) and match_id, so writes only touch
+    the rows that changed and lookups are index hits. Every process opens one connection
+    in WAL mode; the sqlite3 module caches the prepared statements of that connection.
+    Events are stored in the events table and are written to the tables right away.
+    """
+
+    def __init__(self, database, json_default=None):
+        super().__init__(os.path.dirname(os.path.abspath(database)), snapshot_every=1, json_default=json_default)
+        self.database = database
+        self._connection = None
+        self._pid = None
+        self._rows = {}  # {table: {key: row}} as last read or written by this process
+
+    def _conn(self):
+        # A connection must not be shared with processes forked by gunicorn
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.database, check_same_thread=False,
+                                               isolation_level=None, cached_statements=256)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=FULL')
+            self._connection.execute('PRAGMA busy_timeout=5000')
+            self._connection.executescript(SCHEMA)
+            self._pid = os.getpid()
+            self._rows = {}
+        return self._connection
+
+    def _dumps(self, value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=self.json_default)
+
+    def _signature(self, name):
+        row = self._conn().execute('SELECT version FROM collections WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def stale(self, names):
+        """Return the collections changed by another connection since they were last read or written"""
+        with self._lock:
+            versions = dict(self._conn().execute('SELECT name, version FROM collections').fetchall())
+            return [name for name in names
+                    if name not in self._signatures or self._signatures[name] != versions.get(name)]
+
+    def _load(self, name):
+        conn = self._conn()
+        if name == 'players':
+            data = [json.loads(row[0]) for row in conn.execute('SELECT data FROM players ORDER BY ord')]
+        elif name == 'results':
+            data = {}
+            for game, kind in conn.execute('SELECT game, kind FROM result_games ORDER BY ord'):
+                data[game] = {} if kind == 'dict' else []
+            for game, entry, value in conn.execute('SELECT game, entry, data FROM results ORDER BY game, ord'):
+                if isinstance(data.get(game), dict):
+                    data[game][entry] = json.loads(value)
+                elif game in data:
+                    data[game].append(json.loads(value))
+        elif name == 'tournaments':
+            data = {}
+            for game, round_count, value in conn.execute('SELECT game, round_count, data FROM tournaments ORDER BY ord'):
+                data[game] = dict(json.loads(value), rounds=[[] for _ in range(round_count)])
+            for game, round_idx, value in conn.execute('SELECT game, round, data FROM matches ORDER BY game, round, ord'):
+                data[game]['rounds'][round_idx].append(json.loads(value))
+        elif name == 'doping_usage':
+            # Same shape as the JSON file, which has string keys
+            data = {str(player_id): game for player_id, game in
+                    conn.execute('SELECT player_id, game FROM doping_usage ORDER BY ord')}
+        else:
+            row = conn.execute('SELECT data FROM documents WHERE name = ?', (name,)).fetchone()
+            data = json.loads(row[0]) if row else None
+        # Remember the rows so the next write only touches what changed
+        for table, rows in self._table_rows(name, data).items():
+            self._rows[_cache_key(name, table)] = rows
+        return data
+
+    def _table_rows(self, name, data):
+        """Split a collection into {table: {key: row}}"""
+        if name not in TABLES:
+            return {'documents': {} if data is None else {(name,): (name, self._dumps(data))}}
+        tables = {table: {} for table in TABLES[name]}
+        if name == 'players':
+            for ord_, player in enumerate(data or []):
+                tables['players'][(player['id'],)] = (
+                    player['id'], ord_, _int_or_none(player.get('number')), self._dumps(player))
+        elif name == 'results':
+            for game_ord, (game, entries) in enumerate((data or {}).items()):
+                tables['result_games'][(game,)] = self._result_game_row(game, game_ord, entries)
+                tables['results'].update(self._game_result_rows(game, entries))
+        elif name == 'tournaments':
+            for game_ord, (game, tournament) in enumerate((data or {}).items()):
+                tables['tournaments'][(game,)] = self._tournament_row(game, game_ord, tournament)
+                tables['matches'].update(self._match_rows(game, tournament))
+        elif name == 'doping_usage':
+            for ord_, (player_id, game) in enumerate((data or {}).items()):
+                tables['doping_usage'][(int(player_id),)] = (int(player_id), ord_, game)
+        return tables
+
+    def _result_game_row(self, game, game_ord, entries):
+        return (game, game_ord, 'dict' if isinstance(entries, dict) else 'list')
+
+    def _result_row(self, game, ord_, entry, value, is_dict):
+        if is_dict:
+            player_id = _int_or_none(entry)  # {player_id: result}
+        elif isinstance(value, dict):
+            player_id = None  # Legacy [{winner: id, loser: id}, ...]
+        else:
+            player_id = _int_or_none(value)  # Ordering of player ids
+        return (game, str(entry), ord_, player_id, self._dumps(value))
+
+    def _game_result_rows(self, game, entries):
+        is_dict = isinstance(entries, dict)
+        items = entries.items() if is_dict else enumerate(entries)
+        return {(game, str(entry)): self._result_row(game, ord_, entry, value, is_dict)
+                for ord_, (entry, value) in enumerate(items)}
+
+    def _tournament_row(self, game, game_ord, tournament):
+        info = {k: v for k, v in tournament.items() if k != 'rounds'}
+        return (game, game_ord, len(tournament.get('rounds', [])), self._dumps(info))
+
+    def _match_row(self, game, round_idx, ord_, match):
+        return (game, round_idx, ord_, match.get('match_id'), _player_ref(match.get('player1')),
+                _player_ref(match.get('player2')), int(bool(match.get('completed'))), self._dumps(match))
+
+    def _match_rows(self, game, tournament):
+        return {(game, round_idx, ord_): self._match_row(game, round_idx, ord_, match)
+                for round_idx, round_matches in enumerate(tournament.get('rounds', []))
+                for ord_, match in enumerate(round_matches)}
+
+    def _entry_rows(self, name, data, entries):
+        """Rows of the changed entries of a collection: ({table: {key: row, None to delete}}, [(table, game) to clear])
+
+        Entries are player ids (players, doping_usage), a game or (game, player_id) (results)
+        and a game or (game, round, index in round) (tournaments); a game stands for all its rows.
+        """
+        tables = {table: {} for table in TABLES[name]}
+        cleared = []
+        if name == 'players':
+            for ord_, player in enumerate(data):
+                if player['id'] in entries:
+                    tables['players'][(player['id'],)] = (
+                        player['id'], ord_, _int_or_none(player.get('number')), self._dumps(player))
+            for player_id in entries:
+                tables['players'].setdefault((player_id,), None)
+        elif name == 'doping_usage':
+            order = {player_id: ord_ for ord_, player_id in enumerate(data)}
+            for player_id in entries:
+                row = (int(player_id), order[player_id], data[player_id]) if player_id in data else None
+                tables['doping_usage'][(int(player_id),)] = row
+        elif name in ['results', 'tournaments']:
+            parts = {}  # {game: [rest of the entry key, ...], None for the whole game}
+            for entry in entries:
+                game, part = (entry[0], entry[1:]) if isinstance(entry, tuple) else (entry, None)
+                parts.setdefault(game, set()).add(part)
+            game_order = {game: ord_ for ord_, game in enumerate(data)}
+            rows_table = 'results' if name == 'results' else 'matches'
+            for game, game_parts in parts.items():
+                game_data = data.get(game)
+                whole = game_data is None or None in game_parts
+                if whole:
+                    cleared.append((rows_table, game))
+                if name == 'results':
+                    if game_data is None:
+                        tables['result_games'][(game,)] = None
+                        continue
+                    tables['result_games'][(game,)] = self._result_game_row(game, game_order[game], game_data)
+                    if whole or not isinstance(game_data, dict):
+                        cleared.append(('results', game))
+                        tables['results'].update(self._game_result_rows(game, game_data))
+                        continue
+                    order = {entry: ord_ for ord_, entry in enumerate(game_data)}
+                    for (player_id,) in game_parts:
+                        key = (game, str(player_id))
+                        tables['results'][key] = (self._result_row(game, order[player_id], player_id, game_data[player_id], True)
+                                                  if player_id in game_data else None)
+                else:
+                    if game_data is None:
+                        tables['tournaments'][(game,)] = None
+                        continue
+                    tables['tournaments'][(game,)] = self._tournament_row(game, game_order[game], game_data)
+                    if whole:
+                        tables['matches'].update(self._match_rows(game, game_data))
+                        continue
+                    for round_idx, ord_ in game_parts:
+                        tables['matches'][(game, round_idx, ord_)] = self._match_row(
+                            game, round_idx, ord_, game_data['rounds'][round_idx][ord_])
+        return tables, cleared
+
+    def _dump(self, name, data):
+        self._write_all({name: data})
+
+    def write_snapshot(self, collections):
+        """Write the collections ({name: data}) and the checkpoint in one SQLite transaction, then compact the log
+
+        Of collections marked with mark_entries() only the rows of those entries are written.
+        """
+        with self._lock:
+            if not collections and self.seq == self.checkpoint_seq:
+                return
+            if self.seq != self.checkpoint_seq:
+                collections = dict(collections, checkpoint={'seq': self.seq})
+            self._write_all(collections, {name: self._dirty.get(name) for name in collections if name in TABLES})
+            self._signatures['checkpoint'] = self._signature('checkpoint')
+            self._snapshot_written([name for name in collections if name != 'checkpoint'])
+
+    def _write_all(self, collections, entries=None):
+        """Write collections in one transaction: other connections see all of them or none"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for name, data in collections.items():
+                if entries and entries.get(name) is not None:
+                    self._write_entries(conn, name, data, entries[name])
+                else:
+                    self._write_collection(conn, name, data)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            for name in collections:
+                for table in TABLES.get(name, ['documents']):
+                    self._rows.pop(_cache_key(name, table), None)
+            raise
+
+    def _write_collection(self, conn, name, data):
+        tables = self._table_rows(name, data)
+        cache_keys = [_cache_key(name, table) for table in tables]
+        if self._signatures.get(name) != self._signature(name):
+            # Changed by another process since we last saw it, our row cache is useless
+            for cache_key in cache_keys:
+                self._rows.pop(cache_key, None)
+        changed = 0
+        for (table, rows), cache_key in zip(tables.items(), cache_keys):
+            changed += self._sync_table(conn, table, rows, self._rows.get(cache_key))
+            self._rows[cache_key] = rows
+        if changed or self._signatures.get(name) is None:
+            # Other processes only reload collections whose version moved
+            conn.execute('INSERT INTO collections (name, version) VALUES (?, 1) '
+                         'ON CONFLICT (name) DO UPDATE SET version = version + 1', (name,))
+
+    def _write_entries(self, conn, name, data, entries):
+        """Write the rows of the changed entries of a collection and keep the row cache in step"""
+        tables, cleared = self._entry_rows(name, data, entries)
+        if (self._signatures.get(name) is None or self._signatures[name] != self._signature(name)
+                or any(row is None for rows in tables.values() for row in rows.values())):
+            # Never written by us, changed by another process or entries were removed (which
+            # shifts the order of the rest): compare the whole collection instead
+            self._write_collection(conn, name, data)
+            return
+        for table, game in cleared:
+            conn.execute(f'DELETE FROM {table} WHERE game = ?', (game,))
+        for table, rows in tables.items():
+            self._upsert(conn, table, list(rows.values()))
+            cache_key = _cache_key(name, table)
+            cached = self._rows.get(cache_key)
+            if cached is not None:
+                games = {game for cleared_table, game in cleared if cleared_table == table}
+                if games:
+                    cached = {key: row for key, row in cached.items() if key[0] not in games}
+                cached.update(rows)
+                self._rows[cache_key] = cached
+        conn.execute('INSERT INTO collections (name, version) VALUES (?, 1) '
+                     'ON CONFLICT (name) DO UPDATE SET version = version + 1', (name,))
+
+    def _upsert(self, conn, table, rows):
+        columns = COLUMNS[table]
+        conn.executemany(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) '
+                         f'VALUES ({", ".join("?" for _ in columns)})', rows)
+        return len(rows)
+
+    def _sync_table(self, conn, table, rows, previous):
+        """Write the rows that differ from what the table held before, returns the number of changes"""
+        keys = KEYS[table]
+        where = ' AND '.join(f'{column} = ?' for column in keys)
+        removed = []
+        if previous is None:
+            if table != 'documents':
+                conn.execute(f'DELETE FROM {table}')
+            changed = list(rows.values())
+        else:
+            removed = [key for key in previous if key not in rows]
+            conn.executemany(f'DELETE FROM {table} WHERE {where}', removed)
+            changed = [row for key, row in rows.items() if previous.get(key) != row]
+        return len(removed) + self._upsert(conn, table, changed)
+
+    def _append(self, event):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('INSERT INTO events (seq, data) VALUES (?, ?)', (event['seq'], self._dumps(event)))
+        conn.execute('COMMIT')
+
+    def _read_log(self):
+        return [json.loads(row[0]) for row in
+                self._conn().execute('SELECT data FROM events WHERE seq > ? ORDER BY seq', (self.seq,))]
+
+    def events_since(self, seq):
+        """Return the logged events after seq, also those the log was compacted into the archive with"""
+        with self._lock:
+            return [json.loads(data) for _, data in self._conn().execute(
+                'SELECT seq, data FROM events_archive WHERE seq > ? UNION '
+                'SELECT seq, data FROM events WHERE seq > ? ORDER BY seq', (seq, seq))]
+
+    def _compact(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('INSERT OR REPLACE INTO events_archive SELECT seq, data FROM events WHERE seq <= ?',
+                     (self.checkpoint_seq,))
+        conn.execute('DELETE FROM events WHERE seq <= ?', (self.checkpoint_seq,))
+        conn.execute('COMMIT')
+
+    def has_result(self, game, player_id):
+        """Return True if a result is stored for this player in a game"""
+        # The connection is shared by the threads: not in the middle of another thread's write
+        with self._lock:
+            return self._conn().execute('SELECT 1 FROM results WHERE game = ? AND player_id = ? LIMIT 1',
+                                        (game, int(player_id))).fetchone() is not None
+
+    def has_completed_match(self, game, player_id):
+        """Return True if the player took part in a completed tournament match"""
+        with self._lock:
+            return self._conn().execute(
+                'SELECT 1 FROM matches WHERE game = ? AND (player1 = ? OR player2 = ?) AND completed = 1 LIMIT 1',
+                (game, int(player_id), int(player_id))).fetchone() is not None
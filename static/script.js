@@ -8,6 +8,26 @@ let gameTimer = null;
 let countdownTimer = null;
 let previousWinners = {}; // Track previous winners for popup notifications
 let dismissedWinners = new Set(); // Track dismissed winners from backend
+let etagCache = {}; // Last response per URL with its ETag, reused when the server answers 304
+let stateVersion = null; // Version of the results, tournaments and rankings shown, from /changes
+let changesRequest = Promise.resolve();
+let currentRankings = {};
+window.tournaments = {};
+
+// Fetch JSON, sending the ETag of the last response so an unchanged state costs a 304
+async function fetchJSON(url) {
+    const cached = etagCache[url];
+    const response = await fetch(url, cached ? { headers: { 'If-None-Match': cached.etag } } : {});
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        etagCache[url] = { etag: etag, data: data };
+    }
+    return data;
+}
 
 // DOM elements
 const playerNameInput = document.getElementById('playerName');
@@ -37,6 +57,9 @@ document.addEventListener('DOMContentLoaded', async function() {
     await checkExistingScoreAndDisableSubmit();
     await checkTournamentResultsAndDisableRegenerate();
     
+    // Follow changes made on other screens
+    subscribeToUpdates();
+    
     // Event listeners
     registerPlayerBtn.addEventListener('click', registerPlayer);
     submitScoreBtn.addEventListener('click', submitScore);
@@ -51,15 +74,18 @@ document.addEventListener('DOMContentLoaded', async function() {
         regenerateOpponentsBtn.addEventListener('click', regenerateOpponents);
     }
 
-    // Download results button
-    const downloadBtn = document.getElementById('downloadResults');
-    if (downloadBtn) {
+    // Download results buttons: everything as JSON, or one row per player per game as CSV
+    [['downloadResults', '/download_results'], ['downloadResultsCsv', '/download_results?format=csv']].forEach(([buttonId, url]) => {
+        const downloadBtn = document.getElementById(buttonId);
+        if (!downloadBtn) {
+            return;
+        }
         downloadBtn.addEventListener('click', async () => {
             try {
                 showMessage('Data wordt voorbereid voor download...', 'info');
                 // Trigger download by creating a link and clicking it
                 const link = document.createElement('a');
-                link.href = '/download_results';
+                link.href = url;
                 link.download = '';
                 document.body.appendChild(link);
                 link.click();
@@ -70,7 +96,7 @@ document.addEventListener('DOMContentLoaded', async function() {
                 console.error('Download error:', e);
             }
         });
-    }
+    });
 
     // Clear results button
     const clearBtn = document.getElementById('clearResults');
@@ -165,11 +191,58 @@ document.addEventListener('DOMContentLoaded', async function() {
     };
 });
 
+// Loaders to run for each kind of change pushed by /events
+const updateLoaders = {
+    players: [loadPlayers, redrawRankings],
+    result: [loadRankings],
+    ranking: [loadRankings],
+    winner: [loadRankings],
+    doping: [loadDopingUsage],
+    match: [loadOpponents, loadRankings],
+    round: [loadOpponents, loadRankings]
+};
+let pendingLoaders = new Set();
+let refreshTimer = null;
+
+// Subscribe to the server's live updates instead of reloading everything
+function subscribeToUpdates() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource('/events');
+    source.addEventListener('update', event => {
+        const data = JSON.parse(event.data);
+        data.changes.forEach(change => {
+            (updateLoaders[change.type] || []).forEach(loader => pendingLoaders.add(loader));
+        });
+        scheduleRefresh();
+    });
+    // Missed updates (reconnected after a while), reload everything
+    source.addEventListener('resync', () => {
+        Object.values(updateLoaders).forEach(loaders => loaders.forEach(loader => pendingLoaders.add(loader)));
+        scheduleRefresh();
+    });
+}
+
+// Run the pending loaders once, a burst of changes causes a single reload
+function scheduleRefresh() {
+    if (refreshTimer) {
+        return;
+    }
+    refreshTimer = setTimeout(async () => {
+        refreshTimer = null;
+        const loaders = Array.from(pendingLoaders);
+        pendingLoaders.clear();
+        for (const loader of loaders) {
+            await loader();
+        }
+    }, 250);
+}
+
 // Load players from the server
 async function loadPlayers() {
     try {
-        const response = await fetch('/get_players');
-        players = await response.json();
+        players = await fetchJSON('/get_players');
         // Don't call renderDynamicFields here - it will be called after all data is loaded
     } catch (error) {
         console.error('Error loading players:', error);
@@ -180,8 +253,7 @@ async function loadPlayers() {
 // Load scores from the server
 async function loadScores() {
     try {
-        const response = await fetch('/get_scores');
-        scores = await response.json();
+        scores = await fetchJSON('/get_scores');
         console.log('Loaded scores:', scores);
     } catch (error) {
         console.error('Error loading scores:', error);
@@ -192,21 +264,107 @@ async function loadScores() {
 // Load results from the server
 async function loadResults() {
     try {
-        const response = await fetch('/get_results');
-        const resultsData = await response.json();
-        window.gameResults = resultsData;
-        console.log('Loaded results:', resultsData);
+        await loadChanges();
+        console.log('Loaded results:', window.gameResults);
     } catch (error) {
         console.error('Error loading results:', error);
-        window.gameResults = {};
+        window.gameResults = window.gameResults || {};
     }
 }
 
+// Load what changed since the version shown and patch it in, everything the first time
+function loadChanges() {
+    // One request at a time so patches are applied in order
+    changesRequest = changesRequest.catch(() => {}).then(async () => {
+        const url = stateVersion ? `/changes?since=${encodeURIComponent(stateVersion)}` : '/changes';
+        const response = await fetch(url);
+        const changes = await response.json();
+        if (changes.full) {
+            window.gameResults = changes.results;
+            window.tournaments = changes.tournaments;
+            displayRankings(changes.rankings);
+        } else {
+            applyResultChanges(changes.results);
+            applyTournamentChanges(changes.tournaments);
+            applyRankingChanges(changes.rankings);
+        }
+        stateVersion = changes.version;
+    });
+    return changesRequest;
+}
+
+// Patch window.gameResults: {game: {set: {player_id: result}, removed: [player_id]}} or {game: {value: ...}}
+function applyResultChanges(patches) {
+    const results = window.gameResults || (window.gameResults = {});
+    Object.entries(patches).forEach(([game, patch]) => {
+        if ('value' in patch) {
+            if (patch.value === null) {
+                delete results[game];
+            } else {
+                results[game] = patch.value;
+            }
+            return;
+        }
+        const entries = results[game] || (results[game] = {});
+        Object.assign(entries, patch.set);
+        patch.removed.forEach(playerId => delete entries[playerId]);
+    });
+}
+
+// Patch window.tournaments: changed matches by round and position, or the whole tournament
+function applyTournamentChanges(patches) {
+    Object.entries(patches).forEach(([game, patch]) => {
+        if ('replace' in patch) {
+            if (patch.replace === null) {
+                delete window.tournaments[game];
+            } else {
+                window.tournaments[game] = patch.replace;
+            }
+            return;
+        }
+        const rounds = window.tournaments[game].rounds;
+        window.tournaments[game] = Object.assign(patch.info, { rounds: rounds });
+        patch.matches.forEach(([round, index, match]) => {
+            while (rounds.length <= round) {
+                rounds.push([]);
+            }
+            rounds[round][index] = match;
+        });
+    });
+}
+
+// Replace the ranking rows that moved, add new ones at the end and drop the ones past the length
+function applyRankingChanges(patches) {
+    Object.entries(patches).forEach(([jersey, patch]) => {
+        const ranking = currentRankings[jersey] || (currentRankings[jersey] = []);
+        const list = document.getElementById(rankingLists[jersey].id);
+        if (ranking.length === 0) {
+            list.innerHTML = '';
+        }
+        patch.rows.forEach(([position, player]) => {
+            ranking[position - 1] = player;
+            const item = createRankingItem(jersey, player, position - 1);
+            const existing = list.children[position - 1];
+            if (existing) {
+                list.replaceChild(item, existing);
+            } else {
+                list.appendChild(item);
+            }
+        });
+        ranking.length = patch.length;
+        while (list.children.length > patch.length) {
+            list.removeChild(list.lastChild);
+        }
+        if (patch.length === 0) {
+            list.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
+        }
+    });
+}
+
 // Load opponents from the server
 async function loadOpponents() {
     try {
-        const response = await fetch('/get_opponents');
-        opponents = await response.json();
+        opponents = await fetchJSON('/get_opponents');
         displayOpponents();
         // Check tournament results and update regenerate button state
         await checkTournamentResultsAndDisableRegenerate();
@@ -219,17 +377,12 @@ async function loadOpponents() {
 // Load rankings from the server
 async function loadRankings() {
     try {
-        const response = await fetch('/get_rankings');
-        const rankings = await response.json();
-        
-        // Reload scores and results to ensure we have the latest data for popup checking
+        // Reload scores, and patch results and rankings, to ensure we have the latest data for popup checking
         await loadScores();
-        await loadResults();
+        await loadChanges();
         
         // Check for new winners and show popups
-        checkForNewWinners(rankings);
-        
-        displayRankings(rankings);
+        checkForNewWinners(currentRankings);
     } catch (error) {
         console.error('Error loading rankings:', error);
         showMessage('Fout bij het laden van klassementen', 'error');
@@ -243,8 +396,7 @@ let dopingUsage = {};
 async function checkForNewWinners(rankings) {
     try {
         // Get winners from backend (which handles dismissed winners)
-        const response = await fetch('/check_winners');
-        const winners = await response.json();
+        const winners = await fetchJSON('/check_winners');
         
         // Show popups for any winners returned by backend
         Object.keys(winners).forEach(jerseyKey => {
@@ -322,11 +474,23 @@ function checkAllScoresEntered(games) {
     return true;
 }
 
+// URL of a player's picture resized by the server: 'avatar' (rankings), 'card' or 'popup' (popups)
+// registered_at versions the URL, so the browser can cache it for good
+function resizedPictureUrl(player, size) {
+    return `/player_picture/${player.picture}?size=${size}&v=${encodeURIComponent(player.registered_at || '')}`;
+}
+
+// Check if a player's picture can be shown, a new upload is resized in the background first
+function hasPicture(player) {
+    return Boolean(player && player.picture && player.picture_status !== 'processing');
+}
+
 // Show winner popup
 function showWinnerPopup(playerName, jerseyName, points, playerId, jerseyKey) {
     // Get player picture
     const player = players.find(p => p.id === playerId);
-    const playerPictureUrl = player && player.picture ? `/player_picture/${player.picture}` : '/static/player_pictures/player_1.png';
+    const playerPictureUrl = hasPicture(player) ? resizedPictureUrl(player, 'card') : '/static/player_pictures/player_1.png';
+    const playerPictureSrcset = hasPicture(player) ? `${playerPictureUrl} 1x, ${resizedPictureUrl(player, 'popup')} 2x` : '';
     
     // Get jersey image based on jersey name
     let jerseyImageUrl = '/static/witte trui.png'; // default
@@ -358,7 +522,7 @@ function showWinnerPopup(playerName, jerseyName, points, playerId, jerseyKey) {
                         
                         <div class="winner-section">
                             <div class="winner-picture-container">
-                                <img src="${playerPictureUrl}" alt="${playerName}" class="winner-picture">
+                                <img src="${playerPictureUrl}" srcset="${playerPictureSrcset}" alt="${playerName}" class="winner-picture">
                             </div>
                             <div class="winner-details">
                                 <h3 class="winner-name">${playerName}</h3>
@@ -454,7 +618,13 @@ function showWinnerPopup(playerName, jerseyName, points, playerId, jerseyKey) {
 
 // Show player registration popup
 function showPlayerRegistrationPopup(player) {
-    const playerPictureUrl = player && player.picture ? `/player_picture/${player.picture}` : '/static/player_pictures/player_1.png';
+    let playerPictureUrl = player && player.picture ? resizedPictureUrl(player, 'card') : '/static/player_pictures/player_1.png';
+    let playerPictureSrcset = player && player.picture ? `${playerPictureUrl} 1x, ${resizedPictureUrl(player, 'popup')} 2x` : '';
+    if (player && player.picture_status === 'processing') {
+        // Just uploaded from this screen: show the original until the resized copies are ready
+        playerPictureUrl = `/player_picture/${player.picture}`;
+        playerPictureSrcset = '';
+    }
     const popupId = `playerRegistration_${Date.now()}`;
     
     // Create popup HTML
@@ -470,7 +640,7 @@ function showPlayerRegistrationPopup(player) {
                     <div class="winner-body">
                         <div class="winner-section">
                             <div class="winner-picture-container">
-                                <img src="${playerPictureUrl}" alt="${player.name}" class="winner-picture">
+                                <img src="${playerPictureUrl}" srcset="${playerPictureSrcset}" alt="${player.name}" class="winner-picture">
                             </div>
                             <div class="winner-details">
                                 <h3 class="winner-name">${player.name}</h3>
@@ -653,8 +823,7 @@ function showBrainGamePopup(game, correctAnswers, time) {
 
 async function loadDopingUsage() {
     try {
-        const response = await fetch('/get_doping_usage');
-        dopingUsage = await response.json();
+        dopingUsage = await fetchJSON('/get_doping_usage');
         console.log('Loaded doping usage data:', dopingUsage);
     } catch (error) {
         console.error('Error loading doping usage:', error);
@@ -1436,10 +1605,12 @@ async function displayTournamentMatches(game) {
                 const matchCard = document.createElement('div');
                 matchCard.className = 'tournament-match';
                 
-                const p1 = players.find(p => p.id === match.player1.id);
+                // Matches of later rounds are known up front, their players once the earlier matches are played
+                const waiting = Number(round) > currentRound;
+                const p1 = match.player1 ? players.find(p => p.id === match.player1.id) : null;
                 const p2 = match.player2 ? players.find(p => p.id === match.player2.id) : null;
-                const p1Name = p1 ? `${p1.name} (#${p1.number})` : 'Onbekend';
-                const p2Name = p2 ? `${p2.name} (#${p2.number})` : (match.player2 ? 'Onbekend' : 'BYE');
+                const p1Name = p1 ? `${p1.name} (#${p1.number})` : (match.player1 || !waiting ? 'Onbekend' : 'Nog te bepalen');
+                const p2Name = p2 ? `${p2.name} (#${p2.number})` : (match.player2 ? 'Onbekend' : (waiting ? 'Nog te bepalen' : 'BYE'));
                 
                 let status = '';
                 if (match.completed) {
@@ -1475,103 +1646,50 @@ async function displayTournamentMatches(game) {
     }
 }
 
+// Ranking list and fallback picture per jersey
+const rankingLists = {
+    gele_trui: { id: 'geleTruiRanking', picture: '/static/witte%20trui.png' },  // Overall
+    groene_trui: { id: 'groeneTruiRanking', picture: '/static/groene%20trui.png' },  // Speed Games
+    bolletjes_trui: { id: 'bolletjesTruiRanking', picture: '/static/bolletjes%20trui.png' },  // Ball Games
+    witte_trui: { id: 'witteTruiRanking', picture: '/static/witte%20trui.png' }  // Brain Games
+};
+
+// Create the row of a player ([id, {name, number, points}]) in a ranking
+function createRankingItem(jersey, player, index) {
+    const rankingItem = document.createElement('div');
+    rankingItem.className = 'ranking-item';
+    const playerObj = players.find(p => p.id === player[0]);
+    const pictureUrl = hasPicture(playerObj) ? resizedPictureUrl(playerObj, 'avatar') : rankingLists[jersey].picture;
+    rankingItem.innerHTML = `
+        <span class="ranking-position">${index + 1}</span>
+        <div class="ranking-player-info">
+            <img src="${pictureUrl}" alt="${player[1].name}" class="ranking-player-picture">
+            <span class="ranking-name">${player[1].name} (#${player[1].number})</span>
+        </div>
+        <span class="ranking-points">${player[1].points} pts</span>
+    `;
+    return rankingItem;
+}
+
+// Redraw the rankings with the players' current pictures
+function redrawRankings() {
+    displayRankings(currentRankings);
+}
+
 // Display rankings
 function displayRankings(rankings) {
-    // Gele Trui (Overall)
-    const geleTruiRanking = document.getElementById('geleTruiRanking');
-    geleTruiRanking.innerHTML = '';
-    
-    if (rankings.gele_trui && rankings.gele_trui.length > 0) {
-        rankings.gele_trui.forEach((player, index) => {
-            const rankingItem = document.createElement('div');
-            rankingItem.className = 'ranking-item';
-            const playerObj = players.find(p => p.id === player[0]);
-            const pictureUrl = playerObj && playerObj.picture ? `/player_picture/${playerObj.picture}` : '/static/witte%20trui.png';
-            rankingItem.innerHTML = `
-                <span class="ranking-position">${index + 1}</span>
-                <div class="ranking-player-info">
-                    <img src="${pictureUrl}" alt="${player[1].name}" class="ranking-player-picture">
-                    <span class="ranking-name">${player[1].name} (#${player[1].number})</span>
-                </div>
-                <span class="ranking-points">${player[1].points} pts</span>
-            `;
-            geleTruiRanking.appendChild(rankingItem);
-        });
-    } else {
-        geleTruiRanking.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
-    }
-    
-    // Groene Trui (Speed Games)
-    const groeneTruiRanking = document.getElementById('groeneTruiRanking');
-    groeneTruiRanking.innerHTML = '';
-    
-    if (rankings.groene_trui && rankings.groene_trui.length > 0) {
-        rankings.groene_trui.forEach((player, index) => {
-            const rankingItem = document.createElement('div');
-            rankingItem.className = 'ranking-item';
-            const playerObj = players.find(p => p.id === player[0]);
-            const pictureUrl = playerObj && playerObj.picture ? `/player_picture/${playerObj.picture}` : '/static/groene%20trui.png';
-            rankingItem.innerHTML = `
-                <span class="ranking-position">${index + 1}</span>
-                <div class="ranking-player-info">
-                    <img src="${pictureUrl}" alt="${player[1].name}" class="ranking-player-picture">
-                    <span class="ranking-name">${player[1].name} (#${player[1].number})</span>
-                </div>
-                <span class="ranking-points">${player[1].points} pts</span>
-            `;
-            groeneTruiRanking.appendChild(rankingItem);
-        });
-    } else {
-        groeneTruiRanking.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
-    }
-    
-    // Bolletjestrui (Ball Games)
-    const bolletjesTruiRanking = document.getElementById('bolletjesTruiRanking');
-    bolletjesTruiRanking.innerHTML = '';
-    
-    if (rankings.bolletjes_trui && rankings.bolletjes_trui.length > 0) {
-        rankings.bolletjes_trui.forEach((player, index) => {
-            const rankingItem = document.createElement('div');
-            rankingItem.className = 'ranking-item';
-            const playerObj = players.find(p => p.id === player[0]);
-            const pictureUrl = playerObj && playerObj.picture ? `/player_picture/${playerObj.picture}` : '/static/bolletjes%20trui.png';
-            rankingItem.innerHTML = `
-                <span class="ranking-position">${index + 1}</span>
-                <div class="ranking-player-info">
-                    <img src="${pictureUrl}" alt="${player[1].name}" class="ranking-player-picture">
-                    <span class="ranking-name">${player[1].name} (#${player[1].number})</span>
-                </div>
-                <span class="ranking-points">${player[1].points} pts</span>
-            `;
-            bolletjesTruiRanking.appendChild(rankingItem);
-        });
-    } else {
-        bolletjesTruiRanking.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
-    }
-    
-    // Witte Trui (Brain Games)
-    const witteTruiRanking = document.getElementById('witteTruiRanking');
-    witteTruiRanking.innerHTML = '';
-    
-    if (rankings.witte_trui && rankings.witte_trui.length > 0) {
-        rankings.witte_trui.forEach((player, index) => {
-            const rankingItem = document.createElement('div');
-            rankingItem.className = 'ranking-item';
-            const playerObj = players.find(p => p.id === player[0]);
-            const pictureUrl = playerObj && playerObj.picture ? `/player_picture/${playerObj.picture}` : '/static/witte%20trui.png';
-            rankingItem.innerHTML = `
-                <span class="ranking-position">${index + 1}</span>
-                <div class="ranking-player-info">
-                    <img src="${pictureUrl}" alt="${player[1].name}" class="ranking-player-picture">
-                    <span class="ranking-name">${player[1].name} (#${player[1].number})</span>
-                </div>
-                <span class="ranking-points">${player[1].points} pts</span>
-            `;
-            witteTruiRanking.appendChild(rankingItem);
-        });
-    } else {
-        witteTruiRanking.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
-    }
+    Object.entries(rankingLists).forEach(([jersey, rankingList]) => {
+        const list = document.getElementById(rankingList.id);
+        list.innerHTML = '';
+        const ranking = rankings[jersey] || [];
+        currentRankings[jersey] = ranking.slice();
+        
+        if (ranking.length > 0) {
+            ranking.forEach((player, index) => list.appendChild(createRankingItem(jersey, player, index)));
+        } else {
+            list.innerHTML = '<p class="loading">Nog geen scores ingevoerd</p>';
+        }
+    });
 }
 
 
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Only gzip variants are written
+    brotli = None
+
+
+# Text files that are worth compressing; images are already compressed
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.html', '.svg', '.json', '.txt'}
+MIN_COMPRESS_SIZE = 1024
+# Variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+class StaticAssets:
+    """Content hashes and precompressed variants of the files in the static folder.
+
+    The hash of a file is kept with the file's (mtime_ns, size), so a changed file
+    gets a new hash without restarting the app.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}  # {filename: ((mtime_ns, size), hash)}
+        self._lock = threading.Lock()
+
+    def _signature(self, path):
+        if path is None:
+            return None  # Outside the static folder
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def fingerprint(self, filename):
+        """Return a short hash of a static file's content, None if it does not exist"""
+        path = safe_join(self.folder, filename)
+        signature = self._signature(path)
+        if signature is None:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+            if cached and cached[0] == signature:
+                return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        fingerprint = digest.hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (signature, fingerprint)
+        return fingerprint
+
+    def compressed(self, filename, accept_encodings):
+        """Return (variant filename, encoding) of the best precompressed variant the client accepts, or None"""
+        source = self._signature(safe_join(self.folder, filename))
+        if source is None:
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accept_encodings:
+                continue
+            variant = self._signature(safe_join(self.folder, filename + suffix))
+            # An outdated variant is never served
+            if variant and variant[0] >= source[0]:
+                return filename + suffix, encoding
+        return None
+
+    def precompress(self):
+        """Write gzip (and brotli) variants of the text files that changed, returns the number written"""
+        count = 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                    continue
+                for encoding, suffix in ENCODINGS:
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    variant = self._signature(path + suffix)
+                    if variant and variant[0] >= self._signature(path)[0]:
+                        continue
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    if encoding == 'br':
+                        data = brotli.compress(data, quality=11)
+                    else:
+                        data = gzip.compress(data, compresslevel=9, mtime=0)
+                    _write(path + suffix, data)
+                    count += 1
+        return count
+
+
+def _write(path, data):
+    # Several workers can start at the same time, write to a temp file and rename
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,391 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are synchronized
+    fcntl = None
+
+
+class DataStore:
+    """Keeps track of the JSON data files so they are only re-read when they change on disk.
+
+    Small changes are appended to an event log (events.log, one JSON line per event)
+    instead of rewriting the JSON files. The JSON files are a snapshot that includes
+    every event up to the sequence number stored in checkpoint.json; loading replays
+    the events after it. A snapshot replaces its files and the checkpoint as one change,
+    see write_snapshot().
+
+    Several processes (gunicorn workers) can share a data directory: changes are made
+    under an exclusive lock on the .lock file and loading happens under a shared lock,
+    so every worker sees complete changes and picks up other workers' events by
+    reading the end of the log.
+    """
+
+    def __init__(self, data_dir='data', snapshot_every=50, json_default=None):
+        self.data_dir = data_dir
+        # default= for json.dump, for objects in the collections and events that are not plain JSON
+        self.json_default = json_default
+        # Number of logged events after which the JSON files are rewritten
+        self.snapshot_every = snapshot_every
+        self.log_path = os.path.join(data_dir, 'events.log')
+        # Events that were compacted out of the log are kept here as an audit trail
+        self.archive_path = os.path.join(data_dir, 'events_archive.log')
+        # Bumped whenever the in-memory state changes (reload or save)
+        self.version = 0
+        self.seq = 0  # Last event applied to the in-memory state
+        self.checkpoint_seq = 0  # Last event included in the JSON files
+        self._signatures = {}  # {name: (mtime_ns, size) or None}
+        self._dirty = {}  # Collections changed in memory but not yet written: {name: changed entries, None for all}
+        self._log_offset = 0  # Bytes of the event log already applied
+        self._reload_all = True
+        self._lock = threading.RLock()
+        self._lock_depth = 0  # Nesting of transaction() in the thread holding self._lock
+        self._lock_owner = None  # Thread ident inside transaction()
+        self._lock_file = None
+        self._lock_pid = None
+
+    def _lock_fd(self):
+        # Each (forked) process needs its own open file for flock to lock between them
+        if self._lock_file is None or self._lock_pid != os.getpid():
+            os.makedirs(self.data_dir, exist_ok=True)
+            self._lock_file = open(os.path.join(self.data_dir, '.lock'), 'a+b')
+            self._lock_pid = os.getpid()
+        return self._lock_file.fileno()
+
+    @contextmanager
+    def transaction(self):
+        """Exclusive lock, across threads and worker processes, held while changing state"""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl:
+                fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            self._lock_owner = threading.get_ident()
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._lock_owner = None
+                    if fcntl:
+                        fcntl.flock(self._lock_fd(), fcntl.LOCK_UN)
+
+    def in_transaction(self):
+        """Check if the calling thread is inside transaction()"""
+        return self._lock_owner == threading.get_ident()
+
+    @contextmanager
+    def _shared(self):
+        """Shared lock so other processes cannot change the data while it is being read"""
+        with self._lock:
+            # A thread inside transaction() already holds the exclusive lock
+            if self._lock_depth or not fcntl:
+                yield
+                return
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd(), fcntl.LOCK_UN)
+
+    def path(self, name):
+        """Return the path of the JSON file for a collection"""
+        return os.path.join(self.data_dir, f'{name}.json')
+
+    def _signature(self, name):
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def stale(self, names):
+        """Return the collections whose file changed since it was last read or written"""
+        with self._lock:
+            return [name for name in names
+                    if name not in self._signatures or self._signatures[name] != self._signature(name)]
+
+    def changes(self, names):
+        """Return {name: data} of collections that changed and the logged events to replay since the last load"""
+        with self._shared():
+            if self.stale(['checkpoint']):
+                checkpoint = self.read('checkpoint') or {}
+                if checkpoint.get('staged'):
+                    # The writer of this snapshot may have stopped before all its files were in place
+                    self._install(checkpoint['staged'])
+                self.checkpoint_seq = checkpoint.get('seq', 0)
+                # The log was compacted, what is left starts after the checkpoint
+                self._log_offset = 0
+                if self.checkpoint_seq > self.seq:
+                    # Events we never saw were compacted into the snapshot
+                    self._reload_all = True
+            if self._reload_all:
+                self._reload_all = False
+                self._signatures = {'checkpoint': self._signatures.get('checkpoint')}
+                self._log_offset = 0
+                self.seq = self.checkpoint_seq
+            return {name: self.read(name) for name in self.stale(names)}, self.read_events()
+
+    @contextmanager
+    def loading(self):
+        """Held from reading the changes until they are applied to the in-memory state.
+
+        changes() moves seq past the events it returns; other threads of this process
+        (a writer in transaction() included) wait until those events are applied, so
+        none of them sees seq ahead of the state it belongs to.
+        """
+        with self._lock:
+            yield
+
+    def state_tag(self):
+        """Return a tag of the loaded state, the same in every worker that loaded the same data"""
+        with self._lock:
+            # Files (or SQLite collections) as they were last read or written, plus the logged events
+            signatures = repr(sorted(self._signatures.items()))
+            return f'{self.seq}-{zlib.crc32(signatures.encode()):08x}'
+
+    def read(self, name):
+        """Read a collection from disk, returns None if the file does not exist"""
+        with self._lock:
+            signature = self._signature(name)
+            data = None
+            if signature is not None:
+                data = self._load(name)
+                # Check again after reading so a concurrent write is picked up next time
+                signature = self._signature(name)
+            self._signatures[name] = signature
+            self.version += 1
+            return data
+
+    def _load(self, name):
+        with open(self.path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def read_status(self, name):
+        """Read a document written with write_status(), None if there is none"""
+        with self._lock:
+            return self._load(name) if self._signature(name) is not None else None
+
+    def write_status(self, name, data):
+        """Write a document that is not part of the state (job progress), the state tag stays the same"""
+        with self._lock:
+            self._dump(name, data)
+
+    def write(self, name, data):
+        """Atomically replace a collection on disk and remember its new signature"""
+        with self._lock:
+            self._dump(name, data)
+            self._signatures[name] = self._signature(name)
+            self._dirty.pop(name, None)
+            self.version += 1
+
+    def _dump(self, name, data):
+        # Write to a temp file in the same directory, then rename over the old file
+        os.replace(os.path.join(self.data_dir, self._stage(name, data)), self.path(name))
+        self._fsync_dir()
+
+    def _stage(self, name, data):
+        """Write a collection to a new file next to its JSON file, returns the new file's name"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        # Never the name of a file an earlier checkpoint still lists
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}.{time.time_ns()}.', suffix='.tmp', dir=self.data_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'), default=self.json_default)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return os.path.basename(tmp_path)
+
+    def _install(self, staged):
+        """Move the staged files ({name: file name}) of a committed snapshot over the JSON files"""
+        for name, filename in staged.items():
+            try:
+                os.replace(os.path.join(self.data_dir, filename), self.path(name))
+            except FileNotFoundError:
+                pass  # Moved before
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        """Make the rename durable (not supported on Windows)"""
+        if os.name != 'posix':
+            return
+        fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def mark_dirty(self, *names):
+        """Remember that collections were changed in memory"""
+        with self._lock:
+            self._dirty.update(dict.fromkeys(names))
+
+    def mark_entries(self, name, entries):
+        """Remember that only these entries of a collection changed (stores that write single rows use them)"""
+        with self._lock:
+            if name not in self._dirty:
+                self._dirty[name] = set(entries)
+            elif self._dirty[name] is not None:
+                self._dirty[name].update(entries)
+
+    def dirty(self):
+        """Return the collections that still need to be written"""
+        with self._lock:
+            return sorted(self._dirty)
+
+    def invalidate(self):
+        """Forget everything in memory so the next load re-reads the snapshot and replays the log"""
+        with self._lock:
+            self._signatures.clear()
+            self._dirty.clear()
+            self._reload_all = True
+
+    def pending_events(self):
+        """Return the number of logged events not yet included in the JSON files"""
+        return self.seq - self.checkpoint_seq
+
+    def append_event(self, event):
+        """Append an event to the log and fsync it, returns the event with its sequence number"""
+        with self._lock:
+            event = dict(event, seq=self.seq + 1, ts=datetime.now().isoformat())
+            self._append(event)
+            self.seq = event['seq']
+            self.version += 1
+            return event
+
+    def _append(self, event):
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'), default=self.json_default) + '\n'
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(self.log_path, 'ab') as f:
+            if f.tell() > self._log_offset:
+                # Terminate a line torn by a crash so it cannot corrupt this one
+                f.write(b'\n')
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+
+    def read_events(self):
+        """Return the events appended to the log since it was last read"""
+        with self._lock:
+            events = [event for event in self._read_log() if event['seq'] > self.seq]
+            if events:
+                self.seq = events[-1]['seq']
+                self.version += 1
+            return events
+
+    def events_since(self, seq):
+        """Return the logged events after seq, also those the log was compacted into the archive with"""
+        with self._shared():
+            events = {}
+            # The archive is read backwards from its end, far enough to reach seq
+            for event in self._archived_events(seq) + self._parse_events(self._read_file(self.log_path)):
+                if event['seq'] > seq:
+                    events[event['seq']] = event
+            return [events[number] for number in sorted(events)]
+
+    def _read_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def _parse_events(self, data):
+        events = []
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                continue  # Still being written, or torn by a crash
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+        return events
+
+    def _archived_events(self, seq, chunk_size=64 * 1024):
+        try:
+            f = open(self.archive_path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            position = f.seek(0, os.SEEK_END)
+            data = b''
+            while position > 0:
+                read = min(chunk_size, position)
+                position -= read
+                f.seek(position)
+                data = f.read(read) + data
+                # The first line may be cut off, unless the start of the file was reached
+                lines = self._parse_events(data if position == 0 else data.split(b'\n', 1)[-1])
+                if lines and lines[0]['seq'] <= seq + 1:
+                    return lines
+            return self._parse_events(data)
+
+    def _read_log(self):
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        events = []
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break  # Still being written, or torn by a crash
+            self._log_offset += len(line)
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+        return events
+
+    def write_snapshot(self, collections):
+        """Write the collections ({name: data}) and record that they include every logged event, then compact the log.
+
+        The files are first written next to the JSON files; the checkpoint that names them
+        is the commit point. A crash before it leaves the previous snapshot and the whole
+        log, a crash after it is finished by the next load (see changes()), so the files
+        never mix two snapshots.
+        """
+        with self._lock:
+            if not collections and self.seq == self.checkpoint_seq:
+                return
+            staged = {name: self._stage(name, data) for name, data in collections.items()}
+            self._fsync_dir()
+            self.write('checkpoint', {'seq': self.seq, 'staged': staged})
+            self._install(staged)
+            self._snapshot_written(collections)
+
+    def _snapshot_written(self, collections):
+        """Remember the signatures of a snapshot's collections and compact the log it includes"""
+        for name in collections:
+            self._signatures[name] = self._signature(name)
+            self._dirty.pop(name, None)
+        self.version += 1
+        if self.seq != self.checkpoint_seq:
+            self.checkpoint_seq = self.seq
+            self._compact()
+
+    def _compact(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        with open(self.archive_path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Everything in the log is part of the snapshot now
+        with open(self.log_path, 'wb') as f:
+            os.fsync(f.fileno())
+        self._log_offset = 0
@@ -0,0 +1,154 @@
+"""The incrementally maintained positions and rankings against a full sort of the raw results.
+
+Random submissions (seeded, so a failure can be replayed) go through the API; after every
+step the sorted results, the positions per game and the four jersey rankings must equal
+what a from-scratch computation of the same data gives.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['ROCKBRAKEL_DATA_DIR'] = tempfile.mkdtemp()
+os.environ['ROCKBRAKEL_SNAPSHOT_EVERY'] = '7'
+
+import app as A
+from scoring import AnswerKey
+
+
+def reference_sorted_results(game):
+    """Sort a touwspringen or brain game from scratch: (sort key, player id) by score, submission order on ties"""
+    key = A.answer_keys.get(game, [])
+    entries = []
+    for order, (player_id, data) in enumerate(A.results[game].items()):
+        if game == 'touwspringen':
+            entries.append(((-data, order), player_id))
+            continue
+        answers = data['answers']
+        correct = AnswerKey(game, key).score(answers) if len(key) == 10 and len(answers) == 10 else 0
+        entries.append(((-correct, data['time_seconds_total'], order), player_id))
+    return sorted(entries)
+
+
+def reference_positions():
+    """Positions (1..N) per game computed from the raw results"""
+    positions = {}
+    for game in ['touwspringen', 'rebus', 'wiskunde']:
+        if A.results[game]:
+            positions[game] = {int(player_id): idx + 1 for idx, (_, player_id) in enumerate(reference_sorted_results(game))}
+    if A.results['stoelendans']:
+        positions['stoelendans'] = {int(player_id): idx + 1 for idx, player_id in enumerate(A.results['stoelendans'])}
+    for game in ['petanque', 'kubb']:
+        standings = A.tournaments.get(game, {}).get('final_standings')
+        if standings:
+            positions[game] = {s['player_id']: s['position'] for s in standings}
+    return positions
+
+
+def reference_rankings():
+    """The four jersey rankings summed player by player"""
+    positions = reference_positions()
+
+    def points(player_id, game):
+        position = positions.get(game, {}).get(player_id)
+        if position is None:
+            return 0
+        if game in ['petanque', 'kubb']:
+            value = next(s['points'] for s in A.tournaments[game]['final_standings'] if s['player_id'] == player_id)
+        else:
+            value = A.SCORING_POINTS[position - 1] if position <= len(A.SCORING_POINTS) else 0
+        return value * 2 if A.doping_usage.get(player_id) == game else value
+
+    def ranking(games, tiebreak_game=None):
+        rows = [(player['id'], {'name': player['name'], 'number': player['number'],
+                                'points': sum(points(player['id'], game) for game in games)})
+                for player in A.players]
+        tiebreak = positions.get(tiebreak_game, {})
+        # sorted() is stable: ties keep the order of the player list
+        return sorted(rows, key=lambda row: (-row[1]['points'], tiebreak.get(row[0], float('inf'))))
+
+    return {
+        'gele_trui': ranking(A.GAMES),
+        'groene_trui': ranking(A.GAME_CATEGORIES['speed_games']),
+        'bolletjes_trui': ranking(A.GAME_CATEGORIES['ball_games'], 'petanque'),
+        'witte_trui': ranking(A.GAME_CATEGORIES['brain_games']),
+    }
+
+
+def random_step(client, rng, step):
+    """Submit one random change: a result, an overwrite, an answer key, a tournament match or a new player"""
+    ids = [player['id'] for player in A.players]
+    player_id = rng.choice(ids)
+    doping = rng.random() < 0.1
+    op = rng.random()
+    if op < 0.35:
+        client.post('/submit_game_results', json={'game': 'touwspringen', 'player_id': player_id,
+                                                  'jumps': rng.randint(0, 6), 'overwrite': True, 'doping': doping})
+    elif op < 0.7:
+        game = rng.choice(['rebus', 'wiskunde'])
+        key = A.answer_keys.get(game) or ['x'] * 10
+        answers = [answer if rng.random() < 0.6 else 'nee' for answer in key]
+        if rng.random() < 0.1:
+            answers = answers[:5]
+        client.post('/submit_game_results', json={'game': game, 'player_id': player_id, 'answers': answers,
+                                                  'time': rng.randint(1, 4), 'overwrite': True, 'doping': doping})
+    elif op < 0.75:
+        client.post('/submit_game_results', json={'game': 'stoelendans', 'overwrite': True,
+                                                  'ordering': rng.sample(ids, rng.randint(0, len(ids)))})
+    elif op < 0.8:
+        game = rng.choice(['rebus', 'wiskunde'])
+        client.post('/admin/set_answer_key', json={'game': game,
+                                                   'answers': [rng.choice(['x', 'nee', '1,2']) for _ in range(10)]})
+        while client.get(f'/admin/rescore_status?game={game}').get_json()['job']['status'] == 'running':
+            time.sleep(0.005)
+    elif op < 0.83:
+        client.post('/generate_tournament/' + rng.choice(['petanque', 'kubb']))
+    elif op < 0.95:
+        game = rng.choice(['petanque', 'kubb'])
+        tournament = A.tournaments.get(game) or {}
+        if tournament.get('rounds'):
+            matches = [m for m in tournament['rounds'][tournament['current_round']] if m['player2'] is not None]
+            if matches:
+                match = rng.choice(matches)
+                winner, loser = rng.sample([match['player1']['id'], match['player2']['id']], 2)
+                client.post('/submit_tournament_match', json={'game': game, 'match_id': match['match_id'],
+                                                              'winner_id': winner, 'loser_id': loser, 'doping1': doping})
+    else:
+        client.post('/register_player', json={'name': f'Nieuw {step}', 'number': 5000 + step})
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_incremental_rankings_match_full_sort(seed):
+    """Every step of a random event stream gives the rankings of a full recomputation"""
+    rng = random.Random(seed)
+    client = A.app.test_client()
+    client.post('/admin/clear_results')
+    for i in range(rng.randint(2, 25)):
+        client.post('/register_player', json={'name': f'Speler {seed}-{i}', 'number': seed * 1000 + i + 1})
+    for step in range(60):
+        random_step(client, rng, step)
+        for game in ['touwspringen', 'rebus', 'wiskunde']:
+            assert A._get_sorted_results(game) == reference_sorted_results(game), (seed, step, game)
+        assert A._compute_positions_from_results() == reference_positions(), (seed, step)
+        assert A.get_all_rankings() == reference_rankings(), (seed, step)
+
+
+def test_update_sorted_result_matches_full_sort():
+    """Moving single results into the sorted entries gives the same order as sorting the whole game"""
+    rng = random.Random(42)
+    A.results['touwspringen'] = {}
+    A._rankings_changed('touwspringen')
+    A._get_sorted_results('touwspringen')
+    for _ in range(500):
+        version = A._ranking_versions['touwspringen']
+        player_id = rng.randint(1, 80)
+        A.results['touwspringen'][player_id] = rng.randint(0, 30)
+        A._rankings_changed('touwspringen')
+        A._update_sorted_result('touwspringen', player_id, version)
+        # Still current: the update was applied instead of dropping the cache
+        assert A._sorted_results['touwspringen'][0] == A._ranking_versions['touwspringen']
+        assert A._get_sorted_results('touwspringen') == reference_sorted_results('touwspringen')
@@ -0,0 +1,69 @@
+class TournamentIndex:
+    """Lookups into a knock-out tournament ({'rounds': [[match, ...], ...], ...}) without scanning every round.
+
+    The index is not stored, it is built from the tournament when that is loaded or
+    generated and kept up to date by the code that adds rounds and completes matches.
+    """
+
+    def __init__(self, tournament):
+        self.tournament = tournament
+        self.matches = {}  # {match_id: (round index, match)}
+        self.positions = {}  # {match_id: index of the match in its round}
+        self.player_matches = {}  # {player_id: [match, ...]}
+        self.open_matches = []  # Per round: number of matches that are not completed
+        self.played = 0  # Completed matches between two players (byes excluded)
+        for round_matches in tournament['rounds']:
+            self.add_round(round_matches)
+
+    def current(self, tournament):
+        """Check that the index was built from this tournament and has all its rounds"""
+        return self.tournament is tournament and len(self.open_matches) == len(tournament['rounds'])
+
+    def add_round(self, round_matches):
+        """Index a round that was appended to the tournament"""
+        round_idx = len(self.open_matches)
+        self.open_matches.append(0)
+        for position, match in enumerate(round_matches):
+            self.matches.setdefault(match['match_id'], (round_idx, match))
+            self.positions.setdefault(match['match_id'], position)
+            for player in (match['player1'], match['player2']):
+                if player:
+                    self.player_matches.setdefault(player['id'], []).append(match)
+            if not match['completed']:
+                self.open_matches[round_idx] += 1
+            elif match['player2'] is not None:
+                self.played += 1
+
+    def find(self, match_id):
+        """Return (round index, match) of a match id, or (None, None)"""
+        return self.matches.get(match_id, (None, None))
+
+    def position(self, match_id):
+        """Return the index of a match in its round"""
+        return self.positions[match_id]
+
+    def place(self, match, slot, player_id):
+        """Put a player in a slot ('player1' or 'player2') of a match that is not played yet, replacing whoever was there"""
+        previous = match[slot]
+        if previous:
+            self.player_matches[previous['id']] = [m for m in self.player_matches[previous['id']] if m is not match]
+        match[slot] = {'id': player_id}
+        self.player_matches.setdefault(player_id, []).append(match)
+
+    def complete(self, round_idx, match):
+        """Count a match that is about to be marked completed for the first time"""
+        self.open_matches[round_idx] -= 1
+        if match['player2'] is not None:
+            self.played += 1
+
+    def round_complete(self, round_idx):
+        """Check if every match of a round is completed"""
+        return self.open_matches[round_idx] == 0
+
+    def has_results(self):
+        """Check if any match between two players was played (byes don't count)"""
+        return self.played > 0
+
+    def has_completed_match(self, player_id):
+        """Check if a player played a match that is completed"""
+        return any(match['completed'] for match in self.player_matches.get(player_id, []))